@@ -27,10 +27,12 @@ from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, ClassVar, final
 
 from django import http
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
 from django.db import connection
+from django.shortcuts import redirect
 from django.urls import reverse
 from django.utils.translation import gettext as _, pgettext
 from pytools import not_none
@@ -49,7 +51,11 @@ from course.utils import (
 if TYPE_CHECKING:
     from collections.abc import Callable
 
+    from celery.result import AsyncResult
+
+    from course.models import AnalyticsSnapshot, Course
     from course.page.base import PageBase
+    from course.repo import Repo_ish
     from course.utils import CoursePageContext
 
 
@@ -75,6 +81,25 @@ def flow_list(pctx: CoursePageContext):
 # }}}
 
 
+# {{{ analytics context
+
+@dataclass(frozen=True)
+class AnalyticsContext:
+    """The parts of a :class:`~course.utils.CoursePageContext` needed to
+    compute analytics, for use outside of a request (e.g. in a Celery task).
+    """
+
+    course: Course
+    repo: Repo_ish
+    course_commit_sha: bytes
+
+    @property
+    def course_identifier(self) -> str:
+        return self.course.identifier
+
+# }}}
+
+
 # {{{ histogram tool
 
 @dataclass(frozen=True)
@@ -260,7 +285,8 @@ def is_page_multiple_submit(flow_desc: FlowDesc, page: PageBase):
 
 # {{{ flow analytics
 
-def make_grade_histogram(pctx: CoursePageContext, flow_id: str):
+def make_grade_histogram(
+        pctx: CoursePageContext | AnalyticsContext, flow_id: str):
     qset = FlowSession.objects.filter(
             course=pctx.course,
             flow_id=flow_id,
@@ -334,8 +360,116 @@ def safe_div(num: float, denom: float):
     return num/denom
 
 
+@dataclass(frozen=True)
+class PageAnswerAggregate:
+    """Answer counts for one page of a flow, over all submitted answers
+    included in the statistics.
+    """
+
+    total_count: int
+    answer_count: int
+
+    #: number of answers with a (most recent) grade with a correctness
+    graded_count: int
+
+    #: sum of the most recent correctness of non-empty answers
+    points: float
+
+    #: ID of one :class:`course.models.FlowPageData` of this page, for
+    #: rendering the page title.
+    page_data_id: int
+
+    @property
+    def empty_count(self):
+        return self.total_count - self.answer_count
+
+
+def get_page_answer_aggregates(
+            course: Course,
+            flow_id: str,
+            flow_desc: FlowDesc,
+            restrict_to_first_attempt: bool,
+        ) -> dict[tuple[str, str], PageAnswerAggregate]:
+    """Compute :class:`PageAnswerAggregate` for all pages of *flow_id*
+    with at least one submitted answer in a single grouped query,
+    keyed by *(group_id, page_id)*.
+
+    If *restrict_to_first_attempt*, only the first answer of each participant
+    is counted. Otherwise, for pages whose answer may be changed, only the
+    last answer in each session is counted.
+    """
+    from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery, Sum
+
+    from course.models import FlowPageVisitGrade, Participation
+
+    def same_page_visits():
+        return FlowPageVisit.objects.filter(
+                flow_session__course=course,
+                flow_session__flow_id=flow_id,
+                page_data__group_id=OuterRef("page_data__group_id"),
+                page_data__page_id=OuterRef("page_data__page_id"),
+                is_submitted_answer=True)
+
+    visits = (FlowPageVisit.objects
+            .filter(
+                flow_session__course=course,
+                flow_session__flow_id=flow_id,
+                flow_session__participation__in=(
+                    Participation.objects.filter(
+                        course=course,
+                        roles__permissions__permission=(
+                            PPerm.included_in_grade_statistics))),
+                is_submitted_answer=True,
+                ))
+
+    if restrict_to_first_attempt:
+        visits = visits.exclude(Exists(same_page_visits().filter(
+                flow_session__participation=OuterRef(
+                    "flow_session__participation"),
+                visit_time__lt=OuterRef("visit_time"))))
+    else:
+        multiple_submit_pages = Q()
+        for group_desc in flow_desc.groups:
+            for page_desc in group_desc.pages:
+                if is_page_multiple_submit(flow_desc, page_desc):
+                    multiple_submit_pages |= Q(
+                            page_data__group_id=group_desc.id,
+                            page_data__page_id=page_desc.id)
+
+        if multiple_submit_pages:
+            visits = visits.exclude(multiple_submit_pages & Exists(
+                same_page_visits().filter(
+                    page_data=OuterRef("page_data"),
+                    visit_time__gt=OuterRef("visit_time"))))
+
+    rows = (visits
+            .annotate(correctness=Subquery(
+                FlowPageVisitGrade.objects
+                .filter(visit=OuterRef("pk"))
+                .order_by("-grade_time")
+                .values("correctness")[:1]))
+            .order_by()
+            .values("page_data__group_id", "page_data__page_id")
+            .annotate(
+                total_count=Count("id"),
+                answer_count=Count("id", filter=Q(answer__isnull=False)),
+                graded_count=Count("id", filter=Q(correctness__isnull=False)),
+                points=Sum("correctness", filter=Q(answer__isnull=False)),
+                page_data_id=Max("page_data_id")))
+
+    return {
+        (row["page_data__group_id"], row["page_data__page_id"]):
+        PageAnswerAggregate(
+            total_count=row["total_count"],
+            answer_count=row["answer_count"],
+            graded_count=row["graded_count"],
+            points=row["points"] or 0,
+            page_data_id=row["page_data_id"])
+        for row in rows}
+
+
 def make_page_answer_stats_list(
-            pctx: CoursePageContext,
+            pctx: CoursePageContext | AnalyticsContext,
             flow_id: str,
             restrict_to_first_attempt: bool):
     flow_desc = get_flow_desc(pctx.repo, pctx.course, flow_id,
@@ -343,91 +477,48 @@ def make_page_answer_stats_list(
 
     page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
 
+    aggregates = get_page_answer_aggregates(
+            pctx.course, flow_id, flow_desc, restrict_to_first_attempt)
+
+    from course.models import FlowPageData
+    page_data_by_id = (FlowPageData.objects
+            .select_related("flow_session")
+            .in_bulk([agg.page_data_id for agg in aggregates.values()]))
+
     page_info_list: list[PageAnswerStats] = []
     for group_desc in flow_desc.groups:
         for page_desc in group_desc.pages:
-            points = 0
-            graded_count = 0
-            empty_count = 0
-
-            answer_count = 0
-            total_count = 0
-
-            visits = (FlowPageVisit.objects
-                    .filter(
-                        flow_session__course=pctx.course,
-                        flow_session__flow_id=flow_id,
-                        flow_session__participation__roles__permissions__permission=(
-                            PPerm.included_in_grade_statistics),
-                        page_data__group_id=group_desc.id,
-                        page_data__page_id=page_desc.id,
-                        is_submitted_answer=True,
-                        ))
-
-            if connection.features.can_distinct_on_fields:
-                if restrict_to_first_attempt:
-                    visits = (visits
-                            .distinct("flow_session__participation__id")
-                            .order_by("flow_session__participation__id",
-                                "visit_time"))
-                elif is_page_multiple_submit(flow_desc, page_desc):
-                    visits = (visits
-                            .distinct("page_data__id")
-                            .order_by("page_data__id", "-visit_time"))
-
-            visits = (visits
-                    .select_related("flow_session")
-                    .select_related("page_data"))
-
-            answer_expected = False
-
-            title = None
-            for visit in visits:
-                page = page_cache.get_page(group_desc.id, page_desc.id,
-                        pctx.course_commit_sha)
-
-                answer_expected = answer_expected or page.expects_answer()
-
-                from course.page import PageContext
-                grading_page_context = PageContext(
-                        course=pctx.course,
-                        repo=pctx.repo,
-                        commit_sha=pctx.course_commit_sha,
-                        flow_session=visit.flow_session)
-
-                title = page.page_title(grading_page_context, visit.page_data.data)
-
-                answer_feedback = visit.get_most_recent_feedback()
+            agg = aggregates.get((group_desc.id, page_desc.id))
+            if agg is None:
+                continue
 
-                if visit.answer is not None:
-                    answer_count += 1
-                else:
-                    empty_count += 1
+            page = page_cache.get_page(group_desc.id, page_desc.id,
+                    pctx.course_commit_sha)
 
-                total_count += 1
+            if not page.expects_answer():
+                continue
 
-                if (answer_feedback is not None
-                        and answer_feedback.correctness is not None):
-                    if visit.answer is None:
-                        assert answer_feedback.correctness == 0
-                    else:
-                        points += answer_feedback.correctness
+            page_data = page_data_by_id[agg.page_data_id]
 
-                    graded_count += 1
+            from course.page import PageContext
+            grading_page_context = PageContext(
+                    course=pctx.course,
+                    repo=pctx.repo,
+                    commit_sha=pctx.course_commit_sha,
+                    flow_session=page_data.flow_session)
 
-            if not answer_expected:
-                continue
+            title = page.page_title(grading_page_context, page_data.data)
 
             page_info_list.append(
                     PageAnswerStats(
                         group_id=group_desc.id,
                         page_id=page_desc.id,
                         title=not_none(title),
-                        average_correctness=safe_div(points, graded_count),
+                        average_correctness=safe_div(agg.points, agg.graded_count),
                         average_emptiness=safe_div(
-                            empty_count, graded_count),
-                        answer_count=answer_count,
-                        total_count=total_count,
+                            agg.empty_count, agg.graded_count),
+                        answer_count=agg.answer_count,
+                        total_count=agg.total_count,
                         url=reverse(
                             "relate-page_analytics",
                             args=(
@@ -440,7 +531,8 @@ def make_page_answer_stats_list(
     return page_info_list
 
 
-def make_time_histogram(pctx: CoursePageContext, flow_id: str):
+def make_time_histogram(
+        pctx: CoursePageContext | AnalyticsContext, flow_id: str):
     qset = FlowSession.objects.filter(
             course=pctx.course,
             flow_id=flow_id)
@@ -468,7 +560,8 @@ def make_time_histogram(pctx: CoursePageContext, flow_id: str):
     return hist
 
 
-def count_participants(pctx: CoursePageContext, flow_id: str):
+def count_participants(
+        pctx: CoursePageContext | AnalyticsContext, flow_id: str):
     if not connection.features.can_distinct_on_fields:
         return None
 
@@ -481,6 +574,19 @@ def count_participants(pctx: CoursePageContext, flow_id: str):
     return qset.count()
 
 
+def make_flow_analytics(
+        pctx: CoursePageContext | AnalyticsContext,
+        flow_id: str,
+        restrict_to_first_attempt: bool) -> dict[str, Any]:
+    return {
+        "grade_histogram": make_grade_histogram(pctx, flow_id),
+        "page_answer_stats_list": make_page_answer_stats_list(pctx, flow_id,
+            restrict_to_first_attempt),
+        "time_histogram": make_time_histogram(pctx, flow_id),
+        "participant_count": count_participants(pctx, flow_id),
+        }
+
+
 @login_required
 @course_view
 def flow_analytics(pctx: CoursePageContext, flow_id: str):
@@ -491,8 +597,22 @@ def flow_analytics(pctx: CoursePageContext, flow_id: str):
             bool(pctx.request.GET.get("restrict_to_first_attempt") == "1"))
 
     try:
-        stats_list = make_page_answer_stats_list(pctx, flow_id,
-                restrict_to_first_attempt)
+        if use_analytics_snapshots():
+            if pctx.request.method == "POST":
+                return refresh_analytics_snapshot_in_background(
+                        pctx, flow_id, "", "", restrict_to_first_attempt)
+
+            snapshot = get_analytics_snapshot(
+                    pctx, flow_id, "", "", restrict_to_first_attempt)
+            if snapshot is None:
+                return render_analytics_pending(pctx, flow_id)
+
+            analytics = snapshot_to_analytics(snapshot.data)
+            snapshot_time = snapshot.computation_time
+        else:
+            analytics = make_flow_analytics(
+                    pctx, flow_id, restrict_to_first_attempt)
+            snapshot_time = None
     except ObjectDoesNotExist:
         messages.add_message(pctx.request, messages.ERROR,
                 _("Flow '%s' was not found in the repository, but it exists in "
@@ -500,13 +620,15 @@ def flow_analytics(pctx: CoursePageContext, flow_id: str):
                 % flow_id)
         raise http.Http404()
 
+    from course.page.code import get_code_result_cache_stats
+    code_result_cache_stats = get_code_result_cache_stats(pctx.course.id, flow_id)
+
     return render_course_page(pctx, "course/analytics-flow.html", {
         "flow_identifier": flow_id,
-        "grade_histogram": make_grade_histogram(pctx, flow_id),
-        "page_answer_stats_list": stats_list,
-        "time_histogram": make_time_histogram(pctx, flow_id),
-        "participant_count": count_participants(pctx, flow_id),
+        **analytics,
         "restrict_to_first_attempt": restrict_to_first_attempt,
+        "snapshot_time": snapshot_time,
+        "code_result_cache_stats": code_result_cache_stats,
         })
 
 # }}}
@@ -522,18 +644,13 @@ class AnswerStats:
     percentage: float
 
 
-@login_required
-@course_view
-def page_analytics(pctx: CoursePageContext, flow_id: str, group_id: str, page_id: str):
-    if not pctx.has_permission(PPerm.view_analytics):
-        raise PermissionDenied(_("may not view analytics"))
-
+def make_page_analytics(
+        pctx: CoursePageContext | AnalyticsContext,
+        flow_id: str, group_id: str, page_id: str,
+        restrict_to_first_attempt: bool) -> dict[str, Any]:
     flow_desc = get_flow_desc(pctx.repo, pctx.course, flow_id,
             pctx.course_commit_sha)
 
-    restrict_to_first_attempt = int(
-            bool(pctx.request.GET.get("restrict_to_first_attempt") == "1"))
-
     page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
 
     visits = (FlowPageVisit.objects
@@ -618,16 +735,200 @@ def page_analytics(pctx: CoursePageContext, flow_id: str, group_id: str, page_id
             key=lambda astats: astats.percentage,
             reverse=True)
 
+    return {
+        "title": title,
+        "body": body,
+        "answer_stats_list": answer_stats,
+        }
+
+
+@login_required
+@course_view
+def page_analytics(pctx: CoursePageContext, flow_id: str, group_id: str, page_id: str):
+    if not pctx.has_permission(PPerm.view_analytics):
+        raise PermissionDenied(_("may not view analytics"))
+
+    restrict_to_first_attempt = int(
+            bool(pctx.request.GET.get("restrict_to_first_attempt") == "1"))
+
+    if use_analytics_snapshots():
+        if pctx.request.method == "POST":
+            return refresh_analytics_snapshot_in_background(
+                    pctx, flow_id, group_id, page_id,
+                    bool(restrict_to_first_attempt))
+
+        snapshot = get_analytics_snapshot(
+                pctx, flow_id, group_id, page_id,
+                bool(restrict_to_first_attempt))
+        if snapshot is None:
+            return render_analytics_pending(pctx, flow_id)
+
+        analytics = snapshot_to_analytics(snapshot.data)
+        snapshot_time = snapshot.computation_time
+    else:
+        analytics = make_page_analytics(pctx, flow_id, group_id, page_id,
+                bool(restrict_to_first_attempt))
+        snapshot_time = None
+
     return render_course_page(pctx, "course/analytics-page.html", {
         "flow_identifier": flow_id,
         "group_id": group_id,
         "page_id": page_id,
-        "title": title,
-        "body": body,
-        "answer_stats_list": answer_stats,
+        **analytics,
         "restrict_to_first_attempt": restrict_to_first_attempt,
+        "snapshot_time": snapshot_time,
         })
 
 # }}}
 
+
+# {{{ analytics snapshots
+
+# Time (in seconds) during which a queued snapshot computation keeps further
+# views from queueing another one
+ANALYTICS_SNAPSHOT_PENDING_TIMEOUT = 10 * 60
+
+
+def use_analytics_snapshots() -> bool:
+    """Whether the analytics views show stored
+    :class:`~course.models.AnalyticsSnapshot` objects (computed in the
+    background after the first view and refreshed on request) rather than
+    computing analytics on every view.
+    """
+    return bool(getattr(settings, "RELATE_ANALYTICS_SNAPSHOTS", False))
+
+
+def analytics_to_snapshot(analytics: dict[str, Any]) -> dict[str, Any]:
+    """Convert the result of :func:`make_flow_analytics` or
+    :func:`make_page_analytics` to JSON-compatible data.
+    """
+    from dataclasses import asdict
+
+    result: dict[str, Any] = {}
+    for key, value in analytics.items():
+        if isinstance(value, Histogram):
+            result[key] = {
+                    "html": value.html(),
+                    "total_weight": value.total_weight(),
+                    }
+        elif key in ["page_answer_stats_list", "answer_stats_list"]:
+            result[key] = [asdict(stats) for stats in value]
+        else:
+            result[key] = value
+
+    return result
+
+
+def snapshot_to_analytics(data: dict[str, Any]) -> dict[str, Any]:
+    """Inverse of :func:`analytics_to_snapshot`, as far as the templates
+    are concerned. Histograms remain dictionaries of their rendered HTML
+    and total weight.
+    """
+    result = dict(data)
+    if "page_answer_stats_list" in data:
+        result["page_answer_stats_list"] = [
+                PageAnswerStats(**stats)
+                for stats in data["page_answer_stats_list"]]
+    if "answer_stats_list" in data:
+        result["answer_stats_list"] = [
+                AnswerStats(**stats)
+                for stats in data["answer_stats_list"]]
+    return result
+
+
+def update_analytics_snapshot(
+        actx: CoursePageContext | AnalyticsContext,
+        flow_id: str, group_id: str, page_id: str,
+        restrict_to_first_attempt: bool) -> AnalyticsSnapshot:
+    from django.utils.timezone import now
+
+    from course.models import AnalyticsSnapshot
+
+    if group_id:
+        analytics = make_page_analytics(actx, flow_id, group_id, page_id,
+                restrict_to_first_attempt)
+    else:
+        analytics = make_flow_analytics(actx, flow_id, restrict_to_first_attempt)
+
+    snapshot, _created = AnalyticsSnapshot.objects.update_or_create(
+            course=actx.course,
+            flow_id=flow_id,
+            group_id=group_id,
+            page_id=page_id,
+            commit_sha=actx.course_commit_sha.decode(),
+            restrict_to_first_attempt=restrict_to_first_attempt,
+            defaults={
+                "computation_time": now(),
+                "data": analytics_to_snapshot(analytics),
+                })
+
+    return snapshot
+
+
+def _queue_analytics_snapshot_refresh(
+        pctx: CoursePageContext,
+        flow_id: str, group_id: str, page_id: str,
+        restrict_to_first_attempt: bool) -> AsyncResult[dict[str, str]]:
+    from course.tasks import refresh_analytics_snapshot
+    return refresh_analytics_snapshot.delay(
+            pctx.course.id, flow_id, group_id, page_id,
+            pctx.course_commit_sha.decode(), restrict_to_first_attempt)
+
+
+def get_analytics_snapshot(
+        pctx: CoursePageContext,
+        flow_id: str, group_id: str, page_id: str,
+        restrict_to_first_attempt: bool) -> AnalyticsSnapshot | None:
+    """Return the stored snapshot for the given analytics. If there is none
+    yet, queue its computation and return *None*.
+    """
+    from course.models import AnalyticsSnapshot
+
+    commit_sha = pctx.course_commit_sha.decode()
+    try:
+        return AnalyticsSnapshot.objects.get(
+                course=pctx.course,
+                flow_id=flow_id,
+                group_id=group_id,
+                page_id=page_id,
+                commit_sha=commit_sha,
+                restrict_to_first_attempt=restrict_to_first_attempt)
+    except AnalyticsSnapshot.DoesNotExist:
+        pass
+
+    # Fail here rather than in the task if the flow does not exist.
+    get_flow_desc(pctx.repo, pctx.course, flow_id, pctx.course_commit_sha)
+
+    from hashlib import sha256
+
+    from django.core import cache
+    pending_key = "relate-analytics-pending:" + sha256(repr((
+            pctx.course.id, flow_id, group_id, page_id, commit_sha,
+            restrict_to_first_attempt)).encode()).hexdigest()
+    if cache.caches["default"].add(
+            pending_key, True, ANALYTICS_SNAPSHOT_PENDING_TIMEOUT):
+        _queue_analytics_snapshot_refresh(pctx, flow_id, group_id, page_id,
+                restrict_to_first_attempt)
+
+    return None
+
+
+def render_analytics_pending(
+        pctx: CoursePageContext, flow_id: str) -> http.HttpResponse:
+    return render_course_page(pctx, "course/analytics-pending.html", {
+        "flow_identifier": flow_id,
+        })
+
+
+def refresh_analytics_snapshot_in_background(
+        pctx: CoursePageContext,
+        flow_id: str, group_id: str, page_id: str,
+        restrict_to_first_attempt: bool) -> http.HttpResponse:
+    async_res = _queue_analytics_snapshot_refresh(pctx, flow_id, group_id,
+            page_id, restrict_to_first_attempt)
+
+    return redirect("relate-monitor_task", async_res.id)
+
+# }}}
+
 # vim: foldmethod=marker
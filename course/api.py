@@ -23,27 +23,70 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+from itertools import islice
 from typing import TYPE_CHECKING, Any
 
 from django import http
 from django.core.exceptions import PermissionDenied
+from django.db.models import OuterRef, Q, Subquery
 from django.shortcuts import get_object_or_404
 
 from course.auth import APIError, with_course_api_auth
 from course.constants import ParticipationPermission as PPerm
-from course.models import FlowSession
+from course.models import (
+    FlowPageData,
+    FlowPageVisit,
+    FlowPageVisitGrade,
+    FlowSession,
+)
 
 
 # {{{ mypy
 
 if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from django.db.models import query
+
     from course.auth import APIContext
+    from course.models import Course
+    from course.page.base import PageBase, PageContext
+    from course.repo import Repo_ish
+    from course.utils import FlowContext
 
 # }}}
 
 
+def get_flow_sessions_qset(
+        course: Course, flow_id: str) -> query.QuerySet[FlowSession]:
+    """Return the sessions of *flow_id*, ordered by ID, with everything
+    :func:`flow_session_to_json` needs fetched by the same query. The time of
+    the last activity is annotated as ``last_activity_time``.
+    """
+    last_visits = (FlowPageVisit.objects
+            .filter(
+                flow_session=OuterRef("pk"),
+                answer__isnull=False,
+                is_synthetic=False)
+            .order_by("-visit_time")
+            .values("visit_time")[:1])
+
+    return (FlowSession.objects
+            .filter(
+                course=course,
+                flow_id=flow_id)
+            .select_related("participation__user")
+            .annotate(last_activity_time=Subquery(last_visits))
+            .order_by("id"))
+
+
 def flow_session_to_json(sess: FlowSession) -> Any:
-    last_activity = sess.last_activity()
+    if hasattr(sess, "last_activity_time"):
+        # annotated by get_flow_sessions_qset
+        last_activity = sess.last_activity_time  # pyright: ignore[reportAttributeAccessIssue]
+    else:
+        last_activity = sess.last_activity()
+
     return {
             "id": sess.id,
             "participation_username": (
@@ -74,6 +117,52 @@ def flow_session_to_json(sess: FlowSession) -> Any:
             }
 
 
+def filter_flow_sessions(
+        api_ctx: APIContext,
+        sessions: query.QuerySet[FlowSession]) -> query.QuerySet[FlowSession]:
+    """Apply the ``since``, ``after_id`` and ``limit`` GET parameters to
+    *sessions*, which must come from :func:`get_flow_sessions_qset`.
+    """
+    # Sessions that were started, completed, or received an answer at or
+    # after 'since'.
+    since_str = api_ctx.request.GET.get("since")
+    if since_str is not None:
+        from django.utils.dateparse import parse_datetime
+        from django.utils.timezone import is_naive, make_aware
+
+        try:
+            since = parse_datetime(since_str)
+        except ValueError:
+            since = None
+        if since is None:
+            raise APIError("invalid 'since' GET parameter")
+        if is_naive(since):
+            since = make_aware(since)
+
+        sessions = sessions.filter(
+                Q(start_time__gte=since)
+                | Q(completion_time__gte=since)
+                | Q(last_activity_time__gte=since))
+
+    # Keyset pagination: to get the next page, pass the ID of the last
+    # session received as 'after_id'. A page shorter than 'limit' is the
+    # last one.
+    try:
+        after_id = api_ctx.request.GET.get("after_id")
+        if after_id is not None:
+            sessions = sessions.filter(id__gt=int(after_id))
+
+        limit = api_ctx.request.GET.get("limit")
+        if limit is not None:
+            if int(limit) <= 0:
+                raise ValueError()
+            sessions = sessions[:int(limit)]
+    except ValueError:
+        raise APIError("invalid 'after_id' or 'limit' GET parameter")
+
+    return sessions
+
+
 @with_course_api_auth("Token")
 def get_flow_sessions(
         api_ctx: APIContext, course_identifier: str) -> http.HttpResponse:
@@ -85,15 +174,159 @@ def get_flow_sessions(
     except KeyError:
         raise APIError("must specify flow_id GET parameter")
 
-    sessions = FlowSession.objects.filter(
-            course=api_ctx.course,
-            flow_id=flow_id)
+    sessions = filter_flow_sessions(
+            api_ctx, get_flow_sessions_qset(api_ctx.course, flow_id))
 
     result = [flow_session_to_json(sess) for sess in sessions]
 
     return http.JsonResponse(result, safe=False)
 
 
+# Number of sessions whose pages, answers, and grades are fetched together
+# when exporting session content.
+FLOW_SESSION_CONTENT_CHUNK_SIZE = 100
+
+
+def answer_visit_to_json(
+        page: PageBase, page_context: PageContext,
+        page_data: FlowPageData, visit: FlowPageVisit) -> Any:
+    norm_bytes_answer_tup = page.normalized_bytes_answer(
+            page_context, page_data.data, visit.answer)
+
+    # norm_answer needs to be JSON-encodable
+    norm_answer: Any = None
+
+    if norm_bytes_answer_tup is not None:
+        answer_file_ext, norm_bytes_answer = norm_bytes_answer_tup
+
+        if answer_file_ext in [".txt", ".py"]:
+            norm_answer = norm_bytes_answer.decode("utf-8")
+        elif answer_file_ext == ".json":
+            import json
+            norm_answer = json.loads(norm_bytes_answer)
+        else:
+            from base64 import b64encode
+            norm_answer = [answer_file_ext,
+                           b64encode(norm_bytes_answer).decode("utf-8")]
+
+    return {
+            "visit_time": visit.visit_time.isoformat(),
+            "remote_address": repr(visit.remote_address),
+            "user": (
+                visit.user.username if visit.user is not None else None),
+            "impersonated_by": (
+                visit.impersonated_by.username
+                if visit.impersonated_by is not None else None),
+            "is_synthetic_visit": visit.is_synthetic,
+            "answer_data": visit.answer,
+            "answer": norm_answer,
+            }
+
+
+def grade_to_json(grade: FlowPageVisitGrade) -> Any:
+    return {
+            "grader": (grade.grader.username
+                if grade.grader is not None else None),
+            "grade_time": grade.grade_time.isoformat(),
+            "graded_at_git_commit_sha": (
+                grade.graded_at_git_commit_sha),
+            "max_points": grade.max_points,
+            "correctness": grade.correctness,
+            "feedback": grade.feedback}
+
+
+def iter_flow_sessions_content(
+        course: Course, repo: Repo_ish, fctx: FlowContext,
+        flow_sessions: Iterable[FlowSession]) -> Iterator[Any]:
+    """Generate the content of each of *flow_sessions*, which must all belong
+    to the flow of *fctx*, as returned by the ``get-flow-session-content``
+    API. Page data, answers and grades are fetched in one query each per
+    chunk of :data:`FLOW_SESSION_CONTENT_CHUNK_SIZE` sessions.
+    """
+    from course.flow import (
+        adjust_flow_session_page_data,
+        get_multiple_flow_session_graded_answers_qset,
+    )
+    from course.page.base import PageContext
+    from course.utils import get_flow_page_with_ctx
+
+    flow_sessions_iter = iter(flow_sessions)
+    while chunk := list(
+            islice(flow_sessions_iter, FLOW_SESSION_CONTENT_CHUNK_SIZE)):
+        for flow_session in chunk:
+            adjust_flow_session_page_data(repo, flow_session, fctx.flow_desc)
+
+        page_data_by_session: dict[int, list[FlowPageData]] = {
+                flow_session.id: [] for flow_session in chunk}
+        for page_data in (FlowPageData.objects
+                .filter(
+                    flow_session__in=chunk,
+                    page_ordinal__isnull=False)
+                .order_by("flow_session_id", "page_ordinal")):
+            page_data_by_session[page_data.flow_session_id].append(page_data)
+
+        # Later answer visits replace earlier ones, as in
+        # course.flow.assemble_answer_visits.
+        answer_visits: dict[tuple[int, int], FlowPageVisit] = {}
+        for visit in (get_multiple_flow_session_graded_answers_qset(chunk)
+                .select_related("page_data", "user", "impersonated_by")
+                .order_by("visit_time")):
+            if visit.page_data.page_ordinal is not None:
+                answer_visits[
+                        visit.flow_session_id, visit.page_data.page_ordinal] = visit
+
+        # Later grades replace earlier ones, as in
+        # FlowPageVisit.get_most_recent_grade.
+        grades: dict[int, FlowPageVisitGrade] = {}
+        for grade in (FlowPageVisitGrade.objects
+                .filter(visit__in=[visit.id for visit in answer_visits.values()])
+                .select_related("grader")
+                .order_by("grade_time")):
+            grades[grade.visit_id] = grade
+
+        for flow_session in chunk:
+            page_context = PageContext(course, repo, fctx.course_commit_sha,
+                    flow_session)
+
+            pages = []
+            for i, page_data in enumerate(page_data_by_session[flow_session.id]):
+                page = get_flow_page_with_ctx(fctx, page_data)
+
+                assert i == page_data.page_ordinal
+
+                page_data_json = {
+                        "ordinal": i,
+                        "page_type": page_data.page_type,
+                        "group_id": page_data.group_id,
+                        "page_id": page_data.page_id,
+                        "page_data": page_data.data,
+                        "title": page_data.title,
+                        "bookmarked": page_data.bookmarked,
+                        }
+                answer_json = None
+                grade_json = None
+
+                visit = answer_visits.get((flow_session.id, i))
+                if visit is not None:
+                    answer_json = answer_visit_to_json(
+                            page, page_context, page_data, visit)
+
+                    grade = grades.get(visit.id)
+                    if grade is not None:
+                        grade_json = grade_to_json(grade)
+
+                pages.append({
+                    "page": page_data_json,
+                    "answer": answer_json,
+                    "grade": grade_json,
+                    })
+
+            yield {
+                "session": flow_session_to_json(flow_session),
+                "pages": pages,
+                }
+
+
 @with_course_api_auth("Token")
 def get_flow_session_content(
         api_ctx: APIContext, course_identifier: str) -> http.HttpResponse:
@@ -114,97 +347,71 @@ def get_flow_session_content(
                 "session's course does not match auth context")
 
     from course.content import get_course_repo
-    from course.flow import adjust_flow_session_page_data, assemble_answer_visits
 
     with get_course_repo(api_ctx.course) as repo:
-        from course.utils import FlowContext, get_flow_page_with_ctx
+        from course.utils import FlowContext
         fctx = FlowContext(repo, api_ctx.course, flow_session.flow_id)
 
-        adjust_flow_session_page_data(repo, flow_session, fctx.flow_desc)
-
-        from course.flow import get_all_page_data
-        all_page_data = get_all_page_data(flow_session)
-        answer_visits = assemble_answer_visits(flow_session)
-
-        pages = []
-        for i, page_data in enumerate(all_page_data):
-            page = get_flow_page_with_ctx(fctx, page_data)
-
-            assert i == page_data.page_ordinal
-
-            page_data_json = {
-                    "ordinal": i,
-                    "page_type": page_data.page_type,
-                    "group_id": page_data.group_id,
-                    "page_id": page_data.page_id,
-                    "page_data": page_data.data,
-                    "title": page_data.title,
-                    "bookmarked": page_data.bookmarked,
-                    }
-            answer_json = None
-            grade_json = None
-
-            visit = answer_visits[i]
-            if visit is not None:
-                from course.page.base import PageContext
-                pctx = PageContext(api_ctx.course, repo, fctx.course_commit_sha,
-                        flow_session)
-                norm_bytes_answer_tup = page.normalized_bytes_answer(
-                        pctx, page_data.data, visit.answer)
-
-                # norm_answer needs to be JSON-encodable
-                norm_answer: Any = None
-
-                if norm_bytes_answer_tup is not None:
-                    answer_file_ext, norm_bytes_answer = norm_bytes_answer_tup
-
-                    if answer_file_ext in [".txt", ".py"]:
-                        norm_answer = norm_bytes_answer.decode("utf-8")
-                    elif answer_file_ext == ".json":
-                        import json
-                        norm_answer = json.loads(norm_bytes_answer)
-                    else:
-                        from base64 import b64encode
-                        norm_answer = [answer_file_ext,
-                                       b64encode(norm_bytes_answer).decode("utf-8")]
-
-                answer_json = {
-                        "visit_time": visit.visit_time.isoformat(),
-                        "remote_address": repr(visit.remote_address),
-                        "user": (
-                            visit.user.username if visit.user is not None else None),
-                        "impersonated_by": (
-                            visit.impersonated_by.username
-                            if visit.impersonated_by is not None else None),
-                        "is_synthetic_visit": visit.is_synthetic,
-                        "answer_data": visit.answer,
-                        "answer": norm_answer,
-                        }
-
-                grade = visit.get_most_recent_grade()
-                if grade is not None:
-                    grade_json = {
-                            "grader": (grade.grader.username
-                                if grade.grader is not None else None),
-                            "grade_time": grade.grade_time.isoformat(),
-                            "graded_at_git_commit_sha": (
-                                grade.graded_at_git_commit_sha),
-                            "max_points": grade.max_points,
-                            "correctness": grade.correctness,
-                            "feedback": grade.feedback}
-
-            pages.append({
-                "page": page_data_json,
-                "answer": answer_json,
-                "grade": grade_json,
-                })
-
-    result = {
-        "session": flow_session_to_json(flow_session),
-        "pages": pages,
-        }
+        result, = iter_flow_sessions_content(
+                api_ctx.course, repo, fctx, [flow_session])
 
     return http.JsonResponse(result, safe=False)
 
 
+@with_course_api_auth("Token")
+def get_flow_sessions_content(
+        api_ctx: APIContext, course_identifier: str
+        ) -> http.StreamingHttpResponse:
+    if not api_ctx.has_permission(PPerm.view_gradebook):
+        raise PermissionDenied("token role does not have required permissions")
+
+    try:
+        flow_id = api_ctx.request.GET["flow_id"]
+    except KeyError:
+        raise APIError("must specify flow_id GET parameter")
+
+    sessions = get_flow_sessions_qset(api_ctx.course, flow_id)
+
+    session_ids_str = api_ctx.request.GET.get("flow_session_ids")
+    if session_ids_str is not None:
+        try:
+            session_ids = [int(sid) for sid in session_ids_str.split(",")]
+        except ValueError:
+            raise APIError("invalid 'flow_session_ids' GET parameter")
+
+        sessions = sessions.filter(id__in=session_ids)
+
+    # (after the ID filter, since 'limit' slices the query set)
+    sessions = filter_flow_sessions(api_ctx, sessions)
+
+    course = api_ctx.course
+
+    # Resolve the flow before streaming starts, so that errors (such as a
+    # flow that does not exist) are not reported as a truncated response.
+    from course.content import get_course_repo
+    from course.utils import FlowContext
+
+    repo = get_course_repo(course)
+    try:
+        fctx = FlowContext(repo, course, flow_id)
+    except Exception:
+        repo.close()
+        raise
+
+    def generate_lines() -> Iterator[bytes]:
+        import json
+
+        from django.core.serializers.json import DjangoJSONEncoder
+
+        try:
+            for result in iter_flow_sessions_content(
+                    course, repo, fctx, sessions.iterator(
+                        chunk_size=FLOW_SESSION_CONTENT_CHUNK_SIZE)):
+                yield (json.dumps(result, cls=DjangoJSONEncoder) + "\n").encode()
+        finally:
+            repo.close()
+
+    return http.StreamingHttpResponse(
+            generate_lines(), content_type="application/x-ndjson")
+
 # vim: foldmethod=marker
@@ -1193,6 +1193,63 @@ class APIError(Exception):
     pass
 
 
+# Seconds for which a successfully verified token secret is remembered, so
+# that repeated API calls need not rerun the (deliberately slow) password
+# hasher.
+API_TOKEN_VERIFICATION_CACHE_TIMEOUT = 60
+
+# Minimum number of seconds between writes of a token's last_use_time.
+API_TOKEN_LAST_USE_UPDATE_INTERVAL = 60
+
+
+def _get_verified_token_cache_key(
+        token: AuthenticationToken, token_hash_str: str) -> str:
+    import hashlib
+    import hmac
+
+    # Keyed with SECRET_KEY so that the cache contents are of no use for
+    # guessing token secrets. The stored hash is part of the message, so that
+    # the entry becomes unreachable should the token's hash ever change.
+    digest = hmac.new(
+            settings.SECRET_KEY.encode(),
+            f"{token.token_hash}\0{token_hash_str}".encode(),
+            hashlib.sha256).hexdigest()
+
+    return f"relate-api-token:{token.id}:{digest}"
+
+
+def check_token_hash(token: AuthenticationToken, token_hash_str: str | None) -> bool:
+    """Check *token_hash_str* against the hash stored in *token*, skipping
+    the password hasher if the same secret was verified recently.
+
+    Only successful verifications are remembered. Revocation and expiry are
+    not cached; :func:`find_matching_token` always checks them against the
+    current database row.
+    """
+    if token.token_hash is None or token_hash_str is None:
+        return False
+
+    from django.contrib.auth.hashers import check_password
+
+    timeout = getattr(settings, "RELATE_API_TOKEN_VERIFICATION_CACHE_TIMEOUT",
+            API_TOKEN_VERIFICATION_CACHE_TIMEOUT)
+    if not timeout:
+        return check_password(token_hash_str, token.token_hash)
+
+    from django.core import cache
+    default_cache = cache.caches["default"]
+
+    cache_key = _get_verified_token_cache_key(token, token_hash_str)
+    if default_cache.get(cache_key):
+        return True
+
+    if not check_password(token_hash_str, token.token_hash):
+        return False
+
+    default_cache.set(cache_key, True, timeout)
+    return True
+
+
 def find_matching_token(
         course_identifier: str | None = None,
         token_id: int | None = None,
@@ -1203,17 +1260,15 @@ def find_matching_token(
         return None
 
     try:
-        token = AuthenticationToken.objects.get(
-                id=token_id,
-                participation__course__identifier=course_identifier)
+        token = (AuthenticationToken.objects
+                .select_related("user", "participation__course")
+                .get(
+                    id=token_id,
+                    participation__course__identifier=course_identifier))
     except AuthenticationToken.DoesNotExist:
         return None
 
-    if token.token_hash is None:
-        return None
-
-    from django.contrib.auth.hashers import check_password
-    if not check_password(token_hash_str, token.token_hash):
+    if not check_token_hash(token, token_hash_str):
         return None
 
     if token.revocation_time is not None:
@@ -1235,8 +1290,19 @@ class APIBearerTokenBackend:
         if token is None:
             return None
 
-        token.last_use_time = now_datetime
-        token.save()
+        # Write last_use_time at most once per interval, since API clients
+        # may make many calls in quick succession.
+        from datetime import timedelta
+        update_interval = timedelta(seconds=getattr(settings,
+                "RELATE_API_TOKEN_LAST_USE_UPDATE_INTERVAL",
+                API_TOKEN_LAST_USE_UPDATE_INTERVAL))
+
+        if now_datetime is not None and (
+                token.last_use_time is None
+                or now_datetime - token.last_use_time >= update_interval):
+            AuthenticationToken.objects.filter(id=token.id).update(
+                    last_use_time=now_datetime)
+            token.last_use_time = now_datetime
 
         return token.user
 
@@ -1285,7 +1351,8 @@ BASIC_AUTH_DATA_RE = re.compile(
 
 
 P = ParamSpec("P")
-APICallable: TypeAlias = Callable[Concatenate[APIContext, str, P], http.HttpResponse]
+APICallable: TypeAlias = Callable[
+        Concatenate[APIContext, str, P], http.HttpResponse | http.StreamingHttpResponse]
 
 
 def auth_course_with_token(
@@ -80,6 +80,7 @@ from course.repo import (
     SubdirRepoWrapper,
     get_repo_blob_data_cached,
     get_repo_tree,
+    is_tracking_repo_path_accesses,
 )
 from course.validation import (
     DOMIdentifierStr,
@@ -99,7 +100,13 @@ from course.validation import (
 
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Collection, Mapping, Set as AbstractSet
+    from collections.abc import (
+        Callable,
+        Collection,
+        Hashable,
+        Mapping,
+        Set as AbstractSet,
+    )
 
     from course.models import Course, Participation
     from course.repo import Repo_ish
@@ -1176,7 +1183,7 @@ def get_raw_yaml_from_repo(
 
     result: Any | None = None
     # Memcache is apparently limited to 250 characters.
-    if len(cache_key) < 240:
+    if len(cache_key) < 240 and not is_tracking_repo_path_accesses():
         result = def_cache.get(cache_key)
     if result is not None:
         return result
@@ -1219,6 +1226,93 @@ def get_yaml_from_repo(
     return load_yaml(expanded)
 
 
+# {{{ process-local model cache
+
+class ProcessLocalLRUCache:
+    """A thread-safe, size-bounded, least-recently-used mapping
+    kept in the memory of the current process.
+
+    Only meant for values that are immutable and whose keys identify them
+    permanently (e.g. by including a commit SHA), so that entries never
+    need to be invalidated.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        from collections import OrderedDict
+        from threading import Lock
+
+        self.max_size = max_size
+        self._entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            try:
+                result = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def _evict_excess(self) -> None:
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict_excess()
+
+    def resize(self, max_size: int) -> None:
+        with self._lock:
+            self.max_size = max_size
+            self._evict_excess()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                }
+
+
+_MODEL_CACHE = ProcessLocalLRUCache(64)
+
+
+def get_model_cache() -> ProcessLocalLRUCache | None:
+    """Return the process-local cache of models parsed from course repositories
+    (flows, static pages, calendars), or *None* if it is disabled by setting
+    ``RELATE_MODEL_CACHE_SIZE`` to 0. Validated flow rule exceptions are cached
+    separately, see :func:`course.utils.get_flow_rules`.
+    """
+    max_size = getattr(settings, "RELATE_MODEL_CACHE_SIZE", 64)
+    if not max_size:
+        return None
+
+    if _MODEL_CACHE.max_size != max_size:
+        _MODEL_CACHE.resize(max_size)
+
+    return _MODEL_CACHE
+
+# }}}
+
+
 def get_model_from_repo(
         vctx: ValidationContext,
         model_ta: TypeAdapter[ModelT],
@@ -1234,6 +1328,10 @@ def get_model_from_repo(
         matters, you may set *tolerate_tabs* to *True*.
     """
 
+    model_cache = None
+    if is_tracking_repo_path_accesses():
+        cached = False
+
     if cached:
         try:
             from django.core import cache
@@ -1246,12 +1344,23 @@ def get_model_from_repo(
                         quote_plus(str(repo.controldir())), quote_plus(full_name),
                         commit_sha.decode()))
 
+            # Models are immutable and the key includes the commit, so
+            # instances may be shared across requests in the same process,
+            # sparing both the shared cache round trip and the unpickling.
+            model_cache = get_model_cache()
+            if model_cache is not None:
+                result = model_cache.get(cache_key)
+                if result is not None:
+                    return result
+
             def_cache = cache.caches["default"]
             result = None
             # Memcache is apparently limited to 250 characters.
             if len(cache_key) < 240:
                 result = def_cache.get(cache_key)
             if result is not None:
+                if model_cache is not None:
+                    model_cache.put(cache_key, result)
                 return result
 
     yaml_data = get_yaml_from_repo(
@@ -1260,6 +1369,8 @@ def get_model_from_repo(
 
     if cached:
         def_cache.add(cache_key, result, None)  # pyright: ignore[reportPossiblyUnboundVariable]
+        if model_cache is not None:
+            model_cache.put(cache_key, result)  # pyright: ignore[reportPossiblyUnboundVariable]
 
     return result
 
@@ -1609,7 +1720,9 @@ def markup_to_html(
                        ))
 
             def_cache = cache.caches["default"]
-            result = def_cache.get(cache_key)
+            result = None
+            if not is_tracking_repo_path_accesses():
+                result = def_cache.get(cache_key)
             if result is not None:
                 assert isinstance(result, str)
                 return result
@@ -30,6 +30,7 @@ import datetime
 import re
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import (
     TYPE_CHECKING,
     Literal,
@@ -45,9 +46,13 @@ from pydantic import ValidationInfo, model_serializer, model_validator
 from typing_extensions import override
 
 from course.validation import content_dataclass, get_validation_context
+from relate.utils import get_cache_generation
 
 
 if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from course.content import ProcessLocalLRUCache
     from course.models import Course
     from course.validation import (
         ValidationContext,
@@ -168,6 +173,89 @@ DATESPEC_POSTPROCESSORS: list[type[DatespecPostprocessor]] = [
         ]
 
 
+# {{{ event index
+
+# When RELATE_EVENT_INDEX_ENABLED is set, all of a course's events are read
+# with one query and kept in memory, in a process-local cache. Each course
+# has a 'version' token in the default cache that is part of the key of its
+# index. Saving or deleting any of the course's events drops the token (see
+# course.receivers), so that all processes re-read the events on their next
+# lookup.
+
+EventTimes: TypeAlias = "tuple[datetime.datetime, datetime.datetime | None]"
+
+
+@lru_cache(1)
+def _get_event_index_cache() -> ProcessLocalLRUCache:
+    # course.content imports this module, so the cache cannot be created
+    # at import time.
+    from course.content import ProcessLocalLRUCache
+    return ProcessLocalLRUCache(256)
+
+
+def _get_event_index_version(course_id: int) -> str | None:
+    from django.core import cache
+    return get_cache_generation(
+            cache.caches["default"], f"relate-event-index-version:{course_id}")
+
+
+def invalidate_event_index(course_id: int) -> None:
+    if not getattr(settings, "RELATE_EVENT_INDEX_ENABLED", False):
+        return
+
+    from django.core import cache
+    cache.caches["default"].delete(f"relate-event-index-version:{course_id}")
+
+
+def _get_event_index(
+        course: Course) -> Mapping[tuple[str, int | None], EventTimes]:
+    from course.models import Event
+
+    return {
+        (kind, ordinal): (time, end_time)
+        for kind, ordinal, time, end_time in (
+            Event.objects.filter(course=course)
+            .values_list("kind", "ordinal", "time", "end_time"))
+        }
+
+
+def get_event_times(
+        course: Course, kind: str, ordinal: int | None
+        ) -> EventTimes | None:
+    """Return the start and end time of the event of *kind* and *ordinal* in
+    *course*, or *None* if there is no such event.
+    """
+    if not getattr(settings, "RELATE_EVENT_INDEX_ENABLED", False):
+        from course.models import Event
+
+        try:
+            event_obj = Event.objects.get(
+                course=course,
+                kind=kind,
+                ordinal=ordinal)
+        except ObjectDoesNotExist:
+            return None
+
+        return event_obj.time, event_obj.end_time
+
+    version = _get_event_index_version(course.id)
+    if version is None:
+        # e.g. the dummy cache
+        return _get_event_index(course).get((kind, ordinal))
+
+    event_index_cache = _get_event_index_cache()
+
+    index_key = (course.id, version)
+    index = event_index_cache.get(index_key)
+    if index is None:
+        index = _get_event_index(course)
+        event_index_cache.put(index_key, index)
+
+    return index.get((kind, ordinal))
+
+# }}}
+
+
 def parse_date_spec(
         course: Course | None,
         datespec: str | datetime.date | datetime.datetime,
@@ -249,15 +337,9 @@ def parse_date_spec(
     if course is None:
         return now()
 
-    from course.models import Event
-
-    try:
-        event_obj = Event.objects.get(
-            course=course,
-            kind=event_kind,
-            ordinal=ordinal)
+    event_times = get_event_times(course, event_kind, ordinal)
 
-    except ObjectDoesNotExist:
+    if event_times is None:
         if vctx is not None:
             vctx.add_warning(
                     _("Unrecognized date/time specification: '%s' "
@@ -266,18 +348,19 @@ def parse_date_spec(
                     % orig_datespec)
         return now()
 
+    event_time, event_end_time = event_times
     if is_end:
-        if event_obj.end_time is not None:
-            result = event_obj.end_time
+        if event_end_time is not None:
+            result = event_end_time
         else:
-            result = event_obj.time
+            result = event_time
             if vctx is not None:
                 vctx.add_warning(
                         _("event '%s' has no end time, using start time instead")
                         % orig_datespec)
 
     else:
-        result = event_obj.time
+        result = event_time
 
     return apply_postprocs(result)
 
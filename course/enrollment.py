@@ -68,7 +68,9 @@ from relate.utils import StyledForm, StyledModelForm, string_concat
 if TYPE_CHECKING:
     from collections.abc import Set as AbstractSet
 
+    from django.contrib.auth.base_user import AbstractBaseUser
     from django.contrib.auth.models import AnonymousUser
+    from django.db.models import query
 
     import accounts.models
     from course.utils import CoursePageContext
@@ -110,15 +112,22 @@ def get_participation_for_request(
 
 def get_participation_role_identifiers(
         course: Course, participation: Participation | None) -> AbstractSet[str]:
+    from course.models import get_cached_permission_data
+
     if participation is None:
-        return frozenset(
-                ParticipationRole.objects.filter(
-                    course=course,
-                    is_default_for_unenrolled=True)
-                .values_list("identifier", flat=True))
+        return get_cached_permission_data(
+                course.id, "unenrolled-roles",
+                lambda: frozenset(
+                    ParticipationRole.objects.filter(
+                        course=course,
+                        is_default_for_unenrolled=True)
+                    .values_list("identifier", flat=True)))
 
     else:
-        return {r.identifier for r in participation.roles.all()}
+        return get_cached_permission_data(
+                course.id, f"participation-roles:{participation.id}",
+                lambda: frozenset(
+                    r.identifier for r in participation.roles.all()))
 
 # }}}
 
@@ -133,17 +142,85 @@ def get_participation_permissions(
     if participation is not None:
         return participation.permissions()
     else:
-        from course.models import ParticipationRolePermission
+        from course.models import (
+            ParticipationRolePermission,
+            get_cached_permission_data,
+        )
 
-        perm_list = list(
-                ParticipationRolePermission.objects.filter(
-                    role__is_default_for_unenrolled=True)
-                .values_list("permission", "argument"))
+        def get_permissions() -> frozenset[tuple[str, str | None]]:
+            perm_list = list(
+                    ParticipationRolePermission.objects.filter(
+                        role__course=course,
+                        role__is_default_for_unenrolled=True)
+                    .values_list("permission", "argument"))
+
+            return frozenset(
+                    (permission, argument) if argument else (permission, None)
+                    for permission, argument in perm_list)
+
+        return get_cached_permission_data(
+                course.id, "unenrolled-perms", get_permissions)
+
+
+# }}}
 
-        return frozenset(
-                (permission, argument) if argument else (permission, None)
-                for permission, argument in perm_list)
 
+# {{{ get_listed_courses_for_user
+
+def get_listed_courses_for_user(
+        user: AbstractBaseUser | AnonymousUser) -> query.QuerySet[Course]:
+    """Return the listed courses that *user* may see, using a single query.
+
+    A hidden course is visible if *user* has
+    :attr:`~course.constants.ParticipationPermission.view_hidden_course_page`
+    in it. That permission comes from an active participation, or, without
+    one, from the course's default roles for unenrolled users.
+    """
+    from django.db.models import Exists, OuterRef
+
+    from course.models import ParticipationRolePermission
+
+    # An empty argument means 'no argument', see Participation.permissions.
+    perm_filter = (
+            Q(permission=PPerm.view_hidden_course_page)
+            & (Q(argument__isnull=True) | Q(argument="")))
+
+    unenrolled_may_view_hidden = Exists(
+            ParticipationRolePermission.objects.filter(
+                perm_filter,
+                role__course=OuterRef("pk"),
+                role__is_default_for_unenrolled=True))
+
+    if not user.is_authenticated:
+        may_view_hidden = unenrolled_may_view_hidden
+    else:
+        is_participant = Exists(
+                Participation.objects.filter(
+                    course=OuterRef("pk"),
+                    user=user,
+                    status=ParticipationStatus.active))
+        participant_role_may_view_hidden = Exists(
+                ParticipationRolePermission.objects.filter(
+                    perm_filter,
+                    role__course=OuterRef("pk"),
+                    role__participation__course=OuterRef("pk"),
+                    role__participation__user=user,
+                    role__participation__status=ParticipationStatus.active))
+        participant_may_view_hidden = Exists(
+                ParticipationPermission.objects.filter(
+                    perm_filter,
+                    participation__course=OuterRef("pk"),
+                    participation__user=user,
+                    participation__status=ParticipationStatus.active))
+
+        may_view_hidden = (
+                participant_role_may_view_hidden
+                | participant_may_view_hidden
+                | (~is_participant & unenrolled_may_view_hidden))
+
+    return (Course.objects
+            .filter(listed=True)
+            .filter(Q(hidden=False) | may_view_hidden))
 
 # }}}
 
@@ -24,6 +24,7 @@ THE SOFTWARE.
 """
 
 from dataclasses import dataclass
+from operator import itemgetter
 from typing import TYPE_CHECKING, Any, Literal, TypeVar, cast
 
 from crispy_forms.helper import FormHelper
@@ -69,6 +70,7 @@ from course.models import (
     GradeChange,
     Participation,
     get_feedback_for_grade,
+    get_feedback_for_grades,
     update_bulk_feedback,
 )
 from course.page import InvalidPageData
@@ -132,12 +134,25 @@ def _adjust_flow_session_page_data_inner(
 
     desc_group_ids: list[str] = []
 
+    # All of the session's page data is read with one query and adjusted in
+    # memory. Changes are then written with one bulk update and one bulk
+    # insert.
+    all_fpds = list(FlowPageData.objects.filter(flow_session=flow_session))
+    group_page_id_to_fpd = {(fpd.group_id, fpd.page_id): fpd for fpd in all_fpds}
+
+    modified_fpds: dict[int, FlowPageData] = {}
+    new_fpds: list[FlowPageData] = []
+
     # {{{ helper functions
 
+    def mark_modified(fpd: FlowPageData) -> None:
+        if fpd.pk is not None:
+            modified_fpds[fpd.pk] = fpd
+
     def remove_page(fpd: FlowPageData) -> None:
         if fpd.page_ordinal is not None:
             fpd.page_ordinal = None
-            fpd.save()
+            mark_modified(fpd)
 
     def find_page(page_id: str) -> PageBase:
         new_page_desc = None
@@ -163,16 +178,19 @@ def _adjust_flow_session_page_data_inner(
                 title=page.page_title(pctx, data))
 
     def add_page(fpd: FlowPageData) -> None:
+        if fpd.pk is None:
+            new_fpds.append(fpd)
+
         if fpd.page_ordinal != ordinal[0]:
             fpd.page_ordinal = ordinal[0]
-            fpd.save()
+            mark_modified(fpd)
 
         page = find_page(fpd.page_id)
         title = page.page_title(pctx, fpd.data)
 
         if fpd.title != title:
             fpd.title = title
-            fpd.save()
+            mark_modified(fpd)
 
         ordinal[0] += 1
         available_page_ids.remove(fpd.page_id)
@@ -198,12 +216,11 @@ def _adjust_flow_session_page_data_inner(
         if shuffle:
             # {{{ maintain order of existing pages as much as possible
 
-            for fpd in (FlowPageData.objects
-                    .filter(
-                        flow_session=flow_session,
-                        group_id=grp.id,
-                        page_ordinal__isnull=False)
-                    .order_by("page_ordinal")):
+            for _, fpd in sorted(
+                    ((fpd.page_ordinal, fpd) for fpd in all_fpds
+                        if fpd.group_id == grp.id
+                        and fpd.page_ordinal is not None),
+                    key=itemgetter(0)):
 
                 if (fpd.page_id in available_page_ids
                         and len(group_pages) < max_page_count):
@@ -222,23 +239,16 @@ def _adjust_flow_session_page_data_inner(
             while len(group_pages) < max_page_count and available_page_ids:
                 new_page_id = choice(available_page_ids)
 
-                new_page_fpds = (FlowPageData.objects
-                        .filter(
-                            flow_session=flow_session,
-                            group_id=grp.id,
-                            page_id=new_page_id))
-
-                if new_page_fpds.count():
-                    # We already have FlowPageData for this page, revive it
-                    new_page_fpd, = new_page_fpds
-                    assert new_page_fpd.page_id == new_page_id
-                else:
+                new_page_fpd = group_page_id_to_fpd.get((grp.id, new_page_id))
+                if new_page_fpd is None:
                     # Make a new FlowPageData instance
                     page_desc = find_page(new_page_id)
                     assert page_desc.id == new_page_id
                     new_page_fpd = create_fpd(page_desc)
-                    assert new_page_fpd.page_id == new_page_id
 
+                # else: We already have FlowPageData for this page, revive it
+
+                assert new_page_fpd.page_id == new_page_id
                 add_page(new_page_fpd)
 
             # }}}
@@ -248,9 +258,8 @@ def _adjust_flow_session_page_data_inner(
 
             id_to_fpd = {
                     (fpd.group_id, fpd.page_id): fpd
-                    for fpd in FlowPageData.objects.filter(
-                        flow_session=flow_session,
-                        group_id=grp.id)}
+                    for fpd in all_fpds
+                    if fpd.group_id == grp.id}
 
             for page_desc in grp.pages:
                 key = (grp.id, page_desc.id)
@@ -270,17 +279,18 @@ def _adjust_flow_session_page_data_inner(
 
     # {{{ remove pages orphaned because of group renames
 
-    for fpd in (
-            FlowPageData.objects
-            .filter(
-                flow_session=flow_session,
-                page_ordinal__isnull=False)
-            .exclude(group_id__in=desc_group_ids)
-            ):
-        remove_page(fpd)
+    for fpd in all_fpds:
+        if fpd.page_ordinal is not None and fpd.group_id not in desc_group_ids:
+            remove_page(fpd)
 
     # }}}
 
+    if modified_fpds:
+        FlowPageData.objects.bulk_update(
+                modified_fpds.values(), ["page_ordinal", "title"])
+    if new_fpds:
+        FlowPageData.objects.bulk_create(new_fpds)
+
     return ordinal[0]  # new page count
 
 
@@ -301,13 +311,16 @@ def adjust_flow_session_page_data(
             flow_session.participation if respect_preview else None)
     revision_key = "2:"+commit_sha.decode()
 
+    # The page data only depends on the flow, which is determined by the
+    # commit, so sessions already adjusted against this commit are done
+    # before the flow is even loaded.
+    if flow_session.page_data_at_revision_key == revision_key:
+        return
+
     if flow_desc is None:
         flow_desc = get_flow_desc(repo, flow_session.course,
                 flow_session.flow_id, commit_sha)
 
-    if flow_session.page_data_at_revision_key == revision_key:
-        return
-
     new_page_count = _adjust_flow_session_page_data_inner(
             repo, flow_session, flow_desc, commit_sha)
 
@@ -819,6 +832,7 @@ def gather_grade_info(
     optional_incorrect_count = 0
     optional_unknown_count = 0
 
+    pages_and_grades: list[tuple[PageBase, FlowPageVisitGrade]] = []
     for i, page_data in enumerate(all_page_data):
         page = c_utils.get_flow_page_with_ctx(fctx, page_data)
 
@@ -841,7 +855,13 @@ def gather_grade_info(
         assert grade is not None
         assert grade.max_points is not None
 
-        feedback = get_feedback_for_grade(grade)
+        pages_and_grades.append((page, grade))
+
+    feedbacks = get_feedback_for_grades(
+            [grade for _page, grade in pages_and_grades])
+
+    for (page, grade), feedback in zip(pages_and_grades, feedbacks, strict=True):
+        assert grade.max_points is not None
 
         if page.is_optional_page:
             if feedback is None or feedback.correctness is None:
@@ -1318,6 +1338,68 @@ def regrade_session(
                     respect_preview=False)
 
 
+def prerun_code_for_regrade(
+        repo: Repo_ish,
+        course: Course,
+        sessions: Iterable[FlowSession],
+        ) -> None:
+    """Run the code of all code question answers that :func:`regrade_session`
+    would regrade for *sessions* in batches, ahead of time. Must be called
+    within a :func:`course.page.code.batched_code_runs` context, which
+    must also enclose the calls to :func:`regrade_session`.
+    """
+    from django.core.exceptions import ObjectDoesNotExist
+
+    from course.content import get_course_commit_sha, get_flow_desc, get_flow_page
+    from course.page import PageContext
+    from course.page.code import CodeQuestion, prerun_code_requests
+
+    commit_sha = get_course_commit_sha(course, None)
+
+    flow_descs: dict[str, FlowDesc] = {}
+    requests = []
+    for session in sessions:
+        flow_desc = flow_descs.get(session.flow_id)
+        if flow_desc is None:
+            try:
+                flow_desc = flow_descs[session.flow_id] = get_flow_desc(
+                        repo, course, session.flow_id, commit_sha)
+            except ObjectDoesNotExist:
+                continue
+
+        page_context = PageContext(
+                course=course,
+                repo=repo,
+                commit_sha=commit_sha,
+                flow_session=session)
+
+        for visit in assemble_answer_visits(session):
+            if visit is None or visit.answer is None:
+                continue
+            if session.in_progress and not visit.get_most_recent_grade():
+                continue
+
+            try:
+                page = get_flow_page(session.flow_id, flow_desc,
+                        visit.page_data.group_id, visit.page_data.page_id)
+            except ObjectDoesNotExist:
+                continue
+
+            if not isinstance(page, CodeQuestion):
+                continue
+
+            try:
+                user_code = page.get_code_from_answer_data(visit.answer)
+                run_req = page.get_run_request(page_context, user_code)
+            except (ObjectDoesNotExist, ValueError, OSError):
+                # Leave reporting the problem to the actual grading.
+                continue
+
+            requests.append((run_req, page.timeout, page.docker_image))
+
+    prerun_code_requests(requests)
+
+
 def recalculate_session_grade(
         repo: Repo_ish, course: Course, session: FlowSession) -> None:
     """Only redoes the final grade determination without regrading
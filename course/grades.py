@@ -34,6 +34,7 @@ from typing import (
 
 from crispy_forms.layout import Submit
 from django import forms, http
+from django.conf import settings
 from django.contrib import messages
 from django.core.exceptions import (
     ObjectDoesNotExist,
@@ -57,6 +58,7 @@ from course.models import (
     FlowPageVisit,
     FlowSession,
     GradeChange,
+    GradeState,
     GradeStateMachine,
     GradingOpportunity,
     Participation,
@@ -74,8 +76,11 @@ from relate.utils import (
 # {{{ for mypy
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable, Iterator, Sequence
+
     from course.content import FlowDesc
     from course.models import Course, FlowPageVisitGrade
+    from course.repo import Repo_ish
     from course.utils import CoursePageContext
 
 # }}}
@@ -113,18 +118,28 @@ def view_participant_grades(pctx, participation_id=None):
                 )
             .order_by("identifier"))
 
-    grade_changes = list(GradeChange.objects
-            .filter(
-                participation=grade_participation,
-                opportunity__pk__in=[gopp.pk for gopp in grading_opps],
-                opportunity__shown_in_grade_book=True)
-            .order_by(
-                "participation__id",
-                "opportunity__identifier",
-                "grade_time")
-            .select_related("participation")
-            .select_related("participation__user")
-            .select_related("opportunity"))
+    records: list[GradeChange] | list[GradeState]
+    if use_materialized_grade_states():
+        records = list(GradeState.objects
+                .filter(
+                    participation=grade_participation,
+                    opportunity__pk__in=[gopp.pk for gopp in grading_opps],
+                    opportunity__shown_in_grade_book=True)
+                .order_by("opportunity__identifier")
+                .select_related("opportunity"))
+    else:
+        records = list(GradeChange.objects
+                .filter(
+                    participation=grade_participation,
+                    opportunity__pk__in=[gopp.pk for gopp in grading_opps],
+                    opportunity__shown_in_grade_book=True)
+                .order_by(
+                    "participation__id",
+                    "opportunity__identifier",
+                    "grade_time")
+                .select_related("participation")
+                .select_related("participation__user")
+                .select_related("opportunity"))
 
     idx = 0
 
@@ -139,20 +154,19 @@ def view_participant_grades(pctx, participation_id=None):
                 continue
 
         while (
-                idx < len(grade_changes)
-                and grade_changes[idx].opportunity.identifier < opp.identifier
+                idx < len(records)
+                and records[idx].opportunity.identifier < opp.identifier
                 ):
             idx += 1
 
-        my_grade_changes = []
+        my_records = []
         while (
-                idx < len(grade_changes)
-                and grade_changes[idx].opportunity.pk == opp.pk):
-            my_grade_changes.append(grade_changes[idx])
+                idx < len(records)
+                and records[idx].opportunity.pk == opp.pk):
+            my_records.append(records[idx])
             idx += 1
 
-        state_machine = GradeStateMachine()
-        state_machine.consume(my_grade_changes)
+        state_machine = get_state_machine_from_records(my_records)
 
         grade_table.append(
                 GradeInfo(
@@ -218,71 +232,134 @@ class GradeInfo:
     grade_state_machine: GradeStateMachine
 
 
-def get_grade_table(course: Course) -> tuple[
-        list[Participation], list[GradingOpportunity], list[list[GradeInfo]]]:
+# Number of rows fetched per round trip when streaming the grade table
+GRADE_TABLE_CHUNK_SIZE = 2000
 
-    # NOTE: It's important that these queries are sorted consistently,
-    # also consistently with the code below.
-    grading_opps = list(GradingOpportunity.objects
+
+def use_materialized_grade_states() -> bool:
+    """Whether grade books are read from :class:`course.models.GradeState`
+    rather than computed from the full grade history. Grade states are only
+    maintained while ``RELATE_USE_MATERIALIZED_GRADE_STATES`` is enabled, so
+    run the ``rebuild_grade_states`` management command after enabling it.
+    """
+    return bool(getattr(settings, "RELATE_USE_MATERIALIZED_GRADE_STATES", False))
+
+
+def get_state_machine_from_records(
+        records: Sequence[GradeChange] | Sequence[GradeState]
+        ) -> GradeStateMachine:
+    """
+    :arg records: either the grade changes for one participation and
+        opportunity, ordered by grade time, or the (at most one)
+        corresponding grade state.
+    """
+    if records and isinstance(records[0], GradeState):
+        grade_state, = cast("Sequence[GradeState]", records)
+        return grade_state.get_state_machine()
+
+    state_machine = GradeStateMachine()
+    state_machine.consume(cast("Sequence[GradeChange]", records))
+    return state_machine
+
+
+def get_gradebook_opportunities(course: Course) -> list[GradingOpportunity]:
+    return list(GradingOpportunity.objects
             .filter(
                 course=course,
                 shown_in_grade_book=True,
                 )
             .order_by("identifier"))
 
-    participations = list(Participation.objects
+
+def iter_grade_table(
+            course: Course, grading_opps: list[GradingOpportunity]
+        ) -> Iterator[tuple[Participation, list[GradeInfo]]]:
+    """Yield a row of :class:`GradeInfo` (one for each of *grading_opps*,
+    which must be ordered by identifier) for each active participation
+    in *course*, ordered by participation ID.
+
+    Participations and grade changes are read in chunks and merged as they
+    arrive, so that memory use does not grow with the size of the course.
+    """
+
+    # NOTE: It's important that these queries are sorted consistently,
+    # also consistently with the code below.
+    participations = (Participation.objects
             .filter(
                 course=course,
                 status=ParticipationStatus.active)
             .order_by("id")
-            .select_related("user"))
-
-    grade_changes = list(GradeChange.objects
-            .filter(
-                opportunity__course=course,
-                opportunity__shown_in_grade_book=True)
-            .order_by(
-                "participation__id",
-                "opportunity__identifier",
-                "grade_time")
-            .select_related("participation")
-            .select_related("participation__user")
-            .select_related("opportunity"))
+            .select_related("user")
+            .iterator(chunk_size=GRADE_TABLE_CHUNK_SIZE))
+
+    # Either grade changes, to be replayed, or grade states, which already
+    # hold the result of the replay.
+    records: Iterator[GradeChange] | Iterator[GradeState]
+    if use_materialized_grade_states():
+        records = (GradeState.objects
+                .filter(
+                    opportunity__course=course,
+                    opportunity__shown_in_grade_book=True)
+                .order_by(
+                    "participation__id",
+                    "opportunity__identifier")
+                .select_related("opportunity")
+                .iterator(chunk_size=GRADE_TABLE_CHUNK_SIZE))
+    else:
+        records = (GradeChange.objects
+                .filter(
+                    opportunity__course=course,
+                    opportunity__shown_in_grade_book=True)
+                .order_by(
+                    "participation__id",
+                    "opportunity__identifier",
+                    "grade_time")
+                .select_related("opportunity")
+                .iterator(chunk_size=GRADE_TABLE_CHUNK_SIZE))
 
-    idx = 0
+    record = next(records, None)
 
-    grade_table = []
     for participation in participations:
         while (
-                idx < len(grade_changes)
-                and grade_changes[idx].participation.id < participation.id):
-            idx += 1
+                record is not None
+                and record.participation_id < participation.id):
+            record = next(records, None)
 
         grade_row = []
         for opp in grading_opps:
             while (
-                    idx < len(grade_changes)
-                    and grade_changes[idx].participation.pk == participation.pk
-                    and grade_changes[idx].opportunity.identifier < opp.identifier
+                    record is not None
+                    and record.participation_id == participation.pk
+                    and record.opportunity.identifier < opp.identifier
                     ):
-                idx += 1
+                record = next(records, None)
 
-            my_grade_changes = []
+            my_records = []
             while (
-                    idx < len(grade_changes)
-                    and grade_changes[idx].opportunity.pk == opp.pk
-                    and grade_changes[idx].participation.pk == participation.pk):
-                my_grade_changes.append(grade_changes[idx])
-                idx += 1
+                    record is not None
+                    and record.opportunity_id == opp.pk
+                    and record.participation_id == participation.pk):
+                my_records.append(record)
+                record = next(records, None)
 
-            state_machine = GradeStateMachine()
-            state_machine.consume(my_grade_changes)
+            state_machine = get_state_machine_from_records(my_records)
 
             grade_row.append(
                     GradeInfo(
                         opportunity=opp,
                         grade_state_machine=state_machine))
 
+        yield participation, grade_row
+
+
+def get_grade_table(course: Course) -> tuple[
+        list[Participation], list[GradingOpportunity], list[list[GradeInfo]]]:
+    grading_opps = get_gradebook_opportunities(course)
+
+    participations = []
+    grade_table = []
+    for participation, grade_row in iter_grade_table(course, grading_opps):
+        participations.append(participation)
         grade_table.append(grade_row)
 
     return participations, grading_opps, grade_table
@@ -310,35 +387,41 @@ def view_gradebook(pctx):
         })
 
 
-@course_view
-def export_gradebook_csv(pctx):
-    if not pctx.has_permission(PPerm.batch_export_grade):
-        raise PermissionDenied(_("may not batch-export grades"))
+class _EchoWriter:
+    """A file-like object that hands back whatever is written to it,
+    to let :func:`csv.writer` produce one line at a time.
+    """
 
-    participations, grading_opps, grade_table = get_grade_table(pctx.course)
+    def write(self, value: str) -> str:
+        return value
 
-    from io import StringIO
-    csvfile = StringIO()
 
+def iter_gradebook_csv_lines(course: Course) -> Iterator[str]:
     import csv
 
-    fieldnames = ["user_name", "last_name", "first_name"] + [
-            gopp.identifier for gopp in grading_opps]
-
-    writer = csv.writer(csvfile)
+    grading_opps = get_gradebook_opportunities(course)
+    writer = csv.writer(_EchoWriter())
 
-    writer.writerow(fieldnames)
+    yield writer.writerow(["user_name", "last_name", "first_name"] + [
+            gopp.identifier for gopp in grading_opps])
 
-    for participation, grades in zip(participations, grade_table, strict=True):
-        writer.writerow([
+    for participation, grades in iter_grade_table(course, grading_opps):
+        yield writer.writerow([
             participation.user.username,
             participation.user.last_name,
             participation.user.first_name,
             ] + [grade_info.grade_state_machine.stringify_machine_readable_state()
                 for grade_info in grades])
 
-    response = http.HttpResponse(
-            csvfile.getvalue().encode("utf-8"),
+
+@course_view
+def export_gradebook_csv(pctx):
+    if not pctx.has_permission(PPerm.batch_export_grade):
+        raise PermissionDenied(_("may not batch-export grades"))
+
+    response = http.StreamingHttpResponse(
+            (line.encode("utf-8")
+                for line in iter_gradebook_csv_lines(pctx.course)),
             content_type="text/plain; charset=utf-8")
     response["Content-Disposition"] = (
             f'attachment; filename="grades-{pctx.course.identifier}.csv"')
@@ -1182,22 +1265,26 @@ def find_participant_from_user_attr(course, attr_type, attr_str):
 
     matches_count = matches.count()
     if not matches_count or matches_count > 1:
-        from django.contrib.auth import get_user_model
-        from django.utils.encoding import force_str
-        attr_verbose_name = force_str(
-            get_user_model()._meta.get_field(attr_type).verbose_name)
+        _raise_user_attr_match_error(attr_type, attr_str, matches_count)
+
+    return matches[0]
 
-        map_dict = {"user_attr": attr_verbose_name, "user_attr_str": attr_str}
 
-        if not matches_count:
-            raise ParticipantNotFound(
-                    _("no participant found with %(user_attr)s "
-                    "'%(user_attr_str)s'") % map_dict)
+def _raise_user_attr_match_error(attr_type, attr_str, matches_count):
+    from django.contrib.auth import get_user_model
+    from django.utils.encoding import force_str
+    attr_verbose_name = force_str(
+        get_user_model()._meta.get_field(attr_type).verbose_name)
+
+    map_dict = {"user_attr": attr_verbose_name, "user_attr_str": attr_str}
+
+    if not matches_count:
         raise ParticipantNotFound(
-                _("more than one participant found with %(user_attr)s "
+                _("no participant found with %(user_attr)s "
                 "'%(user_attr_str)s'") % map_dict)
-
-    return matches[0]
+    raise ParticipantNotFound(
+            _("more than one participant found with %(user_attr)s "
+            "'%(user_attr_str)s'") % map_dict)
 
 
 def find_participant_from_id(course, id_str):
@@ -1225,17 +1312,85 @@ def find_participant_from_id(course, id_str):
             surviving_matches.append(match)
             continue
 
-    if not surviving_matches:
+    if len(surviving_matches) != 1:
+        _raise_id_match_error(id_str, len(surviving_matches))
+
+    return surviving_matches[0]
+
+
+def _raise_id_match_error(id_str, matches_count):
+    if not matches_count:
         raise ParticipantNotFound(
                 # Translators: use id_string to find user (participant).
                 _("no participant found for '%(id_string)s'") % {
                     "id_string": id_str})
-    if len(surviving_matches) > 1:
-        raise ParticipantNotFound(
-                _("more than one participant found for '%(id_string)s'") % {
-                    "id_string": id_str})
+    raise ParticipantNotFound(
+            _("more than one participant found for '%(id_string)s'") % {
+                "id_string": id_str})
+
+
+class ParticipantLookup:
+    """An index of the active participants of a course by username,
+    institutional ID and email, read with a single query. Finds participants
+    like :func:`find_participant_from_user_attr` and
+    :func:`find_participant_from_id`, for when many of them are looked up
+    at once.
+    """
+
+    def __init__(self, course: Course) -> None:
+        self.by_username: dict[str, list[Participation]] = {}
+        self.by_institutional_id: dict[str, list[Participation]] = {}
+        self.by_email: dict[str, list[Participation]] = {}
+        self.by_email_uid: dict[str, list[Participation]] = {}
+
+        for participation in (Participation.objects
+                .filter(
+                    course=course,
+                    status=ParticipationStatus.active)
+                .select_related("user")):
+            user = participation.user
+
+            self.by_username.setdefault(
+                    user.username, []).append(participation)
+            if user.institutional_id is not None:
+                self.by_institutional_id.setdefault(
+                        user.institutional_id.lower(), []).append(participation)
+
+            if user.email:
+                email = user.email.lower()
+                self.by_email.setdefault(email, []).append(participation)
+
+                at_index = email.find("@")
+                if at_index > 0:
+                    self.by_email_uid.setdefault(
+                            email[:at_index], []).append(participation)
+
+    def find_from_user_attr(self, attr_type: str, attr_str: str) -> Participation:
+        attr_str = attr_str.strip()
+
+        if attr_type == "username":
+            matches = self.by_username.get(attr_str, [])
+        elif attr_type == "institutional_id":
+            matches = self.by_institutional_id.get(attr_str.lower(), [])
+        else:
+            raise NotImplementedError()
 
-    return surviving_matches[0]
+        if len(matches) != 1:
+            _raise_user_attr_match_error(attr_type, attr_str, len(matches))
+
+        return matches[0]
+
+    def find_from_id(self, id_str: str) -> Participation:
+        id_str = id_str.strip().lower()
+
+        matches = [
+                *self.by_email.get(id_str, []),
+                *self.by_email_uid.get(id_str, [])]
+
+        if len(matches) != 1:
+            _raise_id_match_error(id_str, len(matches))
+
+        return matches[0]
 
 
 def fix_decimal(s):
@@ -1261,35 +1416,56 @@ def points_equal(num: Decimal | None, other: Decimal | None) -> bool:
     return abs(num - other) < Decimal("0.01")
 
 
-def csv_to_grade_changes(
+# Number of grade changes created with each query when importing grades
+GRADE_IMPORT_BATCH_SIZE = 500
+
+
+def _get_last_grades(grading_opportunity, attempt_id):
+    """Return a mapping from participation IDs to their most recent grade
+    changes for *grading_opportunity* and *attempt_id*.
+    """
+    last_grades = {}
+    for gchange in (GradeChange.objects
+            .filter(
+                opportunity=grading_opportunity,
+                attempt_id=attempt_id)
+            .order_by("grade_time")
+            .iterator()):
+        last_grades[gchange.participation_id] = gchange
+
+    return last_grades
+
+
+def iter_csv_grade_changes(
         log_lines,
         course, grading_opportunity, attempt_id, file_contents,
         attr_type, attr_column, points_column, feedback_column,
         max_points, creator, grade_time, has_header,
-
-        # Row count limited to avoid out-of-memory situation.
-        # https://github.com/inducer/relate/issues/849
-        max_rows=10_000):
-    result = []
-
+        report_progress=None):
+    """Read the rows of the CSV file *file_contents* one at a time, and yield
+    a :class:`~course.models.GradeChange` (not yet saved) for each row
+    that changes a participant's grade. Rows for which no participant is
+    found and updated grades are noted in *log_lines*.
+
+    Participants and their previous grades are read with one query each up
+    front, so that the number of queries does not depend on the number of
+    rows.
+
+    :arg report_progress: if not *None*, called with the number of rows
+        read so far after each row.
+    """
     import csv
 
     from course.utils import get_col_contents_or_empty
 
-    gchange_count = 0
-    row_count = 0
+    participant_lookup = ParticipantLookup(course)
+    last_grades = _get_last_grades(grading_opportunity, attempt_id)
 
+    row_count = 0
     for row in csv.reader(file_contents):
         row_count += 1
-        if row_count % 30 == 0:
-            print(row_count)
-
-        if row_count >= max_rows:
-            raise ValueError(_(
-                "Too many rows. "
-                "Aborted processing after %d rows. "
-                "Please split your file into smaller pieces.")
-                % max_rows)
+        if report_progress is not None:
+            report_progress(row_count)
 
         if has_header:
             has_header = False
@@ -1299,11 +1475,11 @@ def csv_to_grade_changes(
         gchange.opportunity = grading_opportunity
         try:
             if attr_type == "email_or_id":
-                gchange.participation = find_participant_from_id(
-                        course, get_col_contents_or_empty(row, attr_column-1))
+                gchange.participation = participant_lookup.find_from_id(
+                        get_col_contents_or_empty(row, attr_column-1))
             elif attr_type in ["institutional_id", "username"]:
-                gchange.participation = find_participant_from_user_attr(
-                        course, attr_type,
+                gchange.participation = participant_lookup.find_from_user_attr(
+                        attr_type,
                         get_col_contents_or_empty(row, attr_column-1))
             else:
                 raise NotImplementedError()
@@ -1328,46 +1504,146 @@ def csv_to_grade_changes(
         gchange.creator = creator
         gchange.grade_time = grade_time
 
-        last_grades = (GradeChange.objects
-                .filter(
-                    opportunity=grading_opportunity,
-                    participation=gchange.participation,
-                    attempt_id=gchange.attempt_id)
-                .order_by("-grade_time")[:1])
-
-        if last_grades.count():
-            last_grade, = last_grades
-
-            if last_grade.state == GradeStateChangeType.graded:
-                updated = []
-                if not points_equal(last_grade.points, gchange.points):
-                    updated.append(gettext("points"))
-                if not points_equal(last_grade.max_points, gchange.max_points):
-                    updated.append(gettext("max_points"))
-                if last_grade.comment != gchange.comment:
-                    updated.append(gettext("comment"))
-
-                if updated:
-                    log_lines.append(
-                            string_concat(
-                                "%(participation)s: %(updated)s ",
-                                _("updated")
-                                ) % {
-                                    "participation": gchange.participation,
-                                    "updated": ", ".join(updated)})
-
-                    result.append(gchange)
-            else:
-                result.append(gchange)
+        last_grade = last_grades.get(gchange.participation.id)
+        if last_grade is not None and \
+                last_grade.state == GradeStateChangeType.graded:
+            updated = []
+            if not points_equal(last_grade.points, gchange.points):
+                updated.append(gettext("points"))
+            if not points_equal(last_grade.max_points, gchange.max_points):
+                updated.append(gettext("max_points"))
+            if last_grade.comment != gchange.comment:
+                updated.append(gettext("comment"))
+
+            if updated:
+                log_lines.append(
+                        string_concat(
+                            "%(participation)s: %(updated)s ",
+                            _("updated")
+                            ) % {
+                                "participation": gchange.participation,
+                                "updated": ", ".join(updated)})
 
+                yield gchange
+            else:
+                yield None
         else:
-            result.append(gchange)
+            yield gchange
+
+
+def csv_to_grade_changes(
+        log_lines,
+        course, grading_opportunity, attempt_id, file_contents,
+        attr_type, attr_column, points_column, feedback_column,
+        max_points, creator, grade_time, has_header):
+    """Like :func:`iter_csv_grade_changes`, but return
+    *(number of grades found, list of grade changes)*.
+    """
+    result = []
+    gchange_count = 0
 
+    for gchange in iter_csv_grade_changes(
+            log_lines=log_lines,
+            course=course,
+            grading_opportunity=grading_opportunity,
+            attempt_id=attempt_id,
+            file_contents=file_contents,
+            attr_type=attr_type,
+            attr_column=attr_column,
+            points_column=points_column,
+            feedback_column=feedback_column,
+            max_points=max_points,
+            creator=creator,
+            grade_time=grade_time,
+            has_header=has_header):
         gchange_count += 1
+        if gchange is not None:
+            result.append(gchange)
 
     return gchange_count, result
 
 
+def save_imported_grade_changes(grade_changes):
+    """Save the grade changes from the iterable *grade_changes* in batches
+    of :data:`GRADE_IMPORT_BATCH_SIZE`, skipping *None* entries.
+
+    :returns: *(number of entries, number of grade changes saved)*
+    """
+    from course.models import update_grade_states
+
+    total_count = 0
+    saved_count = 0
+
+    def save_batch(batch):
+        GradeChange.objects.bulk_create(batch)
+
+        if not use_materialized_grade_states():
+            return
+
+        # bulk_create does not send the signals that keep the
+        # grade states current
+        opportunity_id_to_pids = {}
+        for gchange in batch:
+            opportunity_id_to_pids.setdefault(
+                    gchange.opportunity_id, set()).add(gchange.participation_id)
+        for opportunity_id, pids in opportunity_id_to_pids.items():
+            update_grade_states(opportunity_id, pids)
+
+    # An error in a later row must not leave the import half done.
+    with transaction.atomic():
+        batch = []
+        for gchange in grade_changes:
+            total_count += 1
+            if gchange is None:
+                continue
+
+            batch.append(gchange)
+            saved_count += 1
+            if len(batch) >= GRADE_IMPORT_BATCH_SIZE:
+                save_batch(batch)
+                batch = []
+
+        if batch:
+            save_batch(batch)
+
+    return total_count, saved_count
+
+
+# Uploads at least this large are imported by a background task.
+GRADE_IMPORT_BACKGROUND_MIN_BYTES = 256*1024
+
+
+def get_grade_import_background_min_bytes() -> int:
+    return getattr(settings, "RELATE_GRADE_IMPORT_BACKGROUND_MIN_BYTES",
+            GRADE_IMPORT_BACKGROUND_MIN_BYTES)
+
+
+def import_grades_in_background(pctx, cleaned_data, uploaded_file):
+    from uuid import uuid4
+
+    uploaded_file.seek(0)
+    storage_filename = settings.RELATE_BULK_STORAGE.save(
+            f"grade-imports/{pctx.course.identifier}/{uuid4().hex}.csv",
+            uploaded_file)
+
+    from course.tasks import import_grades_from_csv
+    async_res = import_grades_from_csv.delay(
+            pctx.course.id,
+            cleaned_data["grading_opportunity"].id,
+            cleaned_data["attempt_id"],
+            storage_filename,
+            attr_type=cleaned_data["attr_type"],
+            attr_column=cleaned_data["attr_column"],
+            points_column=cleaned_data["points_column"],
+            feedback_column=cleaned_data["feedback_column"],
+            max_points=cleaned_data["max_points"],
+            creator_id=pctx.request.user.id,
+            grade_time=now(),
+            has_header=cleaned_data["format"] == "csvhead")
+
+    return redirect("relate-monitor_task", async_res.id)
+
+
 @course_view
 @transaction.atomic
 def import_grades(pctx):
@@ -1386,11 +1662,15 @@ def import_grades(pctx):
 
         is_import = "import" in request.POST
         if form.is_valid():
+            f = request.FILES["file"]
+
+            if is_import and f.size >= get_grade_import_background_min_bytes():
+                return import_grades_in_background(pctx, form.cleaned_data, f)
+
             try:
-                f = request.FILES["file"]
                 f.seek(0)
                 data = f.read().decode("utf-8", errors="replace")
-                total_count, grade_changes = csv_to_grade_changes(
+                grade_changes = iter_csv_grade_changes(
                         log_lines=log_lines,
                         course=pctx.course,
                         grading_opportunity=form.cleaned_data["grading_opportunity"],
@@ -1404,6 +1684,19 @@ def import_grades(pctx):
                         creator=request.user,
                         grade_time=now(),
                         has_header=form.cleaned_data["format"] == "csvhead")
+
+                if is_import:
+                    total_count, changed_count = \
+                            save_imported_grade_changes(grade_changes)
+                    preview_grade_changes = []
+                else:
+                    preview_grade_changes = list(grade_changes)
+                    total_count = len(preview_grade_changes)
+                    preview_grade_changes = [
+                            gchange for gchange in preview_grade_changes
+                            if gchange is not None]
+                    changed_count = len(preview_grade_changes)
+
             except Exception as e:
                 messages.add_message(pctx.request, messages.ERROR,
                         string_concat(
@@ -1414,28 +1707,27 @@ def import_grades(pctx):
                             "err_type": type(e).__name__,
                             "err_str": str(e)})
             else:
-                if total_count != len(grade_changes):
+                if total_count != changed_count:
                     messages.add_message(pctx.request, messages.INFO,
                             _("%(total)d grades found, %(unchanged)d unchanged.")
                             % {"total": total_count,
-                               "unchanged": total_count - len(grade_changes)})
+                               "unchanged": total_count - changed_count})
 
                 from django.template.loader import render_to_string
 
                 if is_import:
-                    GradeChange.objects.bulk_create(grade_changes)
                     form_text = render_to_string(
                             "course/grade-import-preview.html", {
                                 "show_grade_changes": False,
                                 "log_lines": log_lines,
                                 })
                     messages.add_message(pctx.request, messages.SUCCESS,
-                            _("%d grades imported.") % len(grade_changes))
+                            _("%d grades imported.") % changed_count)
                 else:
                     form_text = render_to_string(
                             "course/grade-import-preview.html", {
                                 "show_grade_changes": True,
-                                "grade_changes": grade_changes,
+                                "grade_changes": preview_grade_changes,
                                 "log_lines": log_lines,
                                 })
 
@@ -1501,6 +1793,207 @@ class DownloadAllSubmissionsForm(StyledForm):
                 Submit("download", _("Download")))
 
 
+# Downloads of at least this many submitted answers are zipped by a
+# background task.
+DOWNLOAD_SUBMISSIONS_BACKGROUND_MIN_COUNT = 200
+
+
+def get_download_submissions_background_min_count() -> int:
+    return getattr(settings, "RELATE_DOWNLOAD_SUBMISSIONS_BACKGROUND_MIN_COUNT",
+            DOWNLOAD_SUBMISSIONS_BACKGROUND_MIN_COUNT)
+
+
+def get_submission_visits(
+        course: Course, flow_id: str, group_id: str, page_id: str, *,
+        which_attempt: str, rules_tag: str | None,
+        non_in_progress_only: bool):
+    visits = (FlowPageVisit.objects
+            .filter(
+                flow_session__course=course,
+                flow_session__flow_id=flow_id,
+                page_data__group_id=group_id,
+                page_data__page_id=page_id,
+                is_submitted_answer=True,
+                )
+            .select_related("flow_session")
+            .select_related("flow_session__participation__user")
+            .select_related("page_data")
+
+            # The first submission found for each archive entry is used
+            # (see iter_submission_zip_entries).
+            .order_by("visit_time" if which_attempt == "first" else "-visit_time"))
+
+    if non_in_progress_only:
+        visits = visits.filter(flow_session__in_progress=False)
+
+    if rules_tag is not None:
+        visits = visits.filter(flow_session__access_rules_tag=rules_tag)
+
+    return visits
+
+
+def iter_submission_zip_entries(
+        course: Course, repo: Repo_ish, commit_sha: bytes,
+        flow_id: str, group_id: str, page_id: str, visits, *,
+        which_attempt: str, include_feedback: bool,
+        report_progress: Callable[[int], None] | None = None,
+        ) -> Iterator[tuple[str, bytes | str]]:
+    """Yield *(file name, contents)* for each file of the submissions
+    archive, computing one submission at a time.
+
+    :arg visits: as returned by :func:`get_submission_visits`.
+    :arg report_progress: if not *None*, called with the number of visits
+        looked at so far.
+    """
+    from course.page import PageContext
+    from course.page.base import AnswerFeedback
+    from course.utils import PageInstanceCache
+    page_cache = PageInstanceCache(repo, course, flow_id)
+
+    seen_keys: set[tuple[str, ...]] = set()
+
+    for ivisit, visit in enumerate(visits.iterator()):
+        if report_progress is not None:
+            report_progress(ivisit)
+
+        assert visit.flow_session.participation is not None
+
+        key: tuple[str, ...]
+        if which_attempt in ["first", "last"]:
+            key = (visit.flow_session.participation.user.username,)
+        elif which_attempt == "all":
+            key = (visit.flow_session.participation.user.username,
+                    str(visit.flow_session.id))
+        else:
+            raise NotImplementedError()
+
+        if key in seen_keys:
+            continue
+
+        page = page_cache.get_page(group_id, page_id, commit_sha)
+
+        grading_page_context = PageContext(
+                course=course,
+                repo=repo,
+                commit_sha=commit_sha,
+                flow_session=visit.flow_session)
+
+        bytes_answer = page.normalized_bytes_answer(
+                grading_page_context, visit.page_data.data,
+                visit.answer)
+
+        if bytes_answer is None:
+            continue
+
+        seen_keys.add(key)
+
+        extension, answer_bytes = bytes_answer
+        basename = "-".join(key)
+        yield basename + extension, answer_bytes
+
+        if include_feedback:
+            visit_grades = list(visit.grades.all())
+
+            feedback_lines: list[str] = []
+
+            feedback_lines.append(
+                "scores: {}".format(", ".join(
+                        str(g.correctness)
+                        for g in visit_grades)))
+
+            for i, grade in enumerate(visit_grades):
+                feedback_lines.extend(
+                            (75 * "-",
+                                "grade %i: score: %s"
+                                    % (i + 1, grade.correctness)))
+                afb = AnswerFeedback.from_json(grade.feedback, None)
+                if afb is not None:
+                    feedback_lines.append(afb.feedback)
+
+            yield basename + "-feedback.txt", "\n".join(feedback_lines)
+
+
+class _ZipStreamBuffer:
+    """A write-only file collecting the output of a
+    :class:`zipfile.ZipFile`, so that it can be sent out piece by piece.
+    Since it cannot seek, the archive is written with data descriptors.
+    """
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+        self.position = 0
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def pop(self) -> bytes:
+        result = b"".join(self.chunks)
+        self.chunks = []
+        return result
+
+
+def stream_submissions_zip(
+        entries: Iterable[tuple[str, bytes | str]]) -> Iterator[bytes]:
+    from zipfile import ZipFile
+
+    buf = _ZipStreamBuffer()
+    with ZipFile(buf, "w") as subm_zip:
+        for name, contents in entries:
+            subm_zip.writestr(name, contents)
+            yield buf.pop()
+
+    yield buf.pop()
+
+
+def get_submissions_zip_storage_name(
+        course_identifier: str, zip_id: str, filename: str) -> str:
+    return f"submission-zips/{course_identifier}/{zip_id}/{filename}"
+
+
+def download_all_submissions_in_background(
+        pctx: CoursePageContext, flow_id: str, group_id: str, page_id: str,
+        cleaned_data: dict[str, Any], rules_tag: str | None,
+        filename: str) -> http.HttpResponse:
+    from uuid import uuid4
+    zip_id = uuid4().hex
+
+    extra_file = pctx.request.FILES.get("extra_file")
+    extra_file_storage_name = None
+    extra_file_name = None
+    if extra_file is not None and extra_file.name is not None:
+        extra_file_name = extra_file.name
+        extra_file_storage_name = settings.RELATE_BULK_STORAGE.save(
+                get_submissions_zip_storage_name(
+                    pctx.course.identifier, zip_id, "extra-file"),
+                extra_file)
+
+    from course.tasks import zip_submissions
+    async_res = zip_submissions.delay(
+            pctx.course.id, flow_id, group_id, page_id,
+            pctx.course_commit_sha.decode(),
+            which_attempt=cleaned_data["which_attempt"],
+            rules_tag=rules_tag,
+            non_in_progress_only=cleaned_data["non_in_progress_only"],
+            include_feedback=cleaned_data["include_feedback"],
+            extra_file_storage_name=extra_file_storage_name,
+            extra_file_name=extra_file_name,
+            zip_id=zip_id,
+            filename=filename)
+
+    return redirect("relate-monitor_task", async_res.id)
+
+
 @course_view
 def download_all_submissions(pctx: CoursePageContext, flow_id: str):
     if not pctx.has_permission(PPerm.batch_download_submission):
@@ -1527,8 +2020,6 @@ def download_all_submissions(pctx: CoursePageContext, flow_id: str):
             for group_desc in flow_desc.groups
             for page_desc in group_desc.pages]
 
-    from course.page.base import AnswerFeedback
-
     request = pctx.request
     if request.method == "POST":
         form = DownloadAllSubmissionsForm(page_ids, session_tag_choices,
@@ -1541,116 +2032,57 @@ def download_all_submissions(pctx: CoursePageContext, flow_id: str):
             group_id = form.cleaned_data["page_id"][:slash_index]
             page_id = form.cleaned_data["page_id"][slash_index+1:]
 
-            from course.utils import PageInstanceCache
-            page_cache = PageInstanceCache(pctx.repo, pctx.course, flow_id)
-
-            visits = (FlowPageVisit.objects
-                    .filter(
-                        flow_session__course=pctx.course,
-                        flow_session__flow_id=flow_id,
-                        page_data__group_id=group_id,
-                        page_data__page_id=page_id,
-                        is_submitted_answer=True,
-                        )
-                    .select_related("flow_session")
-                    .select_related("flow_session__participation__user")
-                    .select_related("page_data")
-
-                    # We overwrite earlier submissions with later ones
-                    # in a dictionary below.
-                    .order_by("visit_time"))
-
-            if form.cleaned_data["non_in_progress_only"]:
-                visits = visits.filter(flow_session__in_progress=False)
-
-            if form.cleaned_data["restrict_to_rules_tag"] != ALL_SESSION_TAG:
-                visits = (visits
-                        .filter(
-                            flow_session__access_rules_tag=(
-                                form.cleaned_data["restrict_to_rules_tag"])))
-
-            submissions: dict[
-                    tuple[str, ...],
-                    tuple[tuple[str, bytes], list[FlowPageVisitGrade]]] = {}
-
-            for visit in visits:
-                page = page_cache.get_page(group_id, page_id,
-                        pctx.course_commit_sha)
-
-                from course.page import PageContext
-                grading_page_context = PageContext(
-                        course=pctx.course,
-                        repo=pctx.repo,
-                        commit_sha=pctx.course_commit_sha,
-                        flow_session=visit.flow_session)
-
-                bytes_answer = page.normalized_bytes_answer(
-                        grading_page_context, visit.page_data.data,
-                        visit.answer)
-
-                assert visit.flow_session.participation is not None
-
-                key: tuple[str, ...]
-                if which_attempt in ["first", "last"]:
-                    key = (visit.flow_session.participation.user.username,)
-                elif which_attempt == "all":
-                    key = (visit.flow_session.participation.user.username,
-                            str(visit.flow_session.id))
-                else:
-                    raise NotImplementedError()
-
-                if bytes_answer is not None:
-                    if (which_attempt == "first"
-                            and key in submissions):
-                        # Already there, disregard further ones
-                        continue
-
-                    submissions[key] = (
-                            bytes_answer, list(visit.grades.all()))
-
-            from io import BytesIO
-            from zipfile import ZipFile
-            bio = BytesIO()
-            with ZipFile(bio, "w") as subm_zip:
-                for zip_key, ((extension, answer_bytes), visit_grades) in \
-                        submissions.items():
-                    basename = "-".join(zip_key)
-                    subm_zip.writestr(
-                            basename + extension,
-                            answer_bytes)
-
-                    if form.cleaned_data["include_feedback"]:
-                        feedback_lines: list[str] = []
-
-                        feedback_lines.append(
-                            "scores: {}".format(", ".join(
-                                    str(g.correctness)
-                                    for g in visit_grades)))
-
-                        for i, grade in enumerate(visit_grades):
-                            feedback_lines.extend(
-                                        (75 * "-",
-                                            "grade %i: score: %s"
-                                                % (i + 1, grade.correctness)))
-                            afb = AnswerFeedback.from_json(grade.feedback, None)
-                            if afb is not None:
-                                feedback_lines.append(afb.feedback)
-
-                        subm_zip.writestr(
-                                basename + "-feedback.txt",
-                                "\n".join(feedback_lines))
-
-                extra_file = request.FILES.get("extra_file")
-                if extra_file is not None and extra_file.name is not None:
-                    subm_zip.writestr(extra_file.name, extra_file.read())
-
-            response = http.HttpResponse(
-                    bio.getvalue(),
+            rules_tag = form.cleaned_data["restrict_to_rules_tag"]
+            if rules_tag == ALL_SESSION_TAG:
+                rules_tag = None
+
+            visits = get_submission_visits(
+                    pctx.course, flow_id, group_id, page_id,
+                    which_attempt=which_attempt,
+                    rules_tag=rules_tag,
+                    non_in_progress_only=form.cleaned_data["non_in_progress_only"])
+
+            filename = (
+                    f"submissions_{pctx.course.identifier}_"
+                    f"{flow_id}_{group_id}_{page_id}_"
+                    f'{now().date().strftime("%Y-%m-%d")}.zip')
+
+            if visits.count() >= get_download_submissions_background_min_count():
+                return download_all_submissions_in_background(
+                        pctx, flow_id, group_id, page_id, form.cleaned_data,
+                        rules_tag, filename)
+
+            course = pctx.course
+            commit_sha = pctx.course_commit_sha
+            include_feedback = form.cleaned_data["include_feedback"]
+
+            def iter_page_entries() -> Iterator[tuple[str, bytes | str]]:
+                # The response is streamed after course_view has closed
+                # pctx.repo.
+                from course.content import get_course_repo
+                repo = get_course_repo(course)
+                try:
+                    yield from iter_submission_zip_entries(
+                            course, repo, commit_sha,
+                            flow_id, group_id, page_id, visits,
+                            which_attempt=which_attempt,
+                            include_feedback=include_feedback)
+                finally:
+                    repo.close()
+
+            entries: list[Iterable[tuple[str, bytes | str]]] = [
+                    iter_page_entries()]
+
+            extra_file = request.FILES.get("extra_file")
+            if extra_file is not None and extra_file.name is not None:
+                entries.append([(extra_file.name, extra_file.read())])
+
+            from itertools import chain
+            response = http.StreamingHttpResponse(
+                    stream_submissions_zip(chain.from_iterable(entries)),
                     content_type="application/zip")
             response["Content-Disposition"] = (
-                    f'attachment; filename="submissions_{pctx.course.identifier}_'
-                    f'{flow_id}_{group_id}_{page_id}_'
-                    f'{now().date().strftime("%Y-%m-%d")}.zip"')
+                    f'attachment; filename="{filename}"')
             return response
 
     else:
@@ -1661,6 +2093,25 @@ def download_all_submissions(pctx: CoursePageContext, flow_id: str):
         "form_description": _("Download All Submissions in Zip file")
         })
 
+
+@course_view
+def download_submissions_zip(
+        pctx: CoursePageContext, zip_id: str, filename: str):
+    if not pctx.has_permission(PPerm.batch_download_submission):
+        raise PermissionDenied(_("may not batch-download submissions"))
+
+    bulk_storage = settings.RELATE_BULK_STORAGE
+    storage_name = get_submissions_zip_storage_name(
+            pctx.course.identifier, zip_id, filename)
+    if not bulk_storage.exists(storage_name):
+        raise http.Http404()
+
+    return http.FileResponse(
+            bulk_storage.open(storage_name, "rb"),
+            as_attachment=True,
+            filename=filename,
+            content_type="application/zip")
+
 # }}}
 
 
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from course.models import (
+    Course,
+    GradeChange,
+    GradeState,
+    get_grade_state_fields,
+)
+
+
+BATCH_SIZE = 1000
+
+
+def rebuild_grade_states(course: Course, stderr) -> int:
+    grade_changes = (GradeChange.objects
+            .filter(opportunity__course=course)
+            .order_by("participation_id", "opportunity_id", "grade_time")
+            .select_related("opportunity")
+            .iterator(chunk_size=BATCH_SIZE))
+
+    count = 0
+    with transaction.atomic():
+        GradeState.objects.filter(opportunity__course=course).delete()
+
+        grade_states = []
+        for (participation_id, opportunity_id), pair_grade_changes in groupby(
+                grade_changes,
+                key=lambda gchange: (
+                    gchange.participation_id, gchange.opportunity_id)):
+            try:
+                fields = get_grade_state_fields(pair_grade_changes)
+            except (ValueError, AssertionError) as e:
+                stderr.write(f"warning: participation {participation_id}, "
+                        f"grading opportunity {opportunity_id}: {e}")
+                continue
+
+            grade_states.append(GradeState(
+                participation_id=participation_id,
+                opportunity_id=opportunity_id,
+                **fields))
+
+            if len(grade_states) >= BATCH_SIZE:
+                GradeState.objects.bulk_create(grade_states)
+                count += len(grade_states)
+                grade_states = []
+
+        GradeState.objects.bulk_create(grade_states)
+        count += len(grade_states)
+
+    return count
+
+
+class Command(BaseCommand):
+    help = (
+            "Recomputes the stored grade states (the current grade of each "
+            "participant for each grading opportunity) from the grade history. "
+            "Run this after enabling RELATE_USE_MATERIALIZED_GRADE_STATES.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "courses", nargs="*", metavar="COURSE_IDENTIFIER",
+            help="Only rebuild grade states for these courses "
+                 "(default: all courses)")
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by("identifier")
+        if options["courses"]:
+            courses = courses.filter(identifier__in=options["courses"])
+
+        for course in courses:
+            count = rebuild_grade_states(course, self.stderr)
+            self.stdout.write(
+                    f"{course.identifier}: rebuilt {count} grade states")
+
+# vim: foldmethod=marker
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.3 on 2026-10-18 05:24
+
+import django.db.models.deletion
+import jsonfield.fields
+from django.db import migrations, models
+
+import course.constants
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0123_delete_flowaccessexception'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeState',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('state', models.CharField(blank=True, choices=[(course.constants.GradeStateChangeType['grading_started'], 'Grading started'), (course.constants.GradeStateChangeType['graded'], 'Graded'), (course.constants.GradeStateChangeType['retrieved'], 'Retrieved'), (course.constants.GradeStateChangeType['unavailable'], 'Unavailable'), (course.constants.GradeStateChangeType['extension'], 'Extension'), (course.constants.GradeStateChangeType['report_sent'], 'Report sent'), (course.constants.GradeStateChangeType['do_over'], 'Do-over'), (course.constants.GradeStateChangeType['exempt'], 'Exempt')], max_length=50, null=True, verbose_name='State')),
+                ('valid_percentages', jsonfield.fields.JSONField(blank=True, default=list, verbose_name='Valid percentages')),
+                ('has_extension', models.BooleanField(default=False, verbose_name='Has extension')),
+                ('due_time', models.DateTimeField(blank=True, null=True, verbose_name='Due time')),
+                ('last_graded_time', models.DateTimeField(blank=True, null=True, verbose_name='Last graded time')),
+                ('last_report_time', models.DateTimeField(blank=True, null=True, verbose_name='Last report time')),
+                ('opportunity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.gradingopportunity', verbose_name='Grading opportunity')),
+                ('participation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.participation', verbose_name='Participation')),
+            ],
+            options={
+                'verbose_name': 'Grade state',
+                'verbose_name_plural': 'Grade states',
+                'unique_together': {('participation', 'opportunity')},
+            },
+        ),
+    ]
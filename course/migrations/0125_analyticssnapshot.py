@@ -0,0 +1,35 @@
+# Generated by Django 6.0.3 on 2026-10-18 05:36
+
+import django.db.models.deletion
+import django.utils.timezone
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0124_gradestate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('flow_id', models.CharField(max_length=200, verbose_name='Flow ID')),
+                ('group_id', models.CharField(blank=True, default='', max_length=200, verbose_name='Group ID')),
+                ('page_id', models.CharField(blank=True, default='', max_length=200, verbose_name='Page ID')),
+                ('commit_sha', models.CharField(max_length=200, verbose_name='Git commit SHA')),
+                ('restrict_to_first_attempt', models.BooleanField(verbose_name='Restrict to first attempt')),
+                ('computation_time', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Computation time')),
+                ('data', jsonfield.fields.JSONField(dump_kwargs={'ensure_ascii': False}, verbose_name='Data')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='course.course', verbose_name='Course')),
+            ],
+            options={
+                'verbose_name': 'Analytics snapshot',
+                'verbose_name_plural': 'Analytics snapshots',
+                'unique_together': {('course', 'flow_id', 'group_id', 'page_id', 'commit_sha', 'restrict_to_first_attempt')},
+            },
+        ),
+    ]
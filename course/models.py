@@ -24,16 +24,22 @@ LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
+import logging
 from typing import (
     TYPE_CHECKING,
     Any,
+    TypeVar,
 )
 
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.core.exceptions import (
+    ImproperlyConfigured,
+    ObjectDoesNotExist,
+    ValidationError,
+)
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.timezone import now
@@ -71,7 +77,7 @@ from relate.utils import string_concat
 
 if TYPE_CHECKING:
     import datetime
-    from collections.abc import Iterable
+    from collections.abc import Callable, Iterable, Sequence
     from decimal import Decimal
 
     from course.content import FlowDesc
@@ -84,6 +90,9 @@ from jsonfield import JSONField
 from yamlfield.fields import YAMLField
 
 
+logger = logging.getLogger(__name__)
+
+
 # {{{ course
 
 def validate_course_specific_language(value: str) -> None:
@@ -305,6 +314,8 @@ class Event(models.Model):
 
     course = models.ForeignKey(Course,
             verbose_name=_("Course"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    course_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
     kind = models.CharField(max_length=50,
             # Translators: format of event kind in Event model
             help_text=_("Should be lower_case_with_underscores, no spaces "
@@ -392,6 +403,8 @@ class ParticipationTag(models.Model):
 
     course = models.ForeignKey(Course,
             verbose_name=_("Course"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    course_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
     name = models.CharField(max_length=100,
             blank=False, null=False,
             # Translators: name format of ParticipationTag
@@ -424,6 +437,9 @@ class ParticipationTag(models.Model):
 class ParticipationRole(models.Model):
     course = models.ForeignKey(Course,
             verbose_name=_("Course"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    course_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
+
     identifier = models.CharField(
             max_length=100, blank=False, null=False,
             help_text=_("A symbolic name for this role, used in course code. "
@@ -488,6 +504,66 @@ class ParticipationRole(models.Model):
         ordering = ("course", "identifier")
 
 
+# {{{ permission cache
+
+# Permissions and role identifiers are cached across requests, per course.
+# Each course has a 'generation' token that is part of all cache keys for that
+# course. Any change to roles or permissions in the course drops the token
+# (see course.receivers), which makes all of the course's cached data
+# unreachable at once.
+
+T = TypeVar("T")
+
+
+def get_permission_cache_timeout() -> int | None:
+    return getattr(settings, "RELATE_PERMISSION_CACHE_TIMEOUT", None)
+
+
+def get_cached_permission_data(
+        course_id: int, kind: str, compute: Callable[[], T]) -> T:
+    """Return the result of *compute*, cached under *kind* for the course
+    with ID *course_id* if :data:`RELATE_PERMISSION_CACHE_TIMEOUT` is set.
+    """
+    timeout = get_permission_cache_timeout()
+    if not timeout:
+        return compute()
+
+    try:
+        from django.core import cache
+    except ImproperlyConfigured:
+        return compute()
+
+    from relate.utils import get_cache_generation
+    default_cache = cache.caches["default"]
+    generation = get_cache_generation(
+            default_cache, f"relate-perm-gen:{course_id}")
+    if generation is None:
+        # e.g. the dummy cache
+        return compute()
+
+    key = f"relate-perm:{course_id}:{generation}:{kind}"
+    result = default_cache.get(key)
+    if result is None:
+        result = compute()
+        default_cache.set(key, result, timeout)
+
+    return result
+
+
+def invalidate_permission_cache(course_id: int) -> None:
+    if not get_permission_cache_timeout():
+        return
+
+    try:
+        from django.core import cache
+    except ImproperlyConfigured:
+        return
+
+    cache.caches["default"].delete(f"relate-perm-gen:{course_id}")
+
+# }}}
+
+
 class ParticipationPermissionBase(models.Model):
     id = models.BigAutoField(primary_key=True)
 
@@ -537,6 +613,8 @@ class Participation(models.Model):
             related_name="participations")
     course = models.ForeignKey(Course, related_name="participations",
             verbose_name=_("Course"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    course_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
 
     enroll_time = models.DateTimeField(default=now,
             verbose_name=_("Enroll time"))
@@ -594,20 +672,24 @@ class Participation(models.Model):
         if self._permissions_cache is not None:
             return self._permissions_cache
 
-        perm = (
-                list(
-                    ParticipationRolePermission.objects.filter(
-                        role__course=self.course,
-                        role__participation=self)
-                    .values_list("permission", "argument"))
-                + list(
-                    ParticipationPermission.objects.filter(
-                        participation=self)
-                    .values_list("permission", "argument")))
-
-        fset_perm = frozenset(
-                (permission, argument) if argument else (permission, None)
-                for permission, argument in perm)
+        def get_permissions() -> frozenset[tuple[str, str | None]]:
+            perm = (
+                    list(
+                        ParticipationRolePermission.objects.filter(
+                            role__course=self.course_id,
+                            role__participation=self)
+                        .values_list("permission", "argument"))
+                    + list(
+                        ParticipationPermission.objects.filter(
+                            participation=self)
+                        .values_list("permission", "argument")))
+
+            return frozenset(
+                    (permission, argument) if argument else (permission, None)
+                    for permission, argument in perm)
+
+        fset_perm = get_cached_permission_data(
+                self.course_id, f"participation-perms:{self.id}", get_permissions)
 
         self._permissions_cache = fset_perm
         return fset_perm
@@ -1017,6 +1099,9 @@ class FlowPageData(models.Model):
 
     flow_session = models.ForeignKey(FlowSession, related_name="page_data",
             verbose_name=_("Flow session"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    flow_session_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
+
     page_ordinal = models.IntegerField(null=True, blank=True,
             verbose_name=_("Page ordinal"))
 
@@ -1080,6 +1165,8 @@ class FlowPageVisit(models.Model):
     # and provide editing.
     flow_session = models.ForeignKey(FlowSession, db_index=True,
             verbose_name=_("Flow session"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    flow_session_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
 
     page_data = models.ForeignKey(FlowPageData, db_index=True,
             verbose_name=_("Page data"), on_delete=models.CASCADE)
@@ -1176,6 +1263,8 @@ class FlowPageVisitGrade(models.Model):
 
     visit = models.ForeignKey(FlowPageVisit, related_name="grades",
             verbose_name=_("Visit"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    visit_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
 
     # NULL means "autograded"
     grader = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True,
@@ -1329,19 +1418,7 @@ def update_bulk_feedback(page_data: FlowPageData, grade: FlowPageVisitGrade,
         fp_bulk_feedback.save()
 
 
-def get_feedback_for_grade(
-        grade: FlowPageVisitGrade | None) -> AnswerFeedback | None:
-
-    if grade is None:
-        return None
-
-    try:
-        bulk_feedback_json = FlowPageBulkFeedback.objects.get(
-                page_data=grade.visit.page_data,
-                grade=grade).bulk_feedback
-    except ObjectDoesNotExist:
-        bulk_feedback_json = None
-
+def _load_bulk_feedback_json(bulk_feedback_json: Any) -> Any:
     if (bulk_feedback_json is not None
             and isinstance(bulk_feedback_json, dict)
             and (BULK_FEEDBACK_FILENAME_KEY in bulk_feedback_json)):
@@ -1356,8 +1433,58 @@ def get_feedback_for_grade(
         except FileNotFoundError:
             bulk_feedback_json = None
 
+    return bulk_feedback_json
+
+
+def get_feedback_for_grades(
+        grades: Sequence[FlowPageVisitGrade | None]
+        ) -> list[AnswerFeedback | None]:
+    """Return the feedback for each of *grades*, loading the bulk feedback
+    of all of them in a single query. Bulk feedback kept in
+    :data:`RELATE_BULK_STORAGE` is only read once the
+    :attr:`~course.page.base.AnswerFeedback.bulk_feedback` attribute
+    of the result is accessed.
+    """
+
+    # Grades without feedback have no use for bulk feedback.
+    grade_ids = [
+            grade.id for grade in grades
+            if grade is not None and grade.feedback is not None]
+
+    bulk_feedback_by_grade_id: dict[int, Any] = {}
+    if grade_ids:
+        bulk_feedback_by_grade_id = dict(
+                FlowPageBulkFeedback.objects
+                .filter(
+                    grade__in=grade_ids,
+                    page_data=models.F("grade__visit__page_data"))
+                .values_list("grade_id", "bulk_feedback"))
+
+    from functools import partial
+
     from course.page.base import AnswerFeedback
-    return AnswerFeedback.from_json(grade.feedback, bulk_feedback_json)
+
+    result: list[AnswerFeedback | None] = []
+    for grade in grades:
+        if grade is None:
+            result.append(None)
+            continue
+
+        bulk_feedback_json = bulk_feedback_by_grade_id.get(grade.id)
+        if (isinstance(bulk_feedback_json, dict)
+                and BULK_FEEDBACK_FILENAME_KEY in bulk_feedback_json):
+            bulk_feedback_json = partial(
+                    _load_bulk_feedback_json, bulk_feedback_json)
+
+        result.append(AnswerFeedback.from_json(grade.feedback, bulk_feedback_json))
+
+    return result
+
+
+def get_feedback_for_grade(
+        grade: FlowPageVisitGrade | None) -> AnswerFeedback | None:
+    feedback, = get_feedback_for_grades([grade])
+    return feedback
 
 # }}}
 
@@ -1380,6 +1507,8 @@ class FlowRuleException(models.Model):
             verbose_name=_("Flow ID"))
     participation = models.ForeignKey(Participation, db_index=True,
             verbose_name=_("Participation"), on_delete=models.CASCADE)
+    # set by Django for the foreign key above
+    participation_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
     expiration = models.DateTimeField(blank=True, null=True,
             verbose_name=_("Expiration"))
 
@@ -1564,6 +1693,10 @@ class GradeChange(models.Model):
     participation = models.ForeignKey(Participation,
             verbose_name=_("Participation"), on_delete=models.CASCADE)
 
+    # set by Django for the foreign keys above
+    opportunity_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
+    participation_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
+
     state = models.CharField(max_length=50,
             choices=GRADE_STATE_CHANGE_CHOICES,
             # Translators: something like 'status'.
@@ -1821,6 +1954,198 @@ class GradeStateMachine:
 # }}}
 
 
+# {{{ materialized grade state
+
+class GradeState(models.Model):
+    """The result of running a :class:`GradeStateMachine` over all
+    :class:`GradeChange` objects for one participation and one grading
+    opportunity, so that the grade book does not need to replay the
+    grade history.
+
+    While ``RELATE_USE_MATERIALIZED_GRADE_STATES`` is enabled, kept current by
+    :func:`update_grade_state`, which runs whenever a grade change is saved or
+    deleted. Use the ``rebuild_grade_states`` management command to bring the
+    table up to date for existing data.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    opportunity = models.ForeignKey(GradingOpportunity,
+            verbose_name=_("Grading opportunity"), on_delete=models.CASCADE)
+
+    participation = models.ForeignKey(Participation,
+            verbose_name=_("Participation"), on_delete=models.CASCADE)
+
+    # set by Django for the foreign keys above
+    opportunity_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
+    participation_id: int  # pyright: ignore[reportUninitializedInstanceVariable]
+
+    state = models.CharField(max_length=50, null=True, blank=True,
+            choices=GRADE_STATE_CHANGE_CHOICES,
+            verbose_name=_("State"))
+
+    # list of decimal percentages, stored as strings to keep them exact
+    valid_percentages = JSONField(default=list, blank=True,
+            verbose_name=_("Valid percentages"))
+
+    has_extension = models.BooleanField(default=False,
+            verbose_name=_("Has extension"))
+    due_time = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("Due time"))
+    last_graded_time = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("Last graded time"))
+    last_report_time = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("Last report time"))
+
+    class Meta:
+        verbose_name = _("Grade state")
+        verbose_name_plural = _("Grade states")
+        unique_together = (("participation", "opportunity"),)
+
+    @override
+    def __str__(self) -> str:
+        # Translators: information for GradeState
+        return _("%(participation)s: %(state)s on %(opportunity)s") % {
+            "participation": self.participation,
+            "state": self.state,
+            "opportunity": self.opportunity}
+
+    def get_state_machine(self) -> GradeStateMachine:
+        """Return a :class:`GradeStateMachine` in the state it would reach
+        after consuming the grade changes this object summarizes.
+        """
+        from decimal import Decimal
+
+        machine = GradeStateMachine()
+        machine.opportunity = self.opportunity
+        machine.state = self.state
+        machine.valid_percentages = [Decimal(p) for p in self.valid_percentages]
+        machine.due_time = (
+                self.due_time if self.has_extension
+                else self.opportunity.due_time)
+        machine.last_graded_time = self.last_graded_time
+        machine.last_report_time = self.last_report_time
+        del machine.attempt_id_to_gchange
+
+        return machine
+
+
+def get_grade_state_fields(
+        grade_changes: Iterable[GradeChange]) -> dict[str, Any]:
+    """
+    :arg grade_changes: the grade changes for a single participation and
+        opportunity, ordered by grade time.
+    """
+    grade_changes = list(grade_changes)
+
+    machine = GradeStateMachine().consume(grade_changes)
+
+    has_extension = any(
+            gchange.state == GradeStateChangeType.extension
+            for gchange in grade_changes)
+
+    return {
+        "state": machine.state,
+        "valid_percentages": [str(p) for p in machine.valid_percentages],
+        "has_extension": has_extension,
+        "due_time": machine.due_time if has_extension else None,
+        "last_graded_time": machine.last_graded_time,
+        "last_report_time": machine.last_report_time,
+        }
+
+
+def update_grade_state(participation_id: int, opportunity_id: int) -> None:
+    grade_changes = list(GradeChange.objects
+            .filter(
+                participation_id=participation_id,
+                opportunity_id=opportunity_id)
+            .order_by("grade_time")
+            .select_related("opportunity"))
+
+    grade_states = GradeState.objects.filter(
+            participation_id=participation_id,
+            opportunity_id=opportunity_id)
+
+    if not grade_changes:
+        grade_states.delete()
+        return
+
+    try:
+        fields = get_grade_state_fields(grade_changes)
+    except (ValueError, AssertionError):
+        # Inconsistent grade history (e.g. a grade after 'unavailable', or
+        # a grade without points). This must not keep the grade change from
+        # being saved, but there is no state to record either.
+        logger.warning("not storing grade state of participation %d for "
+                "grading opportunity %d: inconsistent grade history",
+                participation_id, opportunity_id, exc_info=True)
+        grade_states.delete()
+        return
+
+    GradeState.objects.update_or_create(
+            participation_id=participation_id,
+            opportunity_id=opportunity_id,
+            defaults=fields)
+
+
+def update_grade_states(
+        opportunity_id: int, participation_ids: Iterable[int]) -> None:
+    """Like :func:`update_grade_state`, for several participations at once,
+    using a number of queries that does not depend on the number of
+    participations.
+    """
+    from itertools import groupby
+
+    participation_ids = sorted(set(participation_ids))
+
+    # Keep the number of query parameters in check.
+    chunk_size = 500
+    for start in range(0, len(participation_ids), chunk_size):
+        chunk_pids = participation_ids[start:start+chunk_size]
+
+        grade_changes = (GradeChange.objects
+                .filter(
+                    participation_id__in=chunk_pids,
+                    opportunity_id=opportunity_id)
+                .order_by("participation_id", "grade_time")
+                .select_related("opportunity"))
+
+        grade_states = []
+        for participation_id, pgrade_changes in groupby(
+                grade_changes, key=lambda gchange: gchange.participation_id):
+            try:
+                fields = get_grade_state_fields(pgrade_changes)
+            except (ValueError, AssertionError):
+                # See update_grade_state.
+                logger.warning("not storing grade state of participation %d "
+                        "for grading opportunity %d: inconsistent grade history",
+                        participation_id, opportunity_id, exc_info=True)
+                continue
+
+            grade_states.append(GradeState(
+                    participation_id=participation_id,
+                    opportunity_id=opportunity_id,
+                    **fields))
+
+        GradeState.objects.filter(
+                participation_id__in=chunk_pids,
+                opportunity_id=opportunity_id).delete()
+        GradeState.objects.bulk_create(grade_states)
+
+
+@receiver(post_save, sender=GradeChange, dispatch_uid="update_grade_state_on_save")
+@receiver(post_delete, sender=GradeChange,
+        dispatch_uid="update_grade_state_on_delete")
+def _update_grade_state_for_grade_change(sender, instance, raw=False, **kwargs):
+    from course.grades import use_materialized_grade_states
+    if raw or not use_materialized_grade_states():
+        return
+
+    update_grade_state(instance.participation_id, instance.opportunity_id)
+
+# }}}
+
+
 # {{{ flow <-> grading integration
 
 def get_flow_grading_opportunity(
@@ -1855,6 +2180,56 @@ def get_flow_grading_opportunity(
 # }}}
 
 
+# {{{ analytics snapshot
+
+class AnalyticsSnapshot(models.Model):
+    """Precomputed analytics for a flow (if :attr:`group_id` and
+    :attr:`page_id` are empty) or for a single page of a flow, as of
+    :attr:`computation_time`.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+
+    course = models.ForeignKey(Course,
+            verbose_name=_("Course"), on_delete=models.CASCADE)
+    flow_id = models.CharField(max_length=200,
+            verbose_name=_("Flow ID"))
+    group_id = models.CharField(max_length=200, blank=True, default="",
+            verbose_name=_("Group ID"))
+    page_id = models.CharField(max_length=200, blank=True, default="",
+            verbose_name=_("Page ID"))
+    commit_sha = models.CharField(max_length=200,
+            verbose_name=_("Git commit SHA"))
+    restrict_to_first_attempt = models.BooleanField(
+            verbose_name=_("Restrict to first attempt"))
+
+    computation_time = models.DateTimeField(default=now,
+            verbose_name=_("Computation time"))
+    data = JSONField(  # pyright: ignore[reportCallIssue]
+            # Show correct characters in admin for non ascii languages.
+            dump_kwargs={"ensure_ascii": False},
+            verbose_name=_("Data"))
+
+    class Meta:
+        verbose_name = _("Analytics snapshot")
+        verbose_name_plural = _("Analytics snapshots")
+        unique_together = (
+                ("course", "flow_id", "group_id", "page_id", "commit_sha",
+                    "restrict_to_first_attempt"),)
+
+    @override
+    def __str__(self) -> str:
+        # Translators: information for AnalyticsSnapshot
+        return _("Analytics for %(flow_id)s in %(course)s as of %(time)s") % {
+                "flow_id": "/".join(
+                    part for part in [self.flow_id, self.group_id, self.page_id]
+                    if part),
+                "course": self.course,
+                "time": self.computation_time}
+
+# }}}
+
+
 # {{{ XMPP log
 
 class InstantMessage(models.Model):
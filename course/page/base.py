@@ -296,12 +296,17 @@ class AnswerFeedback:
         is generated from :attr:`correctness`.
 
     .. attribute:: bulk_feedback
+
+        May also be passed to the constructor as a callable returning the
+        bulk feedback, in which case it is only called (once) when the
+        attribute is first accessed.
     """
 
     def __init__(self,
             correctness: float | None,
             feedback: str | None = None,
-            bulk_feedback: str | None = None) -> None:
+            bulk_feedback: str | Callable[[], str | None] | None = None
+            ) -> None:
         correctness = validate_point_count(correctness)
 
         if feedback is None:
@@ -309,7 +314,17 @@ class AnswerFeedback:
 
         self.correctness = correctness
         self.feedback = feedback
-        self.bulk_feedback = bulk_feedback
+        self._bulk_feedback = bulk_feedback
+
+    @property
+    def bulk_feedback(self) -> str | None:
+        if callable(self._bulk_feedback):
+            self._bulk_feedback = self._bulk_feedback()
+        return self._bulk_feedback
+
+    @bulk_feedback.setter
+    def bulk_feedback(self, value: str | None) -> None:
+        self._bulk_feedback = value
 
     def as_json(self) -> tuple[dict[str, Any], dict[str, Any]]:
         result = {
@@ -324,14 +339,31 @@ class AnswerFeedback:
 
     @staticmethod
     def from_json(json: Any, bulk_json: Any) -> AnswerFeedback | None:
+        """
+        :arg bulk_json: the bulk part of :meth:`as_json`, or a callable
+            returning it, to defer loading it until
+            :attr:`bulk_feedback` is accessed.
+        """
 
         if json is None:
             return json
 
-        if bulk_json is not None:
-            bulk_feedback = bulk_json.get("bulk_feedback")
+        def get_bulk_feedback(bulk_json: Any) -> str | None:
+            if bulk_json is not None:
+                return bulk_json.get("bulk_feedback")
+            else:
+                return None
+
+        bulk_feedback: str | Callable[[], str | None] | None
+        if callable(bulk_json):
+            load_bulk_json = bulk_json
+
+            def load_bulk_feedback() -> str | None:
+                return get_bulk_feedback(load_bulk_json())
+
+            bulk_feedback = load_bulk_feedback
         else:
-            bulk_feedback = None
+            bulk_feedback = get_bulk_feedback(bulk_json)
 
         return AnswerFeedback(
                 correctness=json["correctness"],
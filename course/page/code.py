@@ -23,11 +23,20 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import logging
 import os
+import threading
 from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cache
+from time import sleep, time
 from typing import (
+    TYPE_CHECKING,
     Annotated,
     Any,
+    ClassVar,
     Literal,
     Self,
 )
@@ -64,17 +73,27 @@ from course.page.base import (
     get_editor_interaction_mode,
     markup_to_html,
 )
-from course.page.code_run_backend import RunRequest, RunResponse
+from course.page.code_run_backend import (
+    RunBatchRequest,
+    RunBatchResponse,
+    RunRequest,
+    RunResponse,
+)
 from course.repo import FileSystemFakeRepo, get_repo_blob
 from course.validation import IdentifierStr, Markup, RepoPathStr, get_validation_context
 from relate.utils import StyledVerticalForm, string_concat
 
 
+if TYPE_CHECKING:
+    from collections.abc import Generator, Iterable, Sequence
+
 # DEBUGGING SWITCH:
 # True for 'spawn containers' (normal operation)
 # False for 'just connect to localhost:CODE_QUESTION_CONTAINER_PORT' as runcode'
 SPAWN_CONTAINERS = True
 
+logger = logging.getLogger(__name__)
+
 
 # {{{ html sanitization helper
 
@@ -206,199 +225,558 @@ class InvalidPingResponse(RuntimeError):
     pass
 
 
-def request_run(
-            run_req: RunRequest,
-            run_timeout: float,
-            image: str | None = None
-        ) -> RunResponse:
-    import errno
-    import http.client as http_client
+class ContainerStartupTimeout(RuntimeError):
+    def __init__(self, host_ip: str) -> None:
+        super().__init__(f"timeout waiting for container at '{host_ip}'")
+        self.host_ip = host_ip
 
+
+# {{{ runpy containers
+
+@dataclass
+class RunpyContainer:
+    # *None* if not spawning containers, see :data:`SPAWN_CONTAINERS`.
+    container: Any
+    host_ip: str
+    port: int
+    created_at: float = field(default_factory=time)
+
+
+def get_docker_client():
     import docker
+    from django.conf import settings
+
+    docker_url = getattr(settings, "RELATE_DOCKER_URL",
+            "unix://var/run/docker.sock")
+    docker_tls = getattr(settings, "RELATE_DOCKER_TLS_CONFIG",
+            None)
+    return docker.DockerClient(
+            base_url=docker_url,
+            tls=docker_tls,
+            timeout=DOCKER_TIMEOUT,
+            version="1.24")
+
+
+def remove_runpy_container(rc: RunpyContainer) -> None:
     from docker.errors import APIError as DockerAPIError
 
-    debug = False
-    if debug:
-        def debug_print(s):
-            print(s)
-    else:
-        def debug_print(s):
-            pass
+    if rc.container is None:
+        return
 
-    command_path = "/opt/runcode/runcode"
-    user = "runcode"
+    try:
+        rc.container.remove(force=True)
+    except DockerAPIError:
+        # Oh well. No need to bother the students with this nonsense.
+        pass
 
-    # The following is necessary because tests don't arise from a CodeQuestion
-    # object, so we provide a fallback.
-    debug_print(f"Image is {image!r}.")
-    from django.conf import settings
-    if image is None:
-        image = not_none(settings.RELATE_DOCKER_RUNPY_IMAGE)
 
-    if SPAWN_CONTAINERS:
-        docker_url = getattr(settings, "RELATE_DOCKER_URL",
-                "unix://var/run/docker.sock")
-        docker_tls = getattr(settings, "RELATE_DOCKER_TLS_CONFIG",
-                None)
-        docker_cnx = docker.DockerClient(
-                base_url=docker_url,
-                tls=docker_tls,
-                timeout=DOCKER_TIMEOUT,
-                version="1.24")
-
-        mem_limit = 384*10**6
-        container = docker_cnx.containers.create(
-                image=image,
-                command=[
-                    command_path,
-                    "-1"],
-                mem_limit=mem_limit,
-                memswap_limit=mem_limit,
-                publish_all_ports=True,
-                detach=True,
-                # Do not enable: matplotlib stops working if enabled.
-                # read_only=True,
-                user=user)
+def create_runpy_container(docker_cnx: Any, image: str) -> RunpyContainer:
+    """Create and start a container running ``runcode`` in single-request
+    mode. The container is not guaranteed to be accepting connections yet,
+    see :func:`ping_runpy_container`.
+    """
+    command_path = "/opt/runcode/runcode"
+    user = "runcode"
 
-    else:
-        container = None
+    mem_limit = 384*10**6
+    container = docker_cnx.containers.create(
+            image=image,
+            command=[
+                command_path,
+                "-1"],
+            mem_limit=mem_limit,
+            memswap_limit=mem_limit,
+            publish_all_ports=True,
+            detach=True,
+            # Do not enable: matplotlib stops working if enabled.
+            # read_only=True,
+            user=user)
+
+    # FIXME: Prohibit networking
 
     connect_host_ip = "localhost"
 
     try:
-        # FIXME: Prohibit networking
+        container.start()
+        container_props = docker_cnx.api.inspect_container(container.id)
 
-        if container is not None:
-            container.start()
-            container_props = docker_cnx.api.inspect_container(container.id)
+        port_infos = (container_props
+            ["NetworkSettings"]["Ports"]
+            [f"{CODE_QUESTION_CONTAINER_PORT}/tcp"])
 
-            port_infos = (container_props
-                ["NetworkSettings"]["Ports"]
-                [f"{CODE_QUESTION_CONTAINER_PORT}/tcp"])
+        if not port_infos:
+            raise ValueError("got empty list of container ports")
+        port_info = port_infos[0]
 
-            if not port_infos:
-                raise ValueError("got empty list of container ports")
-            port_info = port_infos[0]
+        port_host_ip = port_info.get("HostIp")
 
-            port_host_ip = port_info.get("HostIp")
+        if port_host_ip != "0.0.0.0":
+            connect_host_ip = port_host_ip
 
-            if port_host_ip != "0.0.0.0":
-                connect_host_ip = port_host_ip
+        port = int(port_info["HostPort"])
+    except BaseException:
+        remove_runpy_container(RunpyContainer(container, connect_host_ip, 0))
+        raise
 
-            port = int(port_info["HostPort"])
-        else:
-            port = CODE_QUESTION_CONTAINER_PORT
+    if not connect_host_ip:
+        # for compatibility with podman
+        connect_host_ip = "localhost"
 
-        from time import sleep, time
-        start_time = time()
+    return RunpyContainer(container, connect_host_ip, port)
 
-        # {{{ ping until response received
 
-        from traceback import format_exc
+def ping_runpy_container(
+            host_ip: str,
+            port: int,
+            timeout: float = DOCKER_TIMEOUT
+        ) -> None:
+    """Poll *host_ip*:*port* every 100 ms until ``runcode`` answers ``/ping``.
+
+    :raises ContainerStartupTimeout: if no valid response was received
+        within *timeout* seconds. The exception being handled at the time
+        (e.g. a refused connection) is attached as its context.
+    """
+    import errno
+    import http.client as http_client
+
+    start_time = time()
+
+    while True:
+        try:
+            connection = http_client.HTTPConnection(host_ip, port,
+                    timeout=DOCKER_TIMEOUT)
+
+            connection.request("GET", "/ping")
+
+            response = connection.getresponse()
+            response_data = response.read().decode()
+
+            if response_data != "OK":
+                raise InvalidPingResponse()
+
+            return
+
+        except (http_client.BadStatusLine, InvalidPingResponse):
+            if time() - start_time >= timeout:
+                raise ContainerStartupTimeout(host_ip)
+
+        except OSError as e:
+            if e.errno in [errno.ECONNRESET, errno.ECONNREFUSED]:
+                if time() - start_time >= timeout:
+                    raise ContainerStartupTimeout(host_ip)
 
-        def check_timeout():
-            if time() - start_time < DOCKER_TIMEOUT:
-                sleep(0.1)
-                # and retry
             else:
-                return RunResponse(
-                        result="uncaught_error",
-                        message="Timeout waiting for container.",
-                        traceback="".join(format_exc()),
-                        exec_host=connect_host_ip,
-                        )
+                raise
 
-        if not connect_host_ip:
-            # for compatibility with podman
-            connect_host_ip = "localhost"
+        sleep(0.1)
 
-        while True:
-            try:
-                connection = http_client.HTTPConnection(connect_host_ip, port)
 
-                connection.request("GET", "/ping")
+class RunpyContainerPool:
+    """A size-bounded pool of started, ping-checked containers for one image,
+    so that a code submission does not have to wait for container start-up.
+
+    Containers run ``runcode`` in single-request mode, so each of them is
+    handed out at most once and removed by :func:`request_run` after use.
+    A single background thread per pool refills it after each
+    :meth:`acquire` and, every :attr:`maintenance_interval` seconds,
+    discards containers that are older than :attr:`max_age` seconds or that
+    no longer answer pings.
+
+    The pool is process-local. Each web server process keeps its own, and
+    removes its containers on exit (see :func:`remove_runpy_container_pools`).
+
+    .. attribute:: hits
+    .. attribute:: misses
+    .. attribute:: evictions
+    .. attribute:: hit_wait_time
+
+        Total seconds spent obtaining a ready container on a hit.
+
+    .. attribute:: miss_wait_time
 
-                response = connection.getresponse()
-                response_data = response.read().decode()
+        Total seconds spent starting a container on a miss.
+    """
+
+    maintenance_interval: ClassVar[float] = 60
 
-                if response_data != "OK":
-                    raise InvalidPingResponse()
+    def __init__(self, image: str, size: int, max_age: float) -> None:
+        self.image = image
+        self.size = size
+        self.max_age = max_age
 
-                break
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._containers: deque[RunpyContainer] = deque()
+        self._nstarting = 0
+        self._refill_requested = False
+        self._closed = False
+        self._worker: threading.Thread | None = None
 
-            except (http_client.BadStatusLine, InvalidPingResponse):
-                ct_res = check_timeout()
-                if ct_res is not None:
-                    return ct_res
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.hit_wait_time = 0.
+        self.miss_wait_time = 0.
 
-            except OSError as e:
-                if e.errno in [errno.ECONNRESET, errno.ECONNREFUSED]:
-                    ct_res = check_timeout()
-                    if ct_res is not None:
-                        return ct_res
+    def __len__(self) -> int:
+        return len(self._containers)
 
+    def _is_healthy(self, rc: RunpyContainer) -> bool:
+        try:
+            ping_runpy_container(rc.host_ip, rc.port, timeout=0)
+        except (ContainerStartupTimeout, OSError):
+            return False
+        return True
+
+    def _is_expired(self, rc: RunpyContainer) -> bool:
+        return time() - rc.created_at > self.max_age
+
+    def acquire(self) -> RunpyContainer | None:
+        """Return a warm container, or *None* if none is available. The caller
+        owns the returned container and is responsible for removing it.
+        """
+        discarded: list[RunpyContainer] = []
+        result = None
+
+        with self._lock:
+            while self._containers:
+                rc = self._containers.popleft()
+                if self._is_expired(rc):
+                    discarded.append(rc)
                 else:
-                    raise
+                    result = rc
+                    break
 
-        # }}}
+        if result is not None and not self._is_healthy(result):
+            discarded.append(result)
+            result = None
+
+        with self._lock:
+            self.evictions += len(discarded)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
 
-        debug_print("PING SUCCESSFUL")
+        for rc in discarded:
+            remove_runpy_container(rc)
 
+        self.refill_in_background()
+
+        return result
+
+    def record_wait(self, wait_time: float, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hit_wait_time += wait_time
+            else:
+                self.miss_wait_time += wait_time
+
+    def evict(self) -> None:
+        """Remove pooled containers that are too old or do not answer pings."""
+        with self._lock:
+            candidates = list(self._containers)
+
+        discarded = [
+                rc for rc in candidates
+                if self._is_expired(rc) or not self._is_healthy(rc)]
+
+        with self._lock:
+            # Containers may have been handed out in the meantime.
+            discarded = [rc for rc in discarded if rc in self._containers]
+            for rc in discarded:
+                self._containers.remove(rc)
+            self.evictions += len(discarded)
+
+        for rc in discarded:
+            remove_runpy_container(rc)
+
+    def refill(self) -> None:
+        """Start containers until the pool is full. Blocks until done."""
+        with self._lock:
+            nneeded = self.size - len(self._containers) - self._nstarting
+            if nneeded <= 0 or self._closed:
+                return
+            self._nstarting += nneeded
+
+        nfinished = 0
         try:
-            # Add a second to accommodate 'wire' delays
-            connection = http_client.HTTPConnection(connect_host_ip, port,
-                    timeout=1 + run_timeout)
+            docker_cnx = get_docker_client()
+
+            for _i in range(nneeded):
+                rc = None
+                try:
+                    rc = create_runpy_container(docker_cnx, self.image)
+                    ping_runpy_container(rc.host_ip, rc.port)
+                except Exception:
+                    if rc is not None:
+                        remove_runpy_container(rc)
+                    rc = None
+
+                with self._lock:
+                    nfinished += 1
+                    self._nstarting -= 1
+                    if rc is not None and not self._closed:
+                        self._containers.append(rc)
+                        rc = None
+
+                if rc is not None:
+                    # the pool was closed while the container was starting
+                    remove_runpy_container(rc)
+        finally:
+            with self._lock:
+                self._nstarting -= nneeded - nfinished
+
+    def _run_worker(self) -> None:
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(
+                        lambda: self._refill_requested or self._closed,
+                        timeout=self.maintenance_interval)
+                if self._closed:
+                    return
+                self._refill_requested = False
 
-            headers = {"Content-type": "application/json"}
+            try:
+                self.evict()
+                self.refill()
+            except Exception:
+                from traceback import print_exc
+                print_exc()
+
+    def refill_in_background(self) -> None:
+        """Ask the pool's background thread (started on first use) to refill
+        the pool.
+        """
+        with self._lock:
+            if self._closed:
+                return
+
+            self._refill_requested = True
+            self._wakeup.notify()
+
+            if self._worker is None:
+                self._worker = threading.Thread(
+                        target=self._run_worker, daemon=True,
+                        name=f"runpy-pool-{self.image}")
+                self._worker.start()
+
+    def close(self) -> None:
+        """Stop the background thread and remove all pooled containers.
+        Containers still starting are removed once they are up.
+        """
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            containers = list(self._containers)
+            self._containers.clear()
+
+        for rc in containers:
+            remove_runpy_container(rc)
+
+    def get_stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "size": len(self._containers),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_wait_time": self.hit_wait_time,
+                "miss_wait_time": self.miss_wait_time,
+                }
 
-            json_run_req = run_req.model_dump_json().encode("utf-8")
 
-            from time import time
-            start_time = time()
+_RUNPY_CONTAINER_POOLS: dict[str, RunpyContainerPool] = {}
+_RUNPY_CONTAINER_POOLS_LOCK = threading.Lock()
 
-            debug_print("BEFPOST")
-            connection.request("POST", "/run-python", json_run_req, headers)
-            debug_print("AFTPOST")
 
-            http_response = connection.getresponse()
-            debug_print("GETR")
-            response_data = http_response.read().decode("utf-8")
-            debug_print("READR")
+def remove_runpy_container_pools(**kwargs: Any) -> None:
+    """Close all pools of this process, removing their containers. Called on
+    interpreter exit and when a Celery worker process shuts down.
+    """
+    with _RUNPY_CONTAINER_POOLS_LOCK:
+        pools = list(_RUNPY_CONTAINER_POOLS.values())
+        _RUNPY_CONTAINER_POOLS.clear()
 
-            end_time = time()
+    for pool in pools:
+        pool.close()
 
-            result = RunResponse.model_validate_json(response_data)
 
-            result.feedback = [*result.feedback,
-                f"Execution time: {end_time - start_time:.1f} s "
-                f"-- Time limit: {run_timeout:.1f} s"]
+@cache
+def _register_runpy_container_pool_cleanup() -> None:
+    import atexit
 
-            result.exec_host = connect_host_ip
+    from celery.signals import worker_process_shutdown
 
-            return result
+    atexit.register(remove_runpy_container_pools)
+
+    # Celery's pool processes exit without running atexit handlers.
+    worker_process_shutdown.connect(remove_runpy_container_pools, weak=False)
+
+
+def get_runpy_container_pool(image: str) -> RunpyContainerPool | None:
+    """Return the process-wide pool for *image*, or *None* if
+    ``RELATE_DOCKER_RUNPY_POOL_SIZE`` is not configured.
+    """
+    from django.conf import settings
+
+    size = getattr(settings, "RELATE_DOCKER_RUNPY_POOL_SIZE", 0)
+    if not size:
+        return None
+
+    with _RUNPY_CONTAINER_POOLS_LOCK:
+        pool = _RUNPY_CONTAINER_POOLS.get(image)
+        if pool is None:
+            _register_runpy_container_pool_cleanup()
+            pool = RunpyContainerPool(image, size,
+                    max_age=getattr(settings,
+                        "RELATE_DOCKER_RUNPY_POOL_MAX_AGE", 600))
+            _RUNPY_CONTAINER_POOLS[image] = pool
+
+    return pool
+
+
+def get_runpy_container_pool_stats() -> dict[str, dict[str, float]]:
+    with _RUNPY_CONTAINER_POOLS_LOCK:
+        pools = list(_RUNPY_CONTAINER_POOLS.values())
+
+    return {pool.image: pool.get_stats() for pool in pools}
+
+# }}}
+
+
+@contextmanager
+def ready_runpy_container(image: str) -> Generator[RunpyContainer, None, None]:
+    """Provide a container (warm from the pool, if configured, or newly
+    started) that answers pings, and remove it afterwards.
+
+    :raises ContainerStartupTimeout: if a newly started container does not
+        respond in time.
+    """
+    rc: RunpyContainer | None = None
+    try:
+        pool = None
+        wait_start_time = time()
+
+        if SPAWN_CONTAINERS:
+            pool = get_runpy_container_pool(image)
+            if pool is not None:
+                rc = pool.acquire()
+
+            is_warm = rc is not None
+            if rc is None:
+                rc = create_runpy_container(get_docker_client(), image)
+        else:
+            is_warm = False
+            rc = RunpyContainer(None, "localhost", CODE_QUESTION_CONTAINER_PORT)
+
+        if not is_warm:
+            ping_runpy_container(rc.host_ip, rc.port)
+
+        if pool is not None:
+            pool.record_wait(time() - wait_start_time, hit=is_warm)
+
+        yield rc
 
-        except TimeoutError:
-            return RunResponse(
-                    result="timeout",
-                    exec_host=connect_host_ip,
-                    )
     finally:
-        if container is not None:
-            debug_print(f"-----------BEGIN DOCKER LOGS for {container.id}")
-            debug_print(container.logs())
-            debug_print(f"-----------END DOCKER LOGS for {container.id}")
+        if rc is not None and rc.container is not None:
+            remove_runpy_container(rc)
+
+
+def request_run(
+            run_req: RunRequest,
+            run_timeout: float,
+            image: str | None = None
+        ) -> RunResponse:
+    import http.client as http_client
+
+    debug = False
+    if debug:
+        def debug_print(s):
+            print(s)
+    else:
+        def debug_print(s):
+            pass
+
+    # The following is necessary because tests don't arise from a CodeQuestion
+    # object, so we provide a fallback.
+    debug_print(f"Image is {image!r}.")
+    from django.conf import settings
+    if image is None:
+        image = not_none(settings.RELATE_DOCKER_RUNPY_IMAGE)
+
+    try:
+        with ready_runpy_container(image) as rc:
+            debug_print("PING SUCCESSFUL")
+
+            connect_host_ip = rc.host_ip
 
             try:
-                container.remove(force=True)
-            except DockerAPIError:
-                # Oh well. No need to bother the students with this nonsense.
-                pass
+                # Add a second to accommodate 'wire' delays
+                connection = http_client.HTTPConnection(connect_host_ip, rc.port,
+                        timeout=1 + run_timeout)
+
+                headers = {"Content-type": "application/json"}
+
+                json_run_req = run_req.model_dump_json().encode("utf-8")
+
+                start_time = time()
+
+                debug_print("BEFPOST")
+                connection.request("POST", "/run-python", json_run_req, headers)
+                debug_print("AFTPOST")
+
+                http_response = connection.getresponse()
+                debug_print("GETR")
+                response_data = http_response.read().decode("utf-8")
+                debug_print("READR")
+
+                end_time = time()
+
+                result = RunResponse.model_validate_json(response_data)
+
+                result.feedback = [*result.feedback,
+                    f"Execution time: {end_time - start_time:.1f} s "
+                    f"-- Time limit: {run_timeout:.1f} s"]
+
+                result.exec_host = connect_host_ip
+
+                return result
+
+            except TimeoutError:
+                return RunResponse(
+                        result="timeout",
+                        exec_host=connect_host_ip,
+                        )
+
+    except ContainerStartupTimeout as e:
+        from traceback import format_exc
+        return RunResponse(
+                result="uncaught_error",
+                message="Timeout waiting for container.",
+                traceback="".join(format_exc()),
+                exec_host=e.host_ip,
+                )
+
+
+# Message prefixes of the responses runcode gives for batched requests whose
+# child process did not respond, e.g. because other code in the batch
+# killed it.
+BATCH_CHILD_FAILURE_MESSAGES = (
+        "Child process exited without response",
+        "Child process was killed by signal")
 
 
 def is_nuisance_failure(result: RunResponse):
     if result.result != "uncaught_error":
         return False
 
+    if (result.message is not None
+            and result.message.startswith(BATCH_CHILD_FAILURE_MESSAGES)):
+        # Rerunning the request in a container of its own gives its actual
+        # result.
+        return True
+
     if result.traceback is not None:
         if "BadStatusLine" in result.traceback:
 
@@ -431,6 +809,10 @@ def request_run_with_retries(
             run_timeout: float,
             image: str | None = None,
             retry_count: int = 3):
+    prerun_response = get_prerun_response(run_req, run_timeout, image)
+    if prerun_response is not None:
+        return prerun_response
+
     while True:
         result = request_run(run_req, run_timeout, image=image)
 
@@ -441,6 +823,366 @@ def request_run_with_retries(
         return result
 
 
+# {{{ batched runs
+
+MAX_RUN_BATCH_SIZE = 100
+
+# Upper bound, in seconds, on the time budgeted for running one batch, i.e.
+# on the sum of the time limits of its requests.
+MAX_RUN_BATCH_DURATION = 120
+
+
+def request_run_batch(
+            run_reqs: Sequence[RunRequest],
+            run_timeout: float,
+            image: str | None = None
+        ) -> list[RunResponse]:
+    """Run all of *run_reqs* in a single container, each in its own forked
+    child process within the container (see ``/run-python-batch`` in
+    ``runcode``). Setup code compilation and data file decoding are shared
+    among requests in the batch.
+
+    If the batch as a whole fails (e.g. because the image's ``runcode``
+    predates batch support, or because it took longer than
+    :data:`MAX_RUN_BATCH_DURATION`), or for individual nuisance failures,
+    this falls back to :func:`request_run_with_retries`.
+    """
+    import http.client as http_client
+
+    from django.conf import settings
+    if image is None:
+        image = not_none(settings.RELATE_DOCKER_RUNPY_IMAGE)
+
+    if not run_reqs:
+        return []
+
+    batch_req = RunBatchRequest(requests=list(run_reqs), timeout=run_timeout)
+
+    responses: list[RunResponse] | None = None
+    try:
+        with ready_runpy_container(image) as rc:
+            connection = http_client.HTTPConnection(rc.host_ip, rc.port,
+                    timeout=1 + min(
+                        len(run_reqs) * (1 + run_timeout),
+                        MAX_RUN_BATCH_DURATION))
+
+            connection.request("POST", "/run-python-batch",
+                    batch_req.model_dump_json().encode("utf-8"),
+                    {"Content-type": "application/json"})
+
+            http_response = connection.getresponse()
+            response_data = http_response.read().decode("utf-8")
+
+            if http_response.status == 200:
+                responses = RunBatchResponse.model_validate_json(
+                        response_data).responses
+
+                for response in responses:
+                    if response.exec_time is not None:
+                        response.feedback = [*response.feedback,
+                            f"Execution time: {response.exec_time:.1f} s "
+                            f"-- Time limit: {run_timeout:.1f} s"]
+                    response.exec_host = rc.host_ip
+            else:
+                logger.warning("batch run failed with HTTP status %d: %s",
+                        http_response.status, response_data[:1000])
+
+    except Exception:
+        logger.exception("batch run failed")
+        responses = None
+
+    if responses is None or len(responses) != len(run_reqs):
+        logger.warning("running the %d requests of a failed batch "
+                "one by one", len(run_reqs))
+        return [
+                request_run_with_retries(run_req, run_timeout, image=image)
+                for run_req in run_reqs]
+
+    return [
+            request_run_with_retries(run_req, run_timeout, image=image)
+            if is_nuisance_failure(response) else response
+            for run_req, response in zip(run_reqs, responses, strict=True)]
+
+
+def get_run_request_key(
+            run_req: RunRequest,
+            run_timeout: float,
+            image: str | None
+        ) -> str:
+    """Return a hash identifying the outcome of running *run_req*, up to
+    the randomness (if any) in the code being run.
+    """
+    from django.conf import settings
+    if image is None:
+        image = not_none(settings.RELATE_DOCKER_RUNPY_IMAGE)
+
+    from hashlib import sha256
+    checksum = sha256()
+    checksum.update(image.encode())
+    checksum.update(b"\0")
+    checksum.update(repr(float(run_timeout)).encode())
+    checksum.update(b"\0")
+    checksum.update(run_req.model_dump_json().encode())
+    return checksum.hexdigest()
+
+
+_PRERUN_STATE = threading.local()
+
+
+@contextmanager
+def batched_code_runs() -> Generator[None, None, None]:
+    """Within this context, results obtained by :func:`prerun_code_requests`
+    are used by :func:`request_run_with_retries` in place of running the same
+    request again.
+    """
+    prev_results = getattr(_PRERUN_STATE, "results", None)
+    _PRERUN_STATE.results = {}
+    try:
+        yield
+    finally:
+        _PRERUN_STATE.results = prev_results
+
+
+def prerun_code_requests(
+            requests: Iterable[tuple[RunRequest, float, str | None]]
+        ) -> None:
+    """Run *requests*, a sequence of tuples *(run_req, run_timeout, image)*,
+    in batches of up to :data:`MAX_RUN_BATCH_SIZE` (fewer if their time
+    limits would exceed :data:`MAX_RUN_BATCH_DURATION`) and make the results
+    available to :func:`request_run_with_retries` for the remainder of the
+    enclosing :func:`batched_code_runs` context.
+
+    Requests whose results are in the result cache (see
+    :func:`get_cached_run_response`) are not run, since grading uses the
+    cached results.
+    """
+    results: dict[str, RunResponse] | None = getattr(
+            _PRERUN_STATE, "results", None)
+    if results is None:
+        raise RuntimeError("prerun_code_requests called outside of "
+                "batched_code_runs context")
+
+    pending: dict[str, tuple[RunRequest, float, str | None]] = {}
+    for run_req, run_timeout, image in requests:
+        key = get_run_request_key(run_req, run_timeout, image)
+        if key not in results:
+            pending[key] = (run_req, run_timeout, image)
+
+    for key in get_cached_run_request_keys(pending):
+        del pending[key]
+
+    by_image_and_timeout: dict[
+            tuple[str | None, float], dict[str, RunRequest]] = {}
+    for key, (run_req, run_timeout, image) in pending.items():
+        by_image_and_timeout.setdefault((image, run_timeout), {})[key] = run_req
+
+    for (image, run_timeout), keys_to_reqs in by_image_and_timeout.items():
+        keys = list(keys_to_reqs)
+        batch_size = max(1, min(
+            MAX_RUN_BATCH_SIZE,
+            int(MAX_RUN_BATCH_DURATION // (1 + run_timeout))))
+        for start in range(0, len(keys), batch_size):
+            batch_keys = keys[start:start+batch_size]
+            responses = request_run_batch(
+                    [keys_to_reqs[key] for key in batch_keys],
+                    run_timeout, image=image)
+            results.update(zip(batch_keys, responses, strict=True))
+
+
+def get_prerun_response(
+            run_req: RunRequest,
+            run_timeout: float,
+            image: str | None
+        ) -> RunResponse | None:
+    results: dict[str, RunResponse] | None = getattr(
+            _PRERUN_STATE, "results", None)
+    if not results:
+        return None
+
+    response = results.get(get_run_request_key(run_req, run_timeout, image))
+    if response is None:
+        return None
+
+    return response.model_copy(deep=True)
+
+# }}}
+
+
+# {{{ result cache
+
+CODE_RESULT_CACHEABLE_RESULTS = frozenset({
+    "success", "user_compile_error", "user_error"})
+
+
+def _get_code_result_cache_key(run_request_key: str) -> str:
+    return "coderesult:v1:" + run_request_key
+
+
+def _get_code_result_stats_key(course_id: int, flow_id: str, what: str) -> str:
+    return f"coderesult:stats:v1:{course_id}:{flow_id}:{what}"
+
+
+def _increment_cache_counter(cache: Any, key: str, delta: int) -> None:
+    if len(key) >= 240:
+        # Memcache is apparently limited to 250 characters.
+        return
+
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def get_cached_run_response(
+            run_req: RunRequest,
+            run_timeout: float,
+            image: str | None,
+            ) -> tuple[RunResponse, float] | None:
+    """Return a previously cached response for *run_req* and the time
+    (in seconds) it originally took to obtain it, or *None*. Caching is
+    enabled by setting ``RELATE_CODE_RESULT_CACHE_TIMEOUT``.
+    """
+    from django.conf import settings
+    if getattr(settings, "RELATE_CODE_RESULT_CACHE_TIMEOUT", None) is None:
+        return None
+
+    from django.core import cache
+    cached = cache.caches["default"].get(_get_code_result_cache_key(
+            get_run_request_key(run_req, run_timeout, image)))
+    if cached is None:
+        return None
+
+    response_json, exec_time = cached
+    return RunResponse.model_validate_json(response_json), exec_time
+
+
+def get_cached_run_request_keys(
+            run_request_keys: Iterable[str]) -> set[str]:
+    """Return those of *run_request_keys* (see :func:`get_run_request_key`)
+    for which a response is cached.
+    """
+    from django.conf import settings
+    if getattr(settings, "RELATE_CODE_RESULT_CACHE_TIMEOUT", None) is None:
+        return set()
+
+    cache_keys = {
+            _get_code_result_cache_key(key): key for key in run_request_keys}
+    if not cache_keys:
+        return set()
+
+    from django.core import cache
+    return {
+            cache_keys[cache_key]
+            for cache_key in cache.caches["default"].get_many(list(cache_keys))}
+
+
+def cache_run_response(
+            run_req: RunRequest,
+            run_timeout: float,
+            image: str | None,
+            response: RunResponse,
+            exec_time: float,
+            ) -> None:
+    """Only deterministic outcomes are cached. Grading code failures,
+    timeouts and infrastructure problems are always rerun. So are responses
+    larger than ``RELATE_CACHE_MAX_BYTES``.
+    """
+    from django.conf import settings
+    cache_timeout = getattr(settings, "RELATE_CODE_RESULT_CACHE_TIMEOUT", None)
+    if cache_timeout is None:
+        return
+
+    if response.result not in CODE_RESULT_CACHEABLE_RESULTS:
+        return
+
+    response_json = response.model_dump_json()
+    if len(response_json) > getattr(settings, "RELATE_CACHE_MAX_BYTES", 0):
+        return
+
+    from django.core import cache
+    cache.caches["default"].set(
+            _get_code_result_cache_key(
+                get_run_request_key(run_req, run_timeout, image)),
+            (response_json, exec_time), cache_timeout)
+
+
+def record_code_result_cache_use(
+            course_id: int,
+            flow_id: str,
+            hit: bool,
+            exec_time: float,
+            ) -> None:
+    from django.conf import settings
+    if getattr(settings, "RELATE_CODE_RESULT_CACHE_TIMEOUT", None) is None:
+        return
+
+    from django.core import cache
+    def_cache = cache.caches["default"]
+
+    if hit:
+        _increment_cache_counter(def_cache,
+                _get_code_result_stats_key(course_id, flow_id, "hits"), 1)
+        _increment_cache_counter(def_cache,
+                _get_code_result_stats_key(course_id, flow_id, "saved_ms"),
+                round(exec_time * 1000))
+    else:
+        _increment_cache_counter(def_cache,
+                _get_code_result_stats_key(course_id, flow_id, "misses"), 1)
+
+
+@dataclass(frozen=True)
+class CodeResultCacheStats:
+    hits: int
+    misses: int
+
+    # Execution time (in seconds) that cache hits avoided
+    saved_time: float
+
+    @property
+    def hit_rate(self) -> float | None:
+        if not self.hits + self.misses:
+            return None
+        return self.hits / (self.hits + self.misses)
+
+    def __sub__(self, other: CodeResultCacheStats) -> CodeResultCacheStats:
+        return CodeResultCacheStats(
+                hits=self.hits - other.hits,
+                misses=self.misses - other.misses,
+                saved_time=self.saved_time - other.saved_time)
+
+    def get_summary(self) -> str | None:
+        if self.hit_rate is None:
+            return None
+
+        return (
+                _("%(hit_rate).0f%% of code question results were reused, "
+                    "saving %(saved_time).1f s of execution time.")
+                % {
+                    "hit_rate": 100 * self.hit_rate,
+                    "saved_time": self.saved_time,
+                    })
+
+
+def get_code_result_cache_stats(
+            course_id: int, flow_id: str) -> CodeResultCacheStats:
+    from django.core import cache
+    keys = {
+            what: _get_code_result_stats_key(course_id, flow_id, what)
+            for what in ["hits", "misses", "saved_ms"]}
+    values = cache.caches["default"].get_many(list(keys.values()))
+
+    def get_count(what: str) -> int:
+        return int(values.get(keys[what], 0))
+
+    return CodeResultCacheStats(
+            hits=get_count("hits"),
+            misses=get_count("misses"),
+            saved_time=get_count("saved_ms") / 1000)
+
+# }}}
+
+
 class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
     """
     An auto-graded question allowing an answer consisting of code.
@@ -783,6 +1525,24 @@ class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
         else:
             raise ValueError("could not get submitted data from answer_data JSON")
 
+    def get_run_request(self, page_context: PageContext, user_code: str
+                ) -> RunRequest:
+        from base64 import b64encode
+        return RunRequest(
+                user_code=user_code,
+                setup_code=self.setup_code,
+                names_for_user=self.names_for_user,
+                names_from_user=self.names_from_user,
+                test_code=self.get_test_code(),
+                data_files={
+                    data_file: b64encode(
+                            get_repo_blob(
+                                page_context.repo, data_file,
+                                page_context.commit_sha).data).decode()
+                    for data_file in self.data_files
+                }
+            )
+
     @override
     def grade(
             self,
@@ -799,33 +1559,42 @@ class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
 
         # {{{ request run
 
-        from base64 import b64encode
-        run_req = RunRequest(
-                user_code=user_code,
-                setup_code=self.setup_code,
-                names_for_user=self.names_for_user,
-                names_from_user=self.names_from_user,
-                test_code=self.get_test_code(),
-                data_files={
-                    data_file: b64encode(
-                            get_repo_blob(
-                                page_context.repo, data_file,
-                                page_context.commit_sha).data).decode()
-                    for data_file in self.data_files
-                }
-            )
+        run_req = self.get_run_request(page_context, user_code)
 
-        try:
-            response_dict = request_run_with_retries(run_req,
-                    run_timeout=self.timeout,
-                    image=self.docker_image)
-        except Exception:
-            from traceback import format_exc
-            response_dict = {
-                    "result": "uncaught_error",
-                    "message": "Error connecting to container",
-                    "traceback": "".join(format_exc()),
-                    }
+        cached = get_cached_run_response(run_req, self.timeout, self.docker_image)
+        should_cache = False
+        if cached is not None:
+            response_dict, exec_time = cached
+        else:
+            exec_start_time = time()
+            try:
+                response_dict = request_run_with_retries(run_req,
+                        run_timeout=self.timeout,
+                        image=self.docker_image)
+            except Exception:
+                from traceback import format_exc
+                response_dict = {
+                        "result": "uncaught_error",
+                        "message": "Error connecting to container",
+                        "traceback": "".join(format_exc()),
+                        }
+            else:
+                should_cache = True
+            exec_time = time() - exec_start_time
+
+            if (isinstance(response_dict, RunResponse)
+                    and response_dict.exec_time is not None):
+                # Obtained from a batched prerun: looking it up took no time,
+                # but the run itself did.
+                exec_time = response_dict.exec_time
+
+        if (page_context.flow_session is not None
+                and page_context.flow_session.flow_id):
+            record_code_result_cache_use(
+                    page_context.course.id,
+                    page_context.flow_session.flow_id,
+                    hit=cached is not None,
+                    exec_time=exec_time)
 
         # }}}
 
@@ -835,6 +1604,10 @@ class CodeQuestion(PageBaseWithTitle, PageBaseWithValue, ABC):
             response = RunResponse(
                             result="setup_error",
                             message=f"{type(e).__name__}: {e!s}")
+        else:
+            if should_cache:
+                cache_run_response(run_req, self.timeout, self.docker_image,
+                        response, exec_time)
 
         correctness = response.points
         feedback_bits: list[str] = []
@@ -26,7 +26,7 @@ THE SOFTWARE.
 import sys
 import threading
 import traceback
-from types import TracebackType
+from types import CodeType, TracebackType
 from typing import TYPE_CHECKING, ClassVar, Literal, TypeAlias
 
 from pydantic import BaseModel, ConfigDict, Field
@@ -88,6 +88,20 @@ class RunResponse(BaseModel):
     traceback: str | None = None
     message: str | None = None
 
+    # Only set for responses that are part of a RunBatchResponse.
+    exec_time: float | None = None
+
+
+class RunBatchRequest(BaseModel):
+    requests: list[RunRequest]
+
+    # Each request is allowed to run for this many seconds.
+    timeout: float
+
+
+class RunBatchResponse(BaseModel):
+    responses: list[RunResponse]
+
 # }}}
 
 
@@ -131,6 +145,60 @@ def package_exception(
     )
 
 
+class RunCodeCache:
+    """Compiled code and decoded data files shared between the requests of a
+    batch. The batch-serving process fills this (via :meth:`add_request`)
+    before forking a child for each request, so that every child inherits the
+    results instead of redoing the work.
+
+    Entries are keyed by a hash of the source, so that the cache does not
+    hold on to the (possibly sensitive) test code.
+    """
+
+    def __init__(self) -> None:
+        self.code: dict[tuple[str, str], CodeType] = {}
+        self.data: dict[str, bytes] = {}
+
+    @staticmethod
+    def _hash(s: str) -> str:
+        from hashlib import sha256
+        return sha256(s.encode()).hexdigest()
+
+    def compile(self, source: str, filename: str) -> CodeType:
+        key = (self._hash(source), filename)
+        try:
+            return self.code[key]
+        except KeyError:
+            pass
+
+        result = self.code[key] = compile(source, filename, "exec")
+        return result
+
+    def b64decode(self, contents: str) -> bytes:
+        key = self._hash(contents)
+        try:
+            return self.data[key]
+        except KeyError:
+            pass
+
+        from base64 import b64decode
+        result = self.data[key] = b64decode(contents.encode())
+        return result
+
+    def add_request(self, run_req: RunRequest) -> None:
+        from contextlib import suppress
+
+        # Errors are ignored here. They are reported when the request
+        # is actually run.
+        with suppress(Exception):
+            if run_req.setup_code:
+                self.compile(run_req.setup_code, "[setup code]")
+            if run_req.test_code is not None:
+                self.compile(run_req.test_code, "[test code]")
+            for contents in run_req.data_files.values():
+                self.b64decode(contents)
+
+
 def user_code_thread(
             user_code: str,
             user_ctx: dict[str, object],
@@ -145,14 +213,21 @@ def user_code_thread(
         exc_info.append((tp, val, tb))
 
 
-def run_code(run_req: RunRequest) -> RunResponse:
+def run_code(
+            run_req: RunRequest,
+            cache: RunCodeCache | None = None
+        ) -> RunResponse:
+    if cache is None:
+        cache = RunCodeCache()
+
     # {{{ silence matplotlib warnings
 
     import warnings
     warnings.filterwarnings(
             "ignore", message="Matplotlib is building the font cache.*")
     import os
-    os.environ["MPLCONFIGDIR"] = "/tmp"
+    import tempfile
+    os.environ["MPLCONFIGDIR"] = tempfile.gettempdir()
 
     # }}}
 
@@ -160,8 +235,7 @@ def run_code(run_req: RunRequest) -> RunResponse:
 
     if run_req.setup_code:
         try:
-            setup_code = compile(
-                    run_req.setup_code, "[setup code]", "exec")
+            setup_code = cache.compile(run_req.setup_code, "[setup code]")
         except Exception:
             return package_exception("setup_compile_error")
     else:
@@ -174,7 +248,7 @@ def run_code(run_req: RunRequest) -> RunResponse:
 
     if run_req.test_code is not None:
         try:
-            test_code = compile(run_req.test_code, "[test code]", "exec")
+            test_code = cache.compile(run_req.test_code, "[test code]")
         except Exception:
             return package_exception("test_compile_error")
     else:
@@ -191,11 +265,9 @@ def run_code(run_req: RunRequest) -> RunResponse:
 
     # {{{ run code
 
-    data_files = {}
-    if run_req.data_files:
-        from base64 import b64decode
-        for name, contents in run_req.data_files.items():
-            data_files[name] = b64decode(contents.encode())
+    data_files = {
+            name: cache.b64decode(contents)
+            for name, contents in run_req.data_files.items()}
 
     generated_html: list[str] = []
 
@@ -23,22 +23,38 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-from typing import Any
+from functools import partial
+from typing import TYPE_CHECKING, Any
 
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_save,
+)
 from django.dispatch import receiver
 
 from accounts.models import User
 from course.constants import ParticipationStatus
 from course.models import (
     Course,
+    Event,
+    FlowRuleException,
     Participation,
+    ParticipationPermission,
     ParticipationPreapproval,
     ParticipationRole,
+    ParticipationRolePermission,
+    ParticipationTag,
+    invalidate_permission_cache,
 )
 
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
 # {{{ Update enrollment status when a User/Course instance is saved
 
 @receiver(post_save, sender=User)
@@ -112,4 +128,132 @@ def may_preapprove_role(
 
 # }}}
 
+
+# {{{ invalidate cached data now and again once the transaction commits
+
+def _invalidate_now_and_on_commit(
+        invalidate: Callable[..., None], *args: Any) -> None:
+    invalidate(*args)
+
+    # Another request may have refilled the cache from the database state
+    # before this transaction was committed.
+    transaction.on_commit(partial(invalidate, *args))
+
+# }}}
+
+
+# {{{ invalidate the permission cache on changes to roles and permissions
+
+def _invalidate_permission_cache(course_id: int) -> None:
+    _invalidate_now_and_on_commit(invalidate_permission_cache, course_id)
+
+
+@receiver(post_save, sender=ParticipationRole)
+@receiver(post_delete, sender=ParticipationRole)
+def invalidate_permission_cache_for_role(
+        sender: Any, instance: ParticipationRole, **kwargs: Any) -> None:
+    _invalidate_permission_cache(instance.course_id)
+
+
+@receiver(post_save, sender=ParticipationRolePermission)
+@receiver(post_delete, sender=ParticipationRolePermission)
+def invalidate_permission_cache_for_role_permission(
+        sender: Any, instance: ParticipationRolePermission, **kwargs: Any) -> None:
+    try:
+        course_id = instance.role.course_id
+    except ParticipationRole.DoesNotExist:
+        # Deleted along with its role, which takes care of invalidation.
+        return
+
+    _invalidate_permission_cache(course_id)
+
+
+@receiver(post_save, sender=ParticipationPermission)
+@receiver(post_delete, sender=ParticipationPermission)
+def invalidate_permission_cache_for_participation_permission(
+        sender: Any, instance: ParticipationPermission, **kwargs: Any) -> None:
+    try:
+        course_id = instance.participation.course_id
+    except Participation.DoesNotExist:
+        # Deleted along with its participation, whose cached data is thus
+        # no longer reachable.
+        return
+
+    _invalidate_permission_cache(course_id)
+
+
+@receiver(m2m_changed, sender=Participation.roles.through)
+def invalidate_permission_cache_for_participation_roles(
+        sender: Any, instance: Participation | ParticipationRole, action: str,
+        **kwargs: Any) -> None:
+    if action in ["post_add", "post_remove", "post_clear"]:
+        _invalidate_permission_cache(instance.course_id)
+
+# }}}
+
+
+# {{{ invalidate the flow rule exception cache on changes to exceptions
+
+def _invalidate_flow_rule_exception_cache(
+        participation_id: int, flow_id: str, kind: str) -> None:
+    from course.utils import invalidate_flow_rule_exception_cache
+    _invalidate_now_and_on_commit(
+            invalidate_flow_rule_exception_cache, participation_id, flow_id, kind)
+
+
+@receiver(pre_save, sender=FlowRuleException)
+def invalidate_flow_rule_exception_cache_for_old_exception(
+        sender: Any, instance: FlowRuleException, **kwargs: Any) -> None:
+    if instance.pk is None:
+        return
+
+    # The exception may be moved to another flow or kind.
+    for participation_id, flow_id, kind in (
+            FlowRuleException.objects.filter(pk=instance.pk)
+            .values_list("participation_id", "flow_id", "kind")):
+        if (participation_id, flow_id, kind) != (
+                instance.participation_id, instance.flow_id, instance.kind):
+            _invalidate_flow_rule_exception_cache(participation_id, flow_id, kind)
+
+
+@receiver(post_save, sender=FlowRuleException)
+@receiver(post_delete, sender=FlowRuleException)
+def invalidate_flow_rule_exception_cache_for_exception(
+        sender: Any, instance: FlowRuleException, **kwargs: Any) -> None:
+    _invalidate_flow_rule_exception_cache(
+            instance.participation_id, instance.flow_id, instance.kind)
+
+# }}}
+
+
+# {{{ invalidate the event index and validation results on changes to events
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_data_for_event(
+        sender: Any, instance: Event, **kwargs: Any) -> None:
+    from course.datespec import invalidate_event_index
+    from course.validation import invalidate_validation_results
+    _invalidate_now_and_on_commit(invalidate_event_index, instance.course_id)
+    _invalidate_now_and_on_commit(
+            invalidate_validation_results, instance.course_id)
+
+# }}}
+
+
+# {{{ invalidate recorded validation results on changes to roles and tags
+
+@receiver(post_save, sender=ParticipationRole)
+@receiver(post_delete, sender=ParticipationRole)
+@receiver(post_save, sender=ParticipationTag)
+@receiver(post_delete, sender=ParticipationTag)
+def invalidate_validation_results_for_role_or_tag(
+        sender: Any, instance: ParticipationRole | ParticipationTag,
+        **kwargs: Any) -> None:
+    from course.validation import invalidate_validation_results
+    _invalidate_now_and_on_commit(
+            invalidate_validation_results, instance.course_id)
+
+# }}}
+
 # vim: foldmethod=marker
@@ -25,6 +25,8 @@ THE SOFTWARE.
 
 import os
 import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from hashlib import sha256
 from pathlib import Path
@@ -38,7 +40,7 @@ from typing_extensions import Self, override
 
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping
+    from collections.abc import Iterator, Mapping
     from types import TracebackType
 
 
@@ -344,6 +346,68 @@ def get_true_repo_and_path(
     return repo, path
 
 
+# {{{ tracking of accessed paths
+
+_ACCESSED_PATHS: ContextVar[set[str] | None] = ContextVar(
+        "relate_accessed_repo_paths", default=None)
+
+
+def record_repo_path_access(full_name: str) -> None:
+    paths = _ACCESSED_PATHS.get()
+    if paths is not None:
+        paths.add(full_name)
+
+
+def is_tracking_repo_path_accesses() -> bool:
+    return _ACCESSED_PATHS.get() is not None
+
+
+@contextmanager
+def track_repo_path_accesses() -> Iterator[set[str]]:
+    """Collect the paths looked up by :func:`get_repo_tree`,
+    :func:`get_repo_blob` and :func:`get_repo_blob_data_cached` within the
+    block in the yielded set.
+
+    Caches of data derived from repository files (such as parsed YAML or
+    rendered markup) are bypassed while tracking, since a hit would hide
+    which files the data was derived from.
+    """
+    paths: set[str] = set()
+    token = _ACCESSED_PATHS.set(paths)
+    try:
+        yield paths
+    finally:
+        _ACCESSED_PATHS.reset(token)
+
+# }}}
+
+
+def get_repo_object_sha(
+            repo: Repo_ish,
+            full_name: str,
+            commit_sha: RevisionID_ish) -> bytes | None:
+    """Return the SHA of the blob or tree at *full_name* in the commit
+    *commit_sha* of the git repository *repo*, or *None* if there is no such
+    file or directory.
+    """
+    dul_repo, full_name = get_true_repo_and_path(repo, full_name)
+    assert isinstance(dul_repo, dulwich.repo.Repo)
+
+    try:
+        commit_obj = dul_repo[commit_sha]
+        assert isinstance(commit_obj, dulwich.objects.Commit)
+        tree_obj = dul_repo[commit_obj.tree]
+        assert isinstance(tree_obj, dulwich.objects.Tree)
+
+        git_obj = _look_up_git_object(
+                dul_repo, root_tree=tree_obj, full_name=full_name)
+    except (KeyError, ObjectDoesNotExist):
+        return None
+
+    assert isinstance(git_obj, dulwich.objects.ShaFile)
+    return git_obj.id
+
+
 def get_repo_tree(
             repo: Repo_ish,
             full_name: str,
@@ -353,6 +417,7 @@ def get_repo_tree(
     :arg commit_sha: A byte string containing the commit hash
     :arg allow_tree: Allow the resulting object to be a directory
     """
+    record_repo_path_access(full_name)
 
     dul_repo, full_name = get_true_repo_and_path(repo, full_name)
 
@@ -395,6 +460,10 @@ def get_repo_blob(
     :arg commit_sha: A byte string containing the commit hash
     :arg allow_tree: Allow the resulting object to be a directory
     """
+    from relate.instrumentation import record_repo_blob_fetch
+    record_repo_blob_fetch()
+    record_repo_path_access(full_name)
+
     dul_repo, full_name = get_true_repo_and_path(repo, full_name)
 
     if isinstance(dul_repo, FileSystemFakeRepo):
@@ -432,6 +501,7 @@ def get_repo_blob_data_cached(
     """
     :arg commit_sha: A byte string containing the commit hash
     """
+    record_repo_path_access(full_name)
 
     if isinstance(commit_sha, bytes):
         from urllib.parse import quote_plus
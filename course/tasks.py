@@ -23,7 +23,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-from celery import shared_task
+from typing import Any
+
+from celery import chord, shared_task, uuid
+from django.conf import settings
 from django.db import transaction
 from django.utils.translation import gettext as _
 
@@ -31,115 +34,271 @@ from course.content import get_course_repo
 from course.models import Course, FlowPageVisit, FlowSession
 
 
-@shared_task(bind=True)
-def expire_in_progress_sessions(self, course_id, flow_id, rule_tag, now_datetime,
-        past_due_only):
-    course = Course.objects.get(id=course_id)
-    repo = get_course_repo(course)
+# Number of sessions whose code question answers are run together when
+# regrading.
+REGRADE_CODE_BATCH_SESSIONS = 50
 
-    sessions = (FlowSession.objects
-            .filter(
-                course=course,
-                flow_id=flow_id,
-                participation__isnull=False,
-                access_rules_tag=rule_tag,
-                in_progress=True,
-                ))
+# Default number of sessions handled by each subtask of a bulk session task.
+SESSION_TASK_CHUNK_SIZE = 100
 
-    count = 0
-    nsessions = sessions.count()
 
-    from course.flow import expire_flow_session_standalone
+# {{{ chunked session processing
+
+# Bulk session operations are split into chunks of session IDs. Each chunk
+# is processed by a separate subtask (so that the work spreads across all
+# available workers), and a chord callback combines the per-chunk counts
+# into the final message. Each chunk reports its own progress in its task
+# state, and :func:`get_task_progress` adds these up.
+
+def get_session_task_chunk_size() -> int:
+    return getattr(settings, "RELATE_SESSION_TASK_CHUNK_SIZE",
+            SESSION_TASK_CHUNK_SIZE)
 
-    for i, session in enumerate(sessions):
-        if expire_flow_session_standalone(repo, course, session, now_datetime,
-                past_due_only=past_due_only):
+
+def get_task_progress(meta: dict[str, Any]) -> tuple[int, int]:
+    """Return *(current, total)* for the ``PROGRESS`` metadata *meta* of a
+    (possibly chunked) bulk session task.
+    """
+    current = meta["current"]
+
+    chunks = meta.get("chunks")
+    if chunks is not None:
+        from celery.result import AsyncResult
+
+        current = 0
+        for chunk_task_id, chunk_size in chunks:
+            chunk_res = AsyncResult(chunk_task_id)
+            if chunk_res.successful():
+                current += chunk_size
+            elif chunk_res.state == "PROGRESS":
+                current += chunk_res.info["current"]
+
+    return current, meta["total"]
+
+
+# Number of sessions between progress reports of a bulk session task
+SESSION_PROGRESS_INTERVAL = 10
+
+
+def _make_progress_reporter(task, total):
+    processed = 0
+
+    def report_progress():
+        nonlocal processed
+        processed += 1
+        if processed % SESSION_PROGRESS_INTERVAL == 0:
+            task.update_state(
+                    state="PROGRESS",
+                    meta={"current": processed, "total": total})
+
+    return report_progress
+
+
+def _process_sessions(kind, repo, course, sessions, params, report_progress):
+    count = 0
+
+    if kind == "expire":
+        from course.flow import expire_flow_session_standalone
+        for session in sessions:
+            if expire_flow_session_standalone(repo, course, session,
+                    params["now_datetime"],
+                    past_due_only=params["past_due_only"]):
+                count += 1
+            report_progress()
+
+    elif kind == "finish":
+        from course.flow import (
+            adjust_flow_session_page_data,
+            finish_flow_session_standalone,
+        )
+        for session in sessions:
+            adjust_flow_session_page_data(repo, session, respect_preview=False)
+
+            if finish_flow_session_standalone(repo, course, session,
+                    now_datetime=params["now_datetime"],
+                    past_due_only=params["past_due_only"]):
+                count += 1
+            report_progress()
+
+    elif kind == "recalculate":
+        from course.flow import recalculate_session_grade
+        for session in sessions:
+            recalculate_session_grade(repo, course, session)
             count += 1
+            report_progress()
 
-        self.update_state(
-                state="PROGRESS",
-                meta={"current": i, "total": nsessions})
+    elif kind == "regrade":
+        from course.flow import prerun_code_for_regrade, regrade_session
+        from course.page.code import batched_code_runs
 
-    repo.close()
+        sessions = list(sessions)
+        for start in range(0, len(sessions), REGRADE_CODE_BATCH_SESSIONS):
+            batch = sessions[start:start+REGRADE_CODE_BATCH_SESSIONS]
 
-    return {"message": _("%d sessions expired.") % count}
+            # Run all code question answers of the batch in a few containers,
+            # rather than one container per answer.
+            with batched_code_runs():
+                prerun_code_for_regrade(repo, course, batch)
+
+                for session in batch:
+                    regrade_session(repo, course, session)
+                    count += 1
+                    report_progress()
+
+    else:
+        raise ValueError(f"unknown session task kind: '{kind}'")
+
+    return count
+
+
+def _get_session_task_message(kind, course_id, count, params,
+        code_cache_stats_before=None):
+    if kind == "expire":
+        return _("%d sessions expired.") % count
+    elif kind == "finish":
+        return _("%d sessions ended.") % count
+    elif kind == "recalculate":
+        return _("Grades recalculated for %d sessions.") % count
+    elif kind == "regrade":
+        message = _("%d sessions regraded.") % count
+
+        if code_cache_stats_before is not None:
+            from course.page.code import get_code_result_cache_stats
+            cache_stats_summary = (
+                    get_code_result_cache_stats(course_id, params["flow_id"])
+                    - code_cache_stats_before).get_summary()
+            if cache_stats_summary is not None:
+                message += " " + cache_stats_summary
+
+        return message
+    else:
+        raise ValueError(f"unknown session task kind: '{kind}'")
 
 
 @shared_task(bind=True)
-def finish_in_progress_sessions(self, course_id, flow_id, rule_tag, now_datetime,
-        past_due_only):
+def process_session_chunk(self, kind, course_id, session_ids, params):
     course = Course.objects.get(id=course_id)
     repo = get_course_repo(course)
 
+    sessions = FlowSession.objects.filter(id__in=session_ids).order_by("id")
+
+    try:
+        return _process_sessions(kind, repo, course, sessions, params,
+                _make_progress_reporter(self, len(session_ids)))
+    finally:
+        repo.close()
+
+
+@shared_task
+def summarize_session_chunks(counts, kind, course_id, params,
+        code_cache_stats_before=None):
+    return {"message": _get_session_task_message(
+        kind, course_id, sum(counts), params, code_cache_stats_before)}
+
+
+def _run_session_task(task, kind, course_id, sessions, params):
+    code_cache_stats_before = None
+    if kind == "regrade":
+        from course.page.code import get_code_result_cache_stats
+        code_cache_stats_before = get_code_result_cache_stats(
+                course_id, params["flow_id"])
+
+    session_ids = list(sessions.order_by("id").values_list("id", flat=True))
+    nsessions = len(session_ids)
+    chunk_size = get_session_task_chunk_size()
+
+    if task.request.called_directly or nsessions <= chunk_size:
+        course = Course.objects.get(id=course_id)
+        repo = get_course_repo(course)
+
+        try:
+            count = _process_sessions(kind, repo, course,
+                    sessions.order_by("id"), params,
+                    _make_progress_reporter(task, nsessions))
+        finally:
+            repo.close()
+
+        return {"message": _get_session_task_message(
+            kind, course_id, count, params, code_cache_stats_before)}
+
+    chunks = [
+            (uuid(), session_ids[start:start+chunk_size])
+            for start in range(0, nsessions, chunk_size)]
+
+    task.update_state(
+            state="PROGRESS",
+            meta={"current": 0, "total": nsessions,
+                "chunks": [
+                    [chunk_task_id, len(chunk_session_ids)]
+                    for chunk_task_id, chunk_session_ids in chunks]})
+
+    # The chord takes over this task's ID, so the result of the callback
+    # becomes the result visible to monitor_task.
+    return task.replace(chord(
+        [process_session_chunk.s(kind, course_id, chunk_session_ids, params)
+            .set(task_id=chunk_task_id)
+            for chunk_task_id, chunk_session_ids in chunks],
+        summarize_session_chunks.s(kind, course_id, params,
+            code_cache_stats_before)))
+
+# }}}
+
+
+@shared_task(bind=True)
+def expire_in_progress_sessions(self, course_id, flow_id, rule_tag, now_datetime,
+        past_due_only):
     sessions = (FlowSession.objects
             .filter(
-                course=course,
+                course=course_id,
                 flow_id=flow_id,
                 participation__isnull=False,
                 access_rules_tag=rule_tag,
                 in_progress=True,
                 ))
 
-    count = 0
-    nsessions = sessions.count()
-
-    from course.flow import finish_flow_session_standalone
-    for i, session in enumerate(sessions):
-        from course.flow import adjust_flow_session_page_data
-        adjust_flow_session_page_data(repo, session, respect_preview=False)
-
-        if finish_flow_session_standalone(repo, course, session,
-                now_datetime=now_datetime, past_due_only=past_due_only):
-            count += 1
+    return _run_session_task(self, "expire", course_id, sessions, {
+        "now_datetime": now_datetime,
+        "past_due_only": past_due_only,
+        })
 
-        self.update_state(
-                state="PROGRESS",
-                meta={"current": i, "total": nsessions})
 
-    repo.close()
+@shared_task(bind=True)
+def finish_in_progress_sessions(self, course_id, flow_id, rule_tag, now_datetime,
+        past_due_only):
+    sessions = (FlowSession.objects
+            .filter(
+                course=course_id,
+                flow_id=flow_id,
+                participation__isnull=False,
+                access_rules_tag=rule_tag,
+                in_progress=True,
+                ))
 
-    return {"message": _("%d sessions ended.") % count}
+    return _run_session_task(self, "finish", course_id, sessions, {
+        "now_datetime": now_datetime,
+        "past_due_only": past_due_only,
+        })
 
 
 @shared_task(bind=True)
 def recalculate_ended_sessions(self, course_id, flow_id, rule_tag):
-    course = Course.objects.get(id=course_id)
-    repo = get_course_repo(course)
-
     sessions = (FlowSession.objects
             .filter(
-                course=course,
+                course=course_id,
                 flow_id=flow_id,
                 participation__isnull=False,
                 access_rules_tag=rule_tag,
                 in_progress=False,
                 ))
 
-    nsessions = sessions.count()
-    count = 0
-
-    from course.flow import recalculate_session_grade
-    for session in sessions:
-        recalculate_session_grade(repo, course, session)
-        count += 1
-
-        self.update_state(
-                state="PROGRESS",
-                meta={"current": count, "total": nsessions})
-
-    repo.close()
-
-    return {"message": _("Grades recalculated for %d sessions.") % count}
+    return _run_session_task(self, "recalculate", course_id, sessions, {})
 
 
 @shared_task(bind=True)
 def regrade_flow_sessions(self, course_id, flow_id, access_rules_tag, inprog_value):
-    course = Course.objects.get(id=course_id)
-    repo = get_course_repo(course)
-
     sessions = (FlowSession.objects
             .filter(
-                course=course,
+                course=course_id,
                 participation__isnull=False,
                 flow_id=flow_id))
 
@@ -149,21 +308,9 @@ def regrade_flow_sessions(self, course_id, flow_id, access_rules_tag, inprog_val
     if inprog_value is not None:
         sessions = sessions.filter(in_progress=inprog_value)
 
-    nsessions = sessions.count()
-    count = 0
-
-    from course.flow import regrade_session
-    for session in sessions:
-        regrade_session(repo, course, session)
-        count += 1
-
-        self.update_state(
-                state="PROGRESS",
-                meta={"current": count, "total": nsessions})
-
-    repo.close()
-
-    return {"message": _("%d sessions regraded.") % count}
+    return _run_session_task(self, "regrade", course_id, sessions, {
+        "flow_id": flow_id,
+        })
 
 
 @shared_task(bind=True)
@@ -179,4 +326,218 @@ def purge_page_view_data(self, course_id):
             % num_deleted_by_kind.get("course.FlowPageVisit", 0)}
 
 
+@shared_task(bind=True)
+def refresh_analytics_snapshot(self, course_id, flow_id, group_id, page_id,
+        commit_sha, restrict_to_first_attempt):
+    from course.analytics import AnalyticsContext, update_analytics_snapshot
+
+    course = Course.objects.get(id=course_id)
+    repo = get_course_repo(course)
+
+    try:
+        update_analytics_snapshot(
+                AnalyticsContext(
+                    course=course,
+                    repo=repo,
+                    course_commit_sha=commit_sha.encode()),
+                flow_id, group_id, page_id, restrict_to_first_attempt)
+    finally:
+        repo.close()
+
+    return {"message": _("Analytics for '%s' recomputed.") % flow_id}
+
+
+# Number of rows between progress reports of a grade import
+GRADE_IMPORT_PROGRESS_INTERVAL = 100
+
+# Number of log lines of a grade import included in its result message
+GRADE_IMPORT_MAX_LOG_LINES = 50
+
+
+@shared_task(bind=True)
+def import_grades_from_csv(self, course_id, opportunity_id, attempt_id,
+        storage_filename, *, attr_type, attr_column, points_column,
+        feedback_column, max_points, creator_id, grade_time, has_header):
+    from accounts.models import User
+    from course.grades import iter_csv_grade_changes, save_imported_grade_changes
+    from course.models import GradingOpportunity
+
+    course = Course.objects.get(id=course_id)
+    bulk_storage = settings.RELATE_BULK_STORAGE
+
+    try:
+        with bulk_storage.open(storage_filename) as inf:
+            nrows = sum(1 for _line in inf)
+
+        def report_progress(current):
+            if current % GRADE_IMPORT_PROGRESS_INTERVAL == 0:
+                self.update_state(
+                        state="PROGRESS",
+                        meta={"current": current, "total": nrows})
+
+        log_lines = []
+        with bulk_storage.open(storage_filename) as inf:
+            total_count, imported_count = save_imported_grade_changes(
+                    iter_csv_grade_changes(
+                        log_lines=log_lines,
+                        course=course,
+                        grading_opportunity=GradingOpportunity.objects.get(
+                            id=opportunity_id),
+                        attempt_id=attempt_id,
+                        file_contents=(
+                            line.decode("utf-8", errors="replace")
+                            for line in inf),
+                        attr_type=attr_type,
+                        attr_column=attr_column,
+                        points_column=points_column,
+                        feedback_column=feedback_column,
+                        max_points=max_points,
+                        creator=User.objects.get(id=creator_id),
+                        grade_time=grade_time,
+                        has_header=has_header,
+                        report_progress=report_progress))
+    finally:
+        bulk_storage.delete(storage_filename)
+
+    message = (
+            _("%(imported)d grades imported, %(unchanged)d unchanged.")
+            % {"imported": imported_count,
+                "unchanged": total_count - imported_count})
+    if log_lines:
+        message += " " + " ".join(
+                str(line) for line in log_lines[:GRADE_IMPORT_MAX_LOG_LINES])
+    if len(log_lines) > GRADE_IMPORT_MAX_LOG_LINES:
+        message += " " + _("(%d more messages omitted)") % (
+                len(log_lines) - GRADE_IMPORT_MAX_LOG_LINES)
+
+    return {"message": message}
+
+
+# Number of visits between progress reports while zipping submissions
+SUBMISSION_ZIP_PROGRESS_INTERVAL = 50
+
+
+@shared_task(bind=True)
+def zip_submissions(self, course_id, flow_id, group_id, page_id, commit_sha, *,
+        which_attempt, rules_tag, non_in_progress_only, include_feedback,
+        extra_file_storage_name, extra_file_name, zip_id, filename):
+    from tempfile import TemporaryFile
+    from zipfile import ZipFile
+
+    from django.core.files import File
+    from django.urls import reverse
+
+    from course.grades import (
+        get_submission_visits,
+        get_submissions_zip_storage_name,
+        iter_submission_zip_entries,
+    )
+
+    course = Course.objects.get(id=course_id)
+    repo = get_course_repo(course)
+    bulk_storage = settings.RELATE_BULK_STORAGE
+
+    try:
+        visits = get_submission_visits(
+                course, flow_id, group_id, page_id,
+                which_attempt=which_attempt,
+                rules_tag=rules_tag,
+                non_in_progress_only=non_in_progress_only)
+        nvisits = visits.count()
+
+        def report_progress(current):
+            if current % SUBMISSION_ZIP_PROGRESS_INTERVAL == 0:
+                self.update_state(
+                        state="PROGRESS",
+                        meta={"current": current, "total": nvisits})
+
+        with TemporaryFile() as outf:
+            with ZipFile(outf, "w") as subm_zip:
+                for name, contents in iter_submission_zip_entries(
+                        course, repo, commit_sha.encode(),
+                        flow_id, group_id, page_id, visits,
+                        which_attempt=which_attempt,
+                        include_feedback=include_feedback,
+                        report_progress=report_progress):
+                    subm_zip.writestr(name, contents)
+
+                if extra_file_storage_name is not None:
+                    with bulk_storage.open(extra_file_storage_name) as inf:
+                        subm_zip.writestr(extra_file_name, inf.read())
+
+            outf.seek(0)
+            bulk_storage.save(
+                    get_submissions_zip_storage_name(
+                        course.identifier, zip_id, filename),
+                    File(outf))
+    finally:
+        repo.close()
+        if extra_file_storage_name is not None:
+            bulk_storage.delete(extra_file_storage_name)
+
+    return {
+            "message": _("Archive of submissions created."),
+            "download_url": reverse("relate-download_submissions_zip",
+                args=(course.identifier, zip_id, filename)),
+            }
+
+
+@shared_task(bind=True)
+def update_course_revision_task(self, course_id, participation_id, command,
+        new_sha, may_update, prevent_discarding_revisions):
+    from django.contrib.messages.utils import get_level_tags
+    from dulwich.repo import Repo
+
+    from course.models import Participation
+    from course.repo import SubdirRepoWrapper
+    from course.versioning import (
+        CourseRevisionCommand,
+        update_course_revision,
+        warm_course_caches,
+    )
+
+    course = Course.objects.get(id=course_id)
+    participation = Participation.objects.get(id=participation_id)
+
+    level_tags = get_level_tags()
+    result_messages = []
+
+    def add_message(level, message):
+        result_messages.append((level_tags.get(level, ""), str(message)))
+
+    def report_stage(stage, current, total):
+        self.update_state(
+                state="PROGRESS",
+                meta={"stage": stage, "current": current, "total": total})
+
+    content_repo = get_course_repo(course)
+    try:
+        if isinstance(content_repo, SubdirRepoWrapper):
+            repo = content_repo.repo
+        else:
+            repo = content_repo
+        assert isinstance(repo, Repo)
+        assert isinstance(content_repo, (Repo, SubdirRepoWrapper))
+
+        activated_sha = update_course_revision(
+                course, participation, repo, content_repo,
+                CourseRevisionCommand(command), new_sha.encode(),
+                may_update, prevent_discarding_revisions,
+                add_message=add_message,
+                report_stage=report_stage)
+
+        if activated_sha is not None:
+            def report_warming_progress(current, total):
+                report_stage(_("Warming caches"), current, total)
+
+            warm_course_caches(course, content_repo, activated_sha,
+                    report_progress=report_warming_progress)
+    finally:
+        content_repo.close()
+
+    return {
+            "message": _("Course update finished."),
+            "messages": result_messages,
+            }
+
 # vim: foldmethod=marker
@@ -25,6 +25,7 @@ THE SOFTWARE.
 
 from contextlib import ContextDecorator
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -37,6 +38,7 @@ from typing import (
 
 from django import forms, http
 from django.core.exceptions import ObjectDoesNotExist
+from django.http.response import HttpResponseBase
 from django.shortcuts import get_object_or_404, render
 from django.utils import translation
 from django.utils.safestring import SafeString, mark_safe
@@ -59,6 +61,7 @@ from course.content import (
     FlowSessionGradingRuleDesc,
     FlowSessionStartMode,
     FlowSessionStartRuleDesc,
+    ProcessLocalLRUCache,
     get_course_commit_sha,
     get_course_repo,
     get_flow_desc,
@@ -67,6 +70,7 @@ from course.content import (
 from course.page.base import PageBase, PageContext
 from course.validation import NotSpecified, ParticipationTagStr, ValidationContext
 from relate.utils import (
+    IPNetworkMatcher,
     RelateHttpRequest,
     remote_address_from_request,
     string_concat,
@@ -82,6 +86,7 @@ if TYPE_CHECKING:
         Collection,
         Hashable,
         Iterable,
+        Mapping,
         Sequence,
         Set as AbstractSet,
     )
@@ -261,31 +266,107 @@ def get_flow_rules(
 
     rules = rules.copy()
 
-    from course.models import FlowRuleException
     if consider_exceptions and participation is not None:
         course = participation.course
+        commit_sha = course.active_git_commit_sha.encode()
+
+        rule_ta = get_rule_ta(type)
+        vctx: ValidationContext | None = None
+
+        # rules created first will get inserted first, and show up last
+        for rule_data, expiration in _get_flow_rule_exception_data(
+                participation, flow_id, type.kind):
+            if expiration is not None and now_datetime > expiration:
+                continue
+
+            # Validated rules are immutable, and the rule data and commit
+            # identify them, so they may be shared across requests.
+            import json
+            cache_key = (
+                    course.id, commit_sha, type.kind,
+                    json.dumps(rule_data, sort_keys=True))
+            rule: FlowRuleT | None = _FLOW_RULE_EXCEPTION_CACHE.get(cache_key)
+
+            if rule is None:
+                if vctx is None:
+                    vctx = ValidationContext(
+                            repo=get_course_repo(course),
+                            commit_sha=commit_sha,
+                            course=course)
+
+                rule = rule_ta.validate_python(rule_data, context=vctx)
+                _FLOW_RULE_EXCEPTION_CACHE.put(cache_key, rule)
+
+            rules.insert(0, rule)
+
+    return rules
+
+
+# {{{ flow rule exception cache
+
+# Validated flow rule exceptions, kept apart from the model cache so that the
+# (many, small) exceptions of a course do not push out its flows.
+_FLOW_RULE_EXCEPTION_CACHE = ProcessLocalLRUCache(256)
+
+
+def get_flow_rule_exception_cache_key(
+        participation_id: int, flow_id: str, kind: str) -> str:
+    return f"relate-flow-rule-exc:{participation_id}:{flow_id}:{kind}"
+
+
+def invalidate_flow_rule_exception_cache(
+        participation_id: int, flow_id: str, kind: str) -> None:
+    from django.conf import settings
+    if not getattr(settings, "RELATE_FLOW_RULE_EXCEPTION_CACHE_TIMEOUT", None):
+        return
+
+    from django.core import cache
+    cache.caches["default"].delete(
+            get_flow_rule_exception_cache_key(participation_id, flow_id, kind))
 
-        vctx = ValidationContext(
-                repo=get_course_repo(course),
-                commit_sha=course.active_git_commit_sha.encode(),
-                course=course)
 
-        for exc in (
+def _get_flow_rule_exception_data(
+        participation: Participation, flow_id: str, kind: str,
+        ) -> list[tuple[Any, datetime.datetime | None]]:
+    """Return the rules and expiration times of the active exceptions of
+    *kind* for *participation* and *flow_id*, in order of creation.
+
+    If :data:`RELATE_FLOW_RULE_EXCEPTION_CACHE_TIMEOUT` is set, the result
+    is cached across requests. The receivers in :mod:`course.receivers`
+    drop cached entries whenever exceptions are saved or deleted. Expired
+    exceptions are left in the cache and skipped by the caller.
+    """
+    from course.models import FlowRuleException
+
+    def get_data() -> list[tuple[Any, datetime.datetime | None]]:
+        return list(
                 FlowRuleException.objects
                 .filter(
                     participation=participation,
                     active=True,
-                    kind=type.kind,
+                    kind=kind,
                     flow_id=flow_id)
-                # rules created first will get inserted first, and show up last
-                .order_by("creation_time")):
+                .order_by("creation_time")
+                .values_list("rule", "expiration"))
 
-            if exc.expiration is not None and now_datetime > exc.expiration:
-                continue
+    from django.conf import settings
+    timeout = getattr(settings, "RELATE_FLOW_RULE_EXCEPTION_CACHE_TIMEOUT", None)
+    if not timeout:
+        return get_data()
 
-            rules.insert(0, get_rule_ta(type).validate_python(exc.rule, context=vctx))
+    from django.core import cache
+    default_cache = cache.caches["default"]
 
-    return rules
+    cache_key = get_flow_rule_exception_cache_key(
+            participation.id, flow_id, kind)
+    result = default_cache.get(cache_key)
+    if result is None:
+        result = get_data()
+        default_cache.set(cache_key, result, timeout)
+
+    return result
+
+# }}}
 
 
 def get_session_start_mode(
@@ -757,9 +838,12 @@ def get_flow_page_with_ctx(
 
 # {{{ utilities for course-based views
 
+ResponseT = TypeVar("ResponseT", bound=HttpResponseBase)
+
+
 def course_view(
-            f: Callable[Concatenate[CoursePageContext, P], http.HttpResponse]
-        ) -> Callable[Concatenate[http.HttpRequest, str, P], http.HttpResponse]:
+            f: Callable[Concatenate[CoursePageContext, P], ResponseT]
+        ) -> Callable[Concatenate[http.HttpRequest, str, P], ResponseT]:
     def wrapper(
                 request: http.HttpRequest,
                 course_identifier: str,
@@ -1070,6 +1154,30 @@ def get_facilities_config(
         return facilities
 
 
+@lru_cache(8)
+def _get_facilities_matcher(
+        facility_ip_ranges: tuple[tuple[str, tuple[str, ...]], ...]
+        ) -> IPNetworkMatcher[str]:
+    return IPNetworkMatcher(
+            (ir, name)
+            for name, ip_ranges in facility_ip_ranges
+            for ir in ip_ranges)
+
+
+def get_facilities_matcher(
+        facilities_config: Mapping[str, Mapping[str, Any]]
+        ) -> IPNetworkMatcher[str]:
+    """
+    :returns: an :class:`~relate.utils.IPNetworkMatcher` mapping IP addresses
+        to the names of the facilities in *facilities_config*. Matchers are
+        reused for as long as the facilities' IP ranges stay the same, so
+        that they are not re-parsed for every request.
+    """
+    return _get_facilities_matcher(tuple(
+        (name, tuple(str(ir) for ir in props.get("ip_ranges", [])))
+        for name, props in facilities_config.items()))
+
+
 class FacilityFindingMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
@@ -1082,18 +1190,12 @@ class FacilityFindingMiddleware:
         else:
             remote_address = remote_address_from_request(request)
 
-            facilities = set()
-
             facilities_config = get_facilities_config(request)
             if facilities_config is None:
                 facilities_config = {}
 
-            from ipaddress import ip_network
-            for name, props in facilities_config.items():
-                ip_ranges = props.get("ip_ranges", [])
-                for ir in ip_ranges:
-                    if remote_address in ip_network(str(ir)):
-                        facilities.add(name)
+            facilities = get_facilities_matcher(facilities_config).match(
+                    remote_address)
 
         request = cast("RelateHttpRequest", request)
         request.relate_facilities = frozenset(facilities)
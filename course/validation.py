@@ -43,7 +43,7 @@ from typing import (
 )
 
 from annotated_types import Ge, Le
-from django.core.exceptions import ObjectDoesNotExist
+from django.core.exceptions import ImproperlyConfigured, ObjectDoesNotExist
 from django.utils.translation import gettext as _
 from pydantic import (
     AfterValidator,
@@ -63,12 +63,18 @@ from course.constants import (
     MAX_EXTRA_CREDIT_FACTOR,
     ParticipationPermission as PPerm,
 )
-from course.repo import Blob_ish, Tree_ish, get_repo_tree
-from relate.utils import string_concat
+from course.repo import (
+    Blob_ish,
+    Tree_ish,
+    get_repo_tree,
+    track_repo_path_accesses,
+)
+from relate.utils import get_cache_generation, string_concat
 
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Collection, Sequence
+    from collections.abc import Callable, Collection, Generator, Iterable, Sequence
+    from concurrent.futures import Executor, Future
     from pathlib import Path
 
     from pydantic import ValidationInfo
@@ -632,37 +638,46 @@ def check_grade_identifier_link(
 
 # {{{ check whether page types were changed
 
+def get_flow_page_types(flow_desc: FlowDesc) -> tuple[tuple[str, str, str], ...]:
+    return tuple(
+            (grp.id, page_desc.id, page_desc.type)
+            for grp in flow_desc.groups
+            for page_desc in grp.pages)
+
+
 def check_for_page_type_changes(
             course: Course,
             flow_id: str,
-            flow_desc: FlowDesc):
+            page_types: Iterable[tuple[str, str, str]]):
+    """
+    :arg page_types: as returned by :func:`get_flow_page_types`.
+    """
 
     from course.models import FlowPageData
-    for grp in flow_desc.groups:
-        for page_desc in grp.pages:
-            fpd_with_mismatched_page_types = list(
-                    FlowPageData.objects
-                    .filter(
-                        flow_session__course=course,
-                        flow_session__flow_id=flow_id,
-                        group_id=grp.id,
-                        page_id=page_desc.id)
-                    .exclude(page_type=None)
-                    .exclude(page_type=page_desc.type)
-                    [0:1])
-
-            if fpd_with_mismatched_page_types:
-                mismatched_fpd, = fpd_with_mismatched_page_types
-                raise ValueError(
-                        _("Flow %(flow_id)s, group '%(group)s', page '%(page)s': "
-                            "page type ('%(type_new)s') differs from "
-                            "type used in database ('%(type_old)s'). "
-                            "You must change the question ID if you change the "
-                            "question type.")
-                        % {"flow_id": flow_id, "group": grp.id,
-                            "page": page_desc.id,
-                            "type_new": page_desc.type,
-                            "type_old": mismatched_fpd.page_type})
+    for group_id, page_id, page_type in page_types:
+        fpd_with_mismatched_page_types = list(
+                FlowPageData.objects
+                .filter(
+                    flow_session__course=course,
+                    flow_session__flow_id=flow_id,
+                    group_id=group_id,
+                    page_id=page_id)
+                .exclude(page_type=None)
+                .exclude(page_type=page_type)
+                [0:1])
+
+        if fpd_with_mismatched_page_types:
+            mismatched_fpd, = fpd_with_mismatched_page_types
+            raise ValueError(
+                    _("Flow %(flow_id)s, group '%(group)s', page '%(page)s': "
+                        "page type ('%(type_new)s') differs from "
+                        "type used in database ('%(type_old)s'). "
+                        "You must change the question ID if you change the "
+                        "question type.")
+                    % {"flow_id": flow_id, "group": group_id,
+                        "page": page_id,
+                        "type_new": page_type,
+                        "type_old": mismatched_fpd.page_type})
 
 # }}}
 
@@ -697,15 +712,327 @@ def validate_static_page_name(
             % location)
 
 
+# {{{ incremental validation
+
+def get_validation_result_cache_timeout() -> int | None:
+    from django.conf import settings
+    return getattr(settings, "RELATE_VALIDATION_RESULT_CACHE_TIMEOUT", None)
+
+
+@dataclass(frozen=True)
+class FileValidationResult:
+    """What validating one course file (such as a flow) found, recorded so
+    that the validation need not be repeated while neither the file nor
+    anything it depends on changes.
+
+    .. attribute:: dependencies
+
+        A tuple of *(path, sha)* for the file itself and each file or
+        directory looked up while validating it, where *sha* is the SHA of
+        the blob or tree at the time (or *None* if there was none).
+
+    .. attribute:: warnings
+    .. attribute:: grade_identifier
+    .. attribute:: page_types
+
+        For flows, a tuple of *(group_id, page_id, page_type)*.
+    """
+
+    dependencies: tuple[tuple[str, bytes | None], ...] = ()
+    warnings: tuple[ValidationWarning, ...] = ()
+    grade_identifier: str | None = None
+    page_types: tuple[tuple[str, str, str], ...] = ()
+
+
+def invalidate_validation_results(course_id: int) -> None:
+    """Forget the recorded validation results for the course with ID
+    *course_id*, e.g. because database state that validation depends on
+    (events, roles, participation tags) changed.
+    """
+    if not get_validation_result_cache_timeout():
+        return
+
+    try:
+        from django.core import cache
+    except ImproperlyConfigured:
+        return
+
+    cache.caches["default"].delete(f"relate-validation-gen:{course_id}")
+
+
+class ValidationResultStore:
+    """Records :class:`FileValidationResult` instances for the files of a
+    course, keyed by the SHA of each file's blob. A recorded result is only
+    used if the files it depends on are unchanged in the commit being
+    validated, as are the files all of the course's content depends on
+    (the events file and the top-level :data:`ATTRIBUTES_FILENAME`).
+    """
+
+    def __init__(self,
+                repo: Repo_ish,
+                commit_sha: bytes,
+                course: Course,
+                default_cache: Any,
+                generation: Any,
+                timeout: int) -> None:
+        from course.repo import get_repo_object_sha
+
+        self.repo = repo
+        self.commit_sha = commit_sha
+        self.course = course
+        self.default_cache = default_cache
+        self.generation = generation
+        self.timeout = timeout
+
+        self.shared_input_shas = tuple(
+                get_repo_object_sha(repo, path, commit_sha)
+                for path in [course.events_file, ATTRIBUTES_FILENAME])
+
+    def _get_key(self, location: str, blob_sha: bytes) -> str:
+        from hashlib import sha256
+
+        from course.repo import CACHE_KEY_ROOT
+        digest = sha256(repr((
+            CACHE_KEY_ROOT, location, blob_sha, self.shared_input_shas,
+            self.course.trusted_for_markup)).encode()).hexdigest()
+
+        return f"relate-validation:{self.course.id}:{self.generation}:{digest}"
+
+    def get(self, location: str) -> FileValidationResult | None:
+        from course.repo import get_repo_object_sha
+
+        blob_sha = get_repo_object_sha(self.repo, location, self.commit_sha)
+        if blob_sha is None:
+            return None
+
+        result = self.default_cache.get(self._get_key(location, blob_sha))
+        if result is None:
+            return None
+
+        for path, sha in result.dependencies:
+            if get_repo_object_sha(self.repo, path, self.commit_sha) != sha:
+                return None
+
+        return result
+
+    def put(self,
+            location: str,
+            accessed_paths: Collection[str],
+            result: FileValidationResult) -> None:
+        from course.repo import get_repo_object_sha
+
+        blob_sha = get_repo_object_sha(self.repo, location, self.commit_sha)
+        if blob_sha is None:
+            return
+
+        result = replace(result,
+                dependencies=tuple(
+                    (path, get_repo_object_sha(self.repo, path, self.commit_sha))
+                    for path in sorted({location, *accessed_paths})),
+                warnings=tuple(
+                    ValidationWarning(w.location, str(w.text))
+                    for w in result.warnings))
+
+        self.default_cache.set(
+                self._get_key(location, blob_sha), result, self.timeout)
+
+
+def get_validation_result_store(
+            repo: Repo_ish | FileSystemFakeRepo,
+            commit_sha: bytes,
+            course: Course | None,
+        ) -> ValidationResultStore | None:
+    """Return a :class:`ValidationResultStore` for validating *commit_sha* of
+    *course*, or *None* if validation results are not recorded, i.e. if
+    ``RELATE_VALIDATION_RESULT_CACHE_TIMEOUT`` is not set or *repo* is not a
+    git repository.
+    """
+    timeout = get_validation_result_cache_timeout()
+    if not timeout or course is None:
+        return None
+
+    import dulwich.repo
+
+    from course.repo import get_true_repo_and_path
+    dul_repo, _path = get_true_repo_and_path(repo, "")
+    if not isinstance(dul_repo, dulwich.repo.Repo):
+        return None
+
+    try:
+        from django.core import cache
+    except ImproperlyConfigured:
+        return None
+
+    default_cache = cache.caches["default"]
+    generation = get_cache_generation(
+            default_cache, f"relate-validation-gen:{course.id}")
+    if generation is None:
+        # e.g. the dummy cache
+        return None
+
+    return ValidationResultStore(
+            repo, commit_sha, course, default_cache, generation, timeout)
+
+# }}}
+
+
+# {{{ parallel validation
+
+def get_validation_processes() -> int:
+    from django.conf import settings
+    return getattr(settings, "RELATE_VALIDATION_PROCESSES", 1)
+
+
+def validate_flow_file(vctx: ValidationContext, location: str) -> FileValidationResult:
+    from course.content import flow_desc_ta, get_model_from_repo
+
+    flow_desc = vctx.with_location(location).annotate_errors(
+        get_model_from_repo,
+        flow_desc_ta, vctx.repo, location, commit_sha=vctx.commit_sha)
+
+    return FileValidationResult(
+            grade_identifier=flow_desc.rules.grade_identifier,
+            page_types=get_flow_page_types(flow_desc))
+
+
+# A picklable description of a repository: the root directory of a
+# FileSystemFakeRepo, or the path of a git repository and the course
+# subdirectory within it.
+RepoDescription: TypeAlias = "tuple[Path, None] | tuple[str, str]"
+
+
+def _get_repo_description(
+            repo: Repo_ish | FileSystemFakeRepo
+        ) -> RepoDescription | None:
+    import dulwich.repo
+
+    from course.repo import FileSystemFakeRepo, get_true_repo_and_path
+
+    true_repo, subdir = get_true_repo_and_path(repo, "")
+    if isinstance(true_repo, FileSystemFakeRepo):
+        return (true_repo.root, None)
+    elif isinstance(true_repo, dulwich.repo.Repo):
+        return (true_repo.path, subdir)
+    else:
+        return None
+
+
+def _open_described_repo(
+            repo_desc: RepoDescription
+        ) -> Repo_ish | FileSystemFakeRepo:
+    from course.repo import FileSystemFakeRepo, SubdirRepoWrapper
+
+    root, subdir = repo_desc
+    if subdir is None:
+        assert not isinstance(root, str)
+        return FileSystemFakeRepo(root)
+
+    from dulwich.repo import Repo
+    repo = Repo(root)
+    if subdir:
+        return SubdirRepoWrapper(repo, subdir)
+    else:
+        return repo
+
+
+def _settings_are_from_configure() -> bool:
+    """Return whether the settings of this process were set up by
+    :meth:`django.conf.LazySettings.configure` (as done by 'relate validate')
+    rather than read from the settings module, which worker processes find
+    through the inherited ``DJANGO_SETTINGS_MODULE`` environment variable.
+    """
+    from django.conf import Settings, UserSettingsHolder, settings
+
+    # make sure the settings are set up
+    _ = settings.DEBUG
+
+    wrapped = settings._wrapped
+    # e.g. override_settings wraps the settings in further holders
+    while isinstance(wrapped, UserSettingsHolder):
+        wrapped = wrapped.default_settings  # pyright: ignore[reportAttributeAccessIssue]
+
+    return not isinstance(wrapped, Settings)
+
+
+def _init_validation_worker(configure_settings: bool) -> None:
+    import django
+    from django.conf import settings
+
+    # Spawned workers re-import the parent's main module, which may already
+    # have set up the settings.
+    if configure_settings and not settings.configured:
+        # as done by 'relate validate'
+        settings.configure(DEBUG=True)
+
+    django.setup()
+
+
+def _validate_flow_file_in_worker(
+            repo_desc: RepoDescription,
+            commit_sha: bytes,
+            course_id: int | None,
+            location: str,
+            track_accessed_paths: bool,
+        ) -> tuple[FileValidationResult, frozenset[str]]:
+    """Validate the flow at *location* in a worker process.
+
+    :returns: the result, with the warnings found, and the paths accessed
+        while validating (if *track_accessed_paths*).
+    """
+    from contextlib import nullcontext
+
+    course = None
+    if course_id is not None:
+        from course.models import Course
+        course = Course.objects.get(id=course_id)
+
+    with _open_described_repo(repo_desc) as repo:
+        vctx = ValidationContext(repo=repo, commit_sha=commit_sha, course=course)
+
+        with (track_repo_path_accesses() if track_accessed_paths
+                else nullcontext(set[str]())) as accessed_paths:
+            result = validate_flow_file(vctx, location)
+
+    return (
+            replace(result, warnings=tuple(
+                ValidationWarning(w.location, str(w.text))
+                for w in vctx.warnings)),
+            frozenset(accessed_paths))
+
+
+def _make_validation_executor(
+            processes: int, configure_settings: bool) -> Executor:
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    # Forked workers would share the parent's database connections.
+    return ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=get_context("spawn"),
+            initializer=_init_validation_worker,
+            initargs=(configure_settings,))
+
+# }}}
+
+
 def validate_course_content(
             repo: Repo_ish | FileSystemFakeRepo,
             course_file: str,
             events_file: str,
             validate_sha: bytes,
-            course: Course | None = None):
+            course: Course | None = None,
+            report_progress: Callable[[int, int], None] | None = None,
+            processes: int = 1):
+    """
+    :arg report_progress: if not *None*, called with the number of flows
+        validated so far and the total number of flows before validating
+        each flow.
+    :arg processes: if greater than one, flows are validated in a pool of
+        this many worker processes. Errors and warnings are reported as if
+        the flows had been validated one after the other.
+    """
     from course.content import (
         calendar_ta,
-        flow_desc_ta,
         get_model_from_repo,
         static_page_ta,
     )
@@ -714,9 +1041,95 @@ def validate_course_content(
             commit_sha=validate_sha,
             course=course)
 
-    vctx.with_location(course_file).annotate_errors(
-            get_model_from_repo,
-            static_page_ta, repo, course_file, validate_sha)
+    result_store = get_validation_result_store(repo, validate_sha, course)
+
+    def validate_file(
+                location: str,
+                validate: Callable[[], FileValidationResult]
+            ) -> FileValidationResult:
+        """Return the recorded result for the file at *location* if there is
+        one, otherwise call *validate* and record what it returns, along with
+        the warnings it adds.
+        """
+        if result_store is None:
+            return validate()
+
+        result = result_store.get(location)
+        if result is not None:
+            vctx.warnings.extend(result.warnings)
+            return result
+
+        nwarnings = len(vctx.warnings)
+        with track_repo_path_accesses() as accessed_paths:
+            result = validate()
+
+        result = replace(result, warnings=tuple(vctx.warnings[nwarnings:]))
+        result_store.put(location, accessed_paths, result)
+        return result
+
+    def validate_static_page(location: str) -> FileValidationResult:
+        vctx.with_location(location).annotate_errors(
+                get_model_from_repo,
+                static_page_ta, repo, location,
+                commit_sha=validate_sha)
+        return FileValidationResult()
+
+    def iter_flow_results(
+                locations: Sequence[str]
+            ) -> Generator[FileValidationResult, None, None]:
+        """Yield the result of validating each flow in *locations*, in
+        order. Flows are validated ahead in worker processes if *processes*
+        permits, but their warnings are only added once their result is
+        yielded.
+        """
+        repo_desc = _get_repo_description(repo)
+        if processes <= 1 or repo_desc is None:
+            for location in locations:
+                yield validate_file(
+                        location,
+                        lambda location=location: validate_flow_file(
+                            vctx, location))
+            return
+
+        recorded_results = {
+                location: (
+                    result_store.get(location)
+                    if result_store is not None else None)
+                for location in locations}
+        pending_locations = [
+                location for location in locations
+                if recorded_results[location] is None]
+
+        executor = None
+        futures: dict[str, Future[
+            tuple[FileValidationResult, frozenset[str]]]] = {}
+        if pending_locations:
+            executor = _make_validation_executor(
+                    min(processes, len(pending_locations)),
+                    configure_settings=_settings_are_from_configure())
+            futures = {
+                    location: executor.submit(
+                        _validate_flow_file_in_worker,
+                        repo_desc, validate_sha,
+                        course.id if course is not None else None,
+                        location, result_store is not None)
+                    for location in pending_locations}
+
+        try:
+            for location in locations:
+                result = recorded_results[location]
+                if result is None:
+                    result, accessed_paths = futures[location].result()
+                    if result_store is not None:
+                        result_store.put(location, accessed_paths, result)
+
+                vctx.warnings.extend(result.warnings)
+                yield result
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+    validate_file(course_file, lambda: validate_static_page(course_file))
 
     try:
         vctx.with_location(events_file).annotate_errors_except(
@@ -787,47 +1200,56 @@ def validate_course_content(
     else:
         used_grade_identifiers: set[str] = set()
 
-        for entry in flows_tree.items():
-            entry_path = entry.path.decode("utf-8")
-            if not entry_path.endswith(".yml"):
-                continue
+        flow_entries = [
+                entry for entry in flows_tree.items()
+                if entry.path.endswith(b".yml")]
 
-            flow_id = entry_path[:-4]
-            location = entry_path
-            validate_flow_id(vctx, location, flow_id)
+        flow_results = iter_flow_results([
+                f"flows/{entry.path.decode('utf-8')}" for entry in flow_entries])
 
-            location = f"flows/{entry_path}"
-            flow_vctx = vctx.with_location(location)
-            flow_desc = flow_vctx.annotate_errors(
-                get_model_from_repo,
-                flow_desc_ta, repo, location, commit_sha=validate_sha)
+        try:
+            for iflow, entry in enumerate(flow_entries):
+                if report_progress is not None:
+                    report_progress(iflow, len(flow_entries))
+
+                entry_path = entry.path.decode("utf-8")
+                flow_id = entry_path[:-4]
+                location = entry_path
+                validate_flow_id(vctx, location, flow_id)
+
+                location = f"flows/{entry_path}"
+                flow_vctx = vctx.with_location(location)
+
+                flow_result = next(flow_results)
 
-            # {{{ check grade_identifier
+                # {{{ check grade_identifier
 
-            flow_grade_identifier = None
-            flow_grade_identifier = flow_desc.rules.grade_identifier
+                flow_grade_identifier = flow_result.grade_identifier
 
-            if (
-                    flow_grade_identifier is not None
-                    and {flow_grade_identifier} & used_grade_identifiers):
-                raise ValidationError(
-                        string_concat("%s: ",
-                                      _("flow uses the same grade_identifier "
-                                        "as another flow"))
-                        % location)
+                if (
+                        flow_grade_identifier is not None
+                        and {flow_grade_identifier} & used_grade_identifiers):
+                    raise ValidationError(
+                            string_concat("%s: ",
+                                          _("flow uses the same grade_identifier "
+                                            "as another flow"))
+                            % location)
 
-            if flow_grade_identifier is not None:
-                used_grade_identifiers.add(flow_grade_identifier)
+                if flow_grade_identifier is not None:
+                    used_grade_identifiers.add(flow_grade_identifier)
 
-            if (course is not None
-                    and flow_grade_identifier is not None):
-                flow_vctx.annotate_errors(check_grade_identifier_link,
-                        course, flow_id, flow_grade_identifier)
+                if (course is not None
+                        and flow_grade_identifier is not None):
+                    flow_vctx.annotate_errors(check_grade_identifier_link,
+                            course, flow_id, flow_grade_identifier)
 
-            # }}}
+                # }}}
 
-            if course is not None:
-                check_for_page_type_changes(course, flow_id, flow_desc)
+                if course is not None:
+                    check_for_page_type_changes(
+                            course, flow_id, flow_result.page_types)
+        finally:
+            flow_results.close()
 
     # }}}
 
@@ -849,21 +1271,22 @@ def validate_course_content(
             validate_static_page_name(vctx, location, page_name)
 
             location = f"staticpages/{entry_path}"
-            vctx.with_location(location).annotate_errors(
-                    get_model_from_repo,
-                    static_page_ta, repo, location,
-                    commit_sha=validate_sha)
+            validate_file(
+                    location,
+                    lambda location=location: validate_static_page(location))
 
     # }}}
 
     return vctx.warnings
 
 
-def validate_course_on_filesystem(root: Path, course_file: str, events_file: str):
+def validate_course_on_filesystem(
+            root: Path, course_file: str, events_file: str, processes: int = 1):
     from course.repo import FileSystemFakeRepo
     fake_repo = FileSystemFakeRepo(root)
     warnings = validate_course_content(
-            fake_repo, course_file, events_file, validate_sha=b"", course=None)
+            fake_repo, course_file, events_file, validate_sha=b"", course=None,
+            processes=processes)
 
     if warnings:
         print(_("WARNINGS: "))
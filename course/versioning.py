@@ -41,6 +41,7 @@ import dulwich.web
 import paramiko
 from crispy_forms.layout import Submit
 from django import forms, http
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.exceptions import PermissionDenied, SuspiciousOperation
@@ -76,6 +77,8 @@ from relate.utils import (
 
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from dulwich.objects import Commit
 
     from course.auth import APIContext
@@ -338,12 +341,52 @@ def run_course_update_command(
             prevent_discarding_revisions: bool):
     assert pctx.participation is not None
 
+    def add_message(level: int, message: str) -> None:
+        messages.add_message(request, level, message)
+
+    update_course_revision(
+            pctx.course, pctx.participation, repo, content_repo, command,
+            new_sha, may_update, prevent_discarding_revisions,
+            add_message=add_message)
+
+
+def update_course_revision(
+            course: Course,
+            participation: Participation,
+            repo: Repo,
+            content_repo: Repo | SubdirRepoWrapper,
+            command: CourseRevisionCommand,
+            new_sha: bytes,
+            may_update: bool,
+            prevent_discarding_revisions: bool,
+            *,
+            add_message: Callable[[int, str], None],
+            report_stage: Callable[[str, int, int], None] | None = None,
+        ) -> bytes | None:
+    """Carry out *command* (fetching, validating and activating a revision
+    of the content of *course*) on behalf of *participation*.
+
+    :arg add_message: called with a message level from
+        :mod:`django.contrib.messages` and the text of each message for the
+        user.
+    :arg report_stage: if not *None*, called with a description of the
+        current stage, the number of items processed and the total number of
+        items in that stage (zero if unknown).
+    :returns: the revision that was activated (for the course or as a
+        preview), or *None*.
+    """
+    if report_stage is None:
+        def report_stage(stage: str, current: int, total: int) -> None:
+            pass
+
     if command in [
             CourseRevisionCommand.fetch,
             CourseRevisionCommand.fetch_update,
             CourseRevisionCommand.fetch_preview]:
+        report_stage(gettext("Fetching"), 0, 0)
+
         client, remote_path = \
-            get_dulwich_client_and_remote_path_from_course(pctx.course)
+            get_dulwich_client_and_remote_path_from_course(course)
 
         fetch_pack_result = client.fetch(remote_path, repo)
 
@@ -367,44 +410,53 @@ def run_course_update_command(
 
         repo[b"HEAD"] = remote_head_sha
 
-        messages.add_message(request, messages.SUCCESS, _("Fetch successful."))
+        add_message(messages.SUCCESS, _("Fetch successful."))
 
         new_sha = remote_head_sha
 
     if command == CourseRevisionCommand.fetch:
-        return
+        return None
 
     if command == CourseRevisionCommand.end_preview:
-        pctx.participation.preview_git_commit_sha = None
-        pctx.participation.save()
+        participation.preview_git_commit_sha = None
+        participation.save()
 
-        messages.add_message(request, messages.INFO,
+        add_message(messages.INFO,
                 _("Preview ended."))
 
-        return
+        return None
 
     # {{{ validate
 
-    from course.validation import ValidationError, validate_course_content
+    def report_validation_progress(current: int, total: int) -> None:
+        report_stage(gettext("Validating flows"), current, total)
+
+    from course.validation import (
+        ValidationError,
+        get_validation_processes,
+        validate_course_content,
+    )
     try:
         warnings = validate_course_content(
-                content_repo, pctx.course.course_file, pctx.course.events_file,
-                new_sha, course=pctx.course)
+                content_repo, course.course_file, course.events_file,
+                new_sha, course=course,
+                report_progress=report_validation_progress,
+                processes=get_validation_processes())
     except ValidationError as e:
         from traceback import print_exc
         print_exc()
 
-        messages.add_message(request, messages.ERROR,
+        add_message(messages.ERROR,
                 _("Course content did not validate successfully:<pre>%s</pre>"
                 "Update not applied.") % str(e))
-        return
+        return None
 
     else:
         if not warnings:
-            messages.add_message(request, messages.SUCCESS,
+            add_message(messages.SUCCESS,
                     _("Course content validated successfully."))
         else:
-            messages.add_message(request, messages.WARNING,
+            add_message(messages.WARNING,
                     string_concat(
                         _("Course content validated OK, with warnings: "),
                         "<ul>%s</ul>")
@@ -415,31 +467,78 @@ def run_course_update_command(
     # }}}
 
     if command in [CourseRevisionCommand.fetch_preview, CourseRevisionCommand.preview]:
-        messages.add_message(request, messages.INFO,
+        add_message(messages.INFO,
                 _("Preview activated."))
 
-        pctx.participation.preview_git_commit_sha = new_sha.decode()
-        pctx.participation.save()
+        participation.preview_git_commit_sha = new_sha.decode()
+        participation.save()
+
+        return new_sha
 
     elif command in [
             CourseRevisionCommand.update,
             CourseRevisionCommand.fetch_update]:
         if may_update:
-            pctx.course.active_git_commit_sha = new_sha.decode()
-            pctx.course.save()
+            course.active_git_commit_sha = new_sha.decode()
+            course.save()
 
-            if pctx.participation.preview_git_commit_sha is not None:
-                pctx.participation.preview_git_commit_sha = None
-                pctx.participation.save()
+            if participation.preview_git_commit_sha is not None:
+                participation.preview_git_commit_sha = None
+                participation.save()
 
-                messages.add_message(request, messages.INFO,
+                add_message(messages.INFO,
                         _("Preview ended."))
 
-            messages.add_message(request, messages.SUCCESS,
+            add_message(messages.SUCCESS,
                     _("Update applied. "))
+
+            return new_sha
         else:
             raise PermissionDenied("may not update")
 
+    return None
+
+
+def warm_course_caches(
+            course: Course,
+            content_repo: Repo_ish,
+            commit_sha: bytes,
+            report_progress: Callable[[int, int], None] | None = None,
+        ) -> None:
+    """Load the course page and flow descriptions at *commit_sha*, so that
+    they are in the cache when first needed by a request.
+
+    When run in a Celery worker, this only helps requests if the default
+    cache is shared between processes (e.g. memcached or Redis), not if it
+    is process-local (e.g. the local-memory cache).
+    """
+    from course.content import get_flow_desc, get_staticpage_desc, list_flow_ids
+
+    get_staticpage_desc(content_repo, course, commit_sha, course.course_file)
+
+    flow_ids = list_flow_ids(content_repo, commit_sha)
+    for iflow, flow_id in enumerate(flow_ids):
+        if report_progress is not None:
+            report_progress(iflow, len(flow_ids))
+
+        get_flow_desc(content_repo, course, flow_id, commit_sha)
+
+
+def run_course_update_command_in_background(
+            pctx: CoursePageContext,
+            command: CourseRevisionCommand,
+            new_sha: bytes,
+            may_update: bool,
+            prevent_discarding_revisions: bool) -> http.HttpResponse:
+    assert pctx.participation is not None
+
+    from course.tasks import update_course_revision_task
+    async_res = update_course_revision_task.delay(
+            pctx.course.id, pctx.participation.id, command.value,
+            new_sha.decode(), may_update, prevent_discarding_revisions)
+
+    return redirect("relate-monitor_task", async_res.id)
+
 
 class GitUpdateForm(StyledForm):
 
@@ -558,6 +657,13 @@ def update_course(pctx: CoursePageContext):
             new_sha = form.cleaned_data["new_sha"].encode()
 
             assert isinstance(content_repo, (Repo, SubdirRepoWrapper))
+            if (getattr(settings, "RELATE_COURSE_UPDATE_IN_BACKGROUND", False)
+                    and command != CourseRevisionCommand.end_preview):
+                return run_course_update_command_in_background(
+                        pctx, command, new_sha, may_update,
+                        prevent_discarding_revisions=form.cleaned_data[
+                            "prevent_discarding_revisions"])
+
             try:
                 run_course_update_command(
                         request, repo, content_repo, pctx, command, new_sha,
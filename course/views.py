@@ -67,8 +67,8 @@ from course.content import (
     grading_rule_ta,
 )
 from course.enrollment import (
+    get_listed_courses_for_user,
     get_participation_for_request,
-    get_participation_permissions,
 )
 from course.models import (
     Course,
@@ -115,21 +115,12 @@ def home(request: http.HttpRequest) -> http.HttpResponse:
 
     current_courses: list[Course] = []
     past_courses: list[Course] = []
-    for course in Course.objects.filter(listed=True):
-        participation = get_participation_for_request(request, course)
-
-        show = True
-        if course.hidden:
-            perms = get_participation_permissions(course, participation)
-            if (PPerm.view_hidden_course_page, None) not in perms:
-                show = False
-
-        if show:
-            if (course.end_date is None
-                    or now_datetime.date() <= course.end_date):
-                current_courses.append(course)
-            else:
-                past_courses.append(course)
+    for course in get_listed_courses_for_user(request.user):
+        if (course.end_date is None
+                or now_datetime.date() <= course.end_date):
+            current_courses.append(course)
+        else:
+            past_courses.append(course)
 
     def course_sort_key_minor(course: Course):
         return course.number if course.number is not None else ""
@@ -1395,9 +1386,8 @@ def monitor_task(request: http.HttpRequest, task_id: str) -> http.HttpResponse:
     progress_statement = None
 
     if async_res.state == "PROGRESS":
-        meta = async_res.info
-        current = meta["current"]
-        total = meta["total"]
+        from course.tasks import get_task_progress
+        current, total = get_task_progress(async_res.info)
         if total > 0:
             progress_percent = 100 * (current / total)
 
@@ -1405,9 +1395,20 @@ def monitor_task(request: http.HttpRequest, task_id: str) -> http.HttpResponse:
                 _("%(current)d out of %(total)d items processed.")
                 % {"current": current, "total": total})
 
+        stage = async_res.info.get("stage")
+        if stage is not None:
+            if total > 0:
+                progress_statement = f"{stage}: {progress_statement}"
+            else:
+                progress_statement = stage
+
+    download_url = None
+    result_messages = []
     if async_res.state == states.SUCCESS and (isinstance(async_res.result, dict)
             and "message" in async_res.result):
         progress_statement = async_res.result["message"]
+        download_url = async_res.result.get("download_url")
+        result_messages = async_res.result.get("messages", [])
 
     traceback = None
     if async_res.state == states.FAILURE:
@@ -1417,6 +1418,8 @@ def monitor_task(request: http.HttpRequest, task_id: str) -> http.HttpResponse:
         "state": async_res.state,
         "progress_percent": progress_percent,
         "progress_statement": progress_statement,
+        "download_url": download_url,
+        "result_messages": result_messages,
         "traceback": traceback,
         })
 
@@ -74,6 +74,35 @@ TIME_ZONE = "America/Chicago"
 # apt-get install rabbitmq-server
 CELERY_BROKER_URL = "amqp://"
 
+# Bulk session operations (expiring, ending, regrading sessions and
+# recalculating grades) are split into subtasks of this many sessions, which
+# are spread across all running Celery workers.
+#
+# RELATE_SESSION_TASK_CHUNK_SIZE = 100
+
+# Grade imports of CSV files at least this many bytes large are run by a
+# Celery task, which reads the file from RELATE_BULK_STORAGE. Smaller
+# imports (and all previews) are handled within the request.
+#
+# RELATE_GRADE_IMPORT_BACKGROUND_MIN_BYTES = 256*1024
+
+# Downloads of all submissions to a page are streamed to the browser while
+# being zipped. Downloads of at least this many submitted answers are
+# instead zipped by a Celery task into RELATE_BULK_STORAGE, below
+# "submission-zips/", and offered for download once done. These archives are
+# not removed automatically.
+#
+# RELATE_DOWNLOAD_SUBMISSIONS_BACKGROUND_MIN_COUNT = 200
+
+# If set, fetching, validating and activating course content revisions
+# (other than ending a preview) is done by a Celery task, with its progress
+# and the resulting messages shown on the task monitor page. The task also
+# loads the course page and flows of an activated revision into the cache,
+# which only benefits the web server processes if the default cache in CACHES
+# is shared with the Celery workers (e.g. memcached, not local memory).
+#
+# RELATE_COURSE_UPDATE_IN_BACKGROUND = True
+
 # Set both of these to true if serving your site exclusively via HTTPS.
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
@@ -90,6 +119,12 @@ CSRF_COOKIE_SECURE = False
 # GIT_ROOT = "/some/where"
 GIT_ROOT = path.join(_BASEDIR, "git-roots")
 
+# Each server process keeps this many parsed flows, static pages and calendars
+# in memory, in addition to the shared cache, so that frequently used flows
+# need neither a cache round trip nor unpickling. Set to 0 to disable.
+#
+# RELATE_MODEL_CACHE_SIZE = 64
+
 # }}}
 
 # {{{ bulk storage
@@ -251,6 +286,86 @@ SOCIAL_AUTH_GOOGLE_OAUTH2_USE_UNIQUE_USER_ID = True
 
 # }}}
 
+# {{{ API authentication tokens
+
+# After an API token's secret has been verified (which deliberately takes a
+# while), the result is remembered in the cache for this many seconds. Revoked
+# and expired tokens are still rejected right away. Set to 0 to verify the
+# secret on every request.
+# RELATE_API_TOKEN_VERIFICATION_CACHE_TIMEOUT = 60
+
+# A token's "last used" time is written at most once per this many seconds.
+# RELATE_API_TOKEN_LAST_USE_UPDATE_INTERVAL = 60
+
+# }}}
+
+# {{{ permission cache
+
+# Cache participants' roles and permissions across requests for this many
+# seconds. Changes to roles and permissions take effect immediately regardless.
+# This needs a cache shared by all server processes (see CACHES above), since
+# other processes are only notified of changes through the cache.
+# RELATE_PERMISSION_CACHE_TIMEOUT = 3600
+
+# }}}
+
+# {{{ flow rule exception cache
+
+# Cache participants' flow rule exceptions across requests for this many
+# seconds. Granted and changed exceptions take effect immediately regardless,
+# and expired ones are ignored. As above, this needs a cache shared by all
+# server processes.
+# RELATE_FLOW_RULE_EXCEPTION_CACHE_TIMEOUT = 3600
+
+# }}}
+
+# {{{ incremental content validation
+
+# Keep the results of validating each flow and static page for this many
+# seconds, keyed by the git blob of the file. When a new revision is validated,
+# files that are unchanged (along with everything they read, such as included
+# macros, and the events and top-level .attributes.yml files) are not
+# validated again. Changes to events, roles and participation tags discard the
+# recorded results.
+# RELATE_VALIDATION_RESULT_CACHE_TIMEOUT = 7*24*3600
+
+# }}}
+
+# {{{ parallel content validation
+
+# Validate the flows of a new course revision in a pool of this many worker
+# processes. Each worker starts a fresh Python interpreter and sets up Django,
+# which takes about a second, so this only pays off for courses with many
+# flows. 'relate validate' takes the number of processes as '--jobs'.
+# RELATE_VALIDATION_PROCESSES = 4
+
+# }}}
+
+# {{{ event index
+
+# Keep each course's events in the memory of each server process, so that
+# evaluating date specifications (e.g. "end:exam 1") does not query the
+# database each time. Changes to events take effect immediately regardless.
+# As above, this needs a cache shared by all server processes.
+# RELATE_EVENT_INDEX_ENABLED = True
+
+# }}}
+
+# {{{ instrumentation
+
+# If set, record for each view the number of SQL queries, the time spent on
+# them, hits and misses on the default cache, blobs read from course
+# repositories and the total time taken. Each server process aggregates its
+# own metrics, which staff may read in Prometheus text format at
+# /instrumentation/metrics/. Work done while streaming a response (e.g. large
+# CSV or zip downloads) happens after the view returns and is not counted.
+# RELATE_INSTRUMENTATION_ENABLED = True
+
+# Views beyond this many are aggregated together, to bound memory use.
+# RELATE_INSTRUMENTATION_MAX_VIEWS = 200
+
+# }}}
+
 # {{{ editable institutional id before verification?
 
 # If set to False, user won't be able to edit institutional ID
@@ -410,6 +525,26 @@ RELATE_DOCKER_TLS_CONFIG = None
 #     ca_cert=os.path.join(pki_base_dir, "ca.pem"),
 #     verify=True)
 
+# Number of started, ready-to-use containers to keep on hand (per image and
+# per web server process) for running student code, so that submissions do
+# not have to wait for container start-up. Containers are single-use and are
+# replaced in the background. Each process removes its pooled containers
+# when it exits. Set to 0 to start a container for every submission.
+# Hits, misses and wait times of the pools are included in the metrics at
+# /instrumentation/metrics/ (see RELATE_INSTRUMENTATION_ENABLED).
+# RELATE_DOCKER_RUNPY_POOL_SIZE = 4
+
+# Pooled containers older than this many seconds (or no longer responding)
+# are discarded instead of being used. This is checked about once a minute.
+# RELATE_DOCKER_RUNPY_POOL_MAX_AGE = 600
+
+# If set, results of running code for code questions are kept in the default
+# cache for this many seconds and reused for byte-identical submissions
+# against unchanged question code. Only successful runs and runs where the
+# submitted code failed are reused. Note that this means that setup code
+# drawing random numbers is not rerun for identical submissions.
+# RELATE_CODE_RESULT_CACHE_TIMEOUT = 7*24*60*60
+
 # }}}
 
 # {{{ maintenance and announcements
@@ -446,6 +581,32 @@ RELATE_SITE_ANNOUNCEMENT = None
 #     ("de", "German"),
 # ]
 
+# {{{ grade book
+
+# Read grade books from the stored current grade of each participant, instead
+# of replaying the full grade history on every view. The stored grades are
+# only kept up to date while this is enabled, so whenever you turn it on, run
+#
+#   python manage.py rebuild_grade_states
+#
+# right afterwards to bring in grades changed while it was off.
+#
+# RELATE_USE_MATERIALIZED_GRADE_STATES = True
+
+# }}}
+
+# {{{ analytics
+
+# Compute flow and page analytics in a Celery task when they are first viewed
+# (the page shows that they are pending until then), and show the stored
+# version afterwards. Instructors can request a recomputation from the
+# analytics page. Stored analytics are per course revision, so they are
+# recomputed automatically after a content update.
+#
+# RELATE_ANALYTICS_SNAPSHOTS = True
+
+# }}}
+
 # {{{ exams and testing
 
 # This may also be a callable that receives a local-timezone datetime and returns
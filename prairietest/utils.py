@@ -52,6 +52,7 @@ from django.db.models import Q
 
 from course.models import Course
 from prairietest.models import AllowEvent, DenyEvent, MostRecentDenyEvent
+from relate.utils import IPNetworkMatcher
 
 
 if TYPE_CHECKING:
@@ -128,6 +129,11 @@ def check_signature(
 # }}}
 
 
+@lru_cache(64)
+def _get_cidr_blocks_matcher(cidr_blocks: tuple[str, ...]) -> IPNetworkMatcher[None]:
+    return IPNetworkMatcher((cidr_block, None) for cidr_block in cidr_blocks)
+
+
 def has_access_to_exam(
             course: Course,
             user_uid: str | None,
@@ -157,9 +163,8 @@ def has_access_to_exam(
         if now < allow_event.start or allow_event.end < now:
             return None
 
-        if any(
-                ip_address in ip_network(cidr_block)
-                for cidr_block in allow_event.cidr_blocks):
+        if ip_address in _get_cidr_blocks_matcher(
+                tuple(allow_event.cidr_blocks)):
             return allow_event
 
     return None
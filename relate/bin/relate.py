@@ -59,10 +59,13 @@ def validate_course(args):
     import django
     django.setup()
 
+    import os
+
     from course.validation import validate_course_on_filesystem
     has_warnings = validate_course_on_filesystem(Path(args.REPO_ROOT),
             course_file=args.course_file,
-            events_file=args.events_file)
+            events_file=args.events_file,
+            processes=args.jobs or os.cpu_count() or 1)
 
     if has_warnings and args.warn_error:
         return 1
@@ -322,6 +325,8 @@ def main() -> None:
     parser_validate_course.add_argument("--events-file", default="events.yml")
     parser_validate_course.add_argument("--warn-error", action="store_true",
             help="Treat warnings as errors")
+    parser_validate_course.add_argument("-j", "--jobs", type=int, default=1,
+            help="Validate flows in this many processes (0: one per CPU)")
     parser_validate_course.add_argument("REPO_ROOT", default=os.getcwd())
     parser_validate_course.set_defaults(func=validate_course)
 
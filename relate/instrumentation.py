@@ -0,0 +1,354 @@
+from __future__ import annotations
+
+
+__copyright__ = "Copyright (C) 2026 University of Illinois Board of Trustees"
+
+__license__ = """
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+THE SOFTWARE.
+"""
+
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import cache
+from threading import Lock
+from typing import TYPE_CHECKING, Any
+
+from django import http
+from django.conf import settings
+from django.core.cache.backends.base import BaseCache
+from django.core.exceptions import MiddlewareNotUsed, PermissionDenied
+from typing_extensions import override
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Sequence
+
+
+# {{{ per-request metrics
+
+@dataclass
+class RequestMetrics:
+    query_count: int = 0
+    db_time: float = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    repo_blob_fetches: int = 0
+
+
+_CURRENT_METRICS: ContextVar[RequestMetrics | None] = ContextVar(
+        "relate_request_metrics", default=None)
+
+
+def record_repo_blob_fetch() -> None:
+    metrics = _CURRENT_METRICS.get()
+    if metrics is not None:
+        metrics.repo_blob_fetches += 1
+
+
+def _count_queries(metrics: RequestMetrics) -> Callable[..., Any]:
+    def execute_wrapper(execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.query_count += 1
+            metrics.db_time += time.monotonic() - start
+
+    return execute_wrapper
+
+
+_NOT_FOUND = object()
+
+
+class _CacheGetCountingMixin(BaseCache):
+    """Counts hits and misses of :meth:`get` and :meth:`get_many` in the
+    metrics of the current request, if any.
+    """
+
+    @override
+    def get(self, key: Any, default: Any = None, version: int | None = None
+            ) -> Any:
+        metrics = _CURRENT_METRICS.get()
+        if metrics is None:
+            return super().get(key, default, version=version)
+
+        result = super().get(key, _NOT_FOUND, version=version)
+        if result is _NOT_FOUND:
+            metrics.cache_misses += 1
+            return default
+
+        metrics.cache_hits += 1
+        return result
+
+    @override
+    def get_many(self, keys: Any, version: int | None = None) -> dict[Any, Any]:
+        metrics = _CURRENT_METRICS.get()
+        if metrics is None:
+            return super().get_many(keys, version=version)
+
+        keys = list(keys)
+
+        # Some backends implement get_many through get, whose calls must not
+        # be counted again.
+        token = _CURRENT_METRICS.set(None)
+        try:
+            result = super().get_many(keys, version=version)
+        finally:
+            _CURRENT_METRICS.reset(token)
+
+        metrics.cache_hits += len(result)
+        metrics.cache_misses += len(keys) - len(result)
+        return result
+
+
+@cache
+def _get_counting_cache_class(cache_class: type[BaseCache]) -> type[BaseCache]:
+    return type(
+            f"Counting{cache_class.__name__}",
+            (_CacheGetCountingMixin, cache_class), {})
+
+
+def _count_cache_gets(cache: BaseCache) -> None:
+    """Make *cache* count its hits and misses in the metrics of the request
+    being handled, by switching it to a subclass of its backend class.
+    Requests handled concurrently (e.g. under ASGI) may share *cache*, which
+    is why the metrics are found through a context variable.
+    """
+    if not isinstance(cache, _CacheGetCountingMixin):
+        cache.__class__ = _get_counting_cache_class(type(cache))
+
+# }}}
+
+
+# {{{ aggregated metrics
+
+# upper bounds of the histogram buckets
+DURATION_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram:
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = bounds
+        # the last entry counts values above all bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum: float = 0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+@dataclass
+class ViewMetrics:
+    request_count: int = 0
+    query_count: int = 0
+    db_time: float = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    repo_blob_fetches: int = 0
+
+    duration: Histogram = field(
+            default_factory=lambda: Histogram(DURATION_BUCKETS))
+    queries: Histogram = field(
+            default_factory=lambda: Histogram(QUERY_COUNT_BUCKETS))
+
+    def add(self, metrics: RequestMetrics, duration: float) -> None:
+        self.request_count += 1
+        self.query_count += metrics.query_count
+        self.db_time += metrics.db_time
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+        self.repo_blob_fetches += metrics.repo_blob_fetches
+
+        self.duration.add(duration)
+        self.queries.add(metrics.query_count)
+
+
+# Views beyond RELATE_INSTRUMENTATION_MAX_VIEWS are aggregated under this name.
+OTHER_VIEWS = "(other)"
+
+_VIEW_METRICS: dict[str, ViewMetrics] = {}
+_VIEW_METRICS_LOCK = Lock()
+
+
+def record_view_metrics(
+        view_name: str, metrics: RequestMetrics, duration: float) -> None:
+    max_views = getattr(settings, "RELATE_INSTRUMENTATION_MAX_VIEWS", 200)
+
+    with _VIEW_METRICS_LOCK:
+        view_metrics = _VIEW_METRICS.get(view_name)
+        if view_metrics is None:
+            if len(_VIEW_METRICS) >= max_views:
+                view_name = OTHER_VIEWS
+            view_metrics = _VIEW_METRICS.setdefault(view_name, ViewMetrics())
+
+        view_metrics.add(metrics, duration)
+
+
+def clear_view_metrics() -> None:
+    with _VIEW_METRICS_LOCK:
+        _VIEW_METRICS.clear()
+
+
+def render_view_metrics() -> str:
+    """Return the metrics recorded in this process, along with the statistics
+    of its pools of code-running containers (see
+    :class:`course.page.code.RunpyContainerPool`), in the Prometheus text
+    exposition format.
+    """
+    with _VIEW_METRICS_LOCK:
+        items = sorted(_VIEW_METRICS.items())
+
+        lines: list[str] = []
+
+        def add_counter(name: str, help_text: str, attr: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for view_name, view_metrics in items:
+                lines.append(
+                        f'{name}{{view="{view_name}"}} '
+                        f"{getattr(view_metrics, attr)}")
+
+        def add_histogram(name: str, help_text: str, attr: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for view_name, view_metrics in items:
+                hist: Histogram = getattr(view_metrics, attr)
+
+                cumulative_count = 0
+                for bound, count in zip(
+                        [*hist.bounds, "+Inf"], hist.counts, strict=True):
+                    cumulative_count += count
+                    lines.append(
+                            f'{name}_bucket{{view="{view_name}",le="{bound}"}} '
+                            f"{cumulative_count}")
+                lines.append(f'{name}_sum{{view="{view_name}"}} {hist.sum}')
+                lines.append(
+                        f'{name}_count{{view="{view_name}"}} {cumulative_count}')
+
+        add_counter("relate_view_requests_total",
+                "Number of requests handled", "request_count")
+        add_counter("relate_view_db_queries_total",
+                "Number of SQL queries run", "query_count")
+        add_counter("relate_view_db_seconds_total",
+                "Time spent running SQL queries", "db_time")
+        add_counter("relate_view_cache_hits_total",
+                "Number of keys found in the default cache", "cache_hits")
+        add_counter("relate_view_cache_misses_total",
+                "Number of keys not found in the default cache", "cache_misses")
+        add_counter("relate_view_repo_blob_fetches_total",
+                "Number of blobs read from course repositories",
+                "repo_blob_fetches")
+        add_histogram("relate_view_duration_seconds",
+                "Time taken to handle requests", "duration")
+        add_histogram("relate_view_db_queries",
+                "Number of SQL queries run per request", "queries")
+
+    from course.page.code import get_runpy_container_pool_stats
+    pool_stats = sorted(get_runpy_container_pool_stats().items())
+
+    def add_pool_series(
+            name: str, metric_type: str, help_text: str, key: str) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for image, stats in pool_stats:
+            lines.append(f'{name}{{image="{image}"}} {stats[key]}')
+
+    add_pool_series("relate_runpy_pool_size", "gauge",
+            "Number of ready containers in the pool", "size")
+    add_pool_series("relate_runpy_pool_hits_total", "counter",
+            "Number of containers taken ready from the pool", "hits")
+    add_pool_series("relate_runpy_pool_misses_total", "counter",
+            "Number of containers started because the pool was empty", "misses")
+    add_pool_series("relate_runpy_pool_evictions_total", "counter",
+            "Number of pooled containers discarded as old or unresponsive",
+            "evictions")
+    add_pool_series("relate_runpy_pool_hit_wait_seconds_total", "counter",
+            "Time spent obtaining a container from the pool", "hit_wait_time")
+    add_pool_series("relate_runpy_pool_miss_wait_seconds_total", "counter",
+            "Time spent starting a container on a pool miss", "miss_wait_time")
+
+    return "\n".join(lines) + "\n"
+
+# }}}
+
+
+# {{{ middleware
+
+class InstrumentationMiddleware:
+    """Records, per view, the number of SQL queries, the time spent on them,
+    hits and misses on the default cache, blobs read from course repositories
+    and the total time taken. Only enabled if
+    ``RELATE_INSTRUMENTATION_ENABLED`` is set.
+
+    The metrics are aggregated in the memory of each server process and
+    may be viewed by staff through :func:`view_metrics`.
+
+    The content of streaming responses is produced after the view returns,
+    so queries, cache lookups and blob reads made while it is sent are not
+    counted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "RELATE_INSTRUMENTATION_ENABLED", False):
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+
+    def __call__(self, request: http.HttpRequest) -> http.HttpResponse:
+        from django.core.cache import caches
+        from django.db import connection
+
+        _count_cache_gets(caches["default"])
+
+        metrics = RequestMetrics()
+        token = _CURRENT_METRICS.set(metrics)
+
+        start = time.monotonic()
+        try:
+            with connection.execute_wrapper(_count_queries(metrics)):
+                response = self.get_response(request)
+        finally:
+            duration = time.monotonic() - start
+            _CURRENT_METRICS.reset(token)
+
+        resolver_match = request.resolver_match
+        if resolver_match is not None:
+            func = resolver_match.func
+            record_view_metrics(
+                    f"{func.__module__}.{func.__qualname__}", metrics, duration)
+
+        return response
+
+
+def view_metrics(request: http.HttpRequest) -> http.HttpResponse:
+    if not request.user.is_staff:
+        raise PermissionDenied()
+
+    return http.HttpResponse(
+            render_view_metrics(),
+            content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# }}}
+
+# vim: foldmethod=marker
@@ -84,6 +84,7 @@ SOCIAL_AUTH_POSTGRES_JSONFIELD = (
 # {{{ django: middleware
 
 MIDDLEWARE = (
+    "relate.instrumentation.InstrumentationMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.locale.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
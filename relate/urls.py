@@ -39,6 +39,7 @@ import course.im
 import course.sandbox
 import course.versioning
 import course.views
+import relate.instrumentation
 from course.constants import COURSE_ID_REGEX, FLOW_ID_REGEX, STATICPAGE_PATH_REGEX
 
 
@@ -266,6 +267,15 @@ urlpatterns = [
         course.grades.download_all_submissions,
         name="relate-download_all_submissions"),
 
+    re_path(r"^course"
+        "/" + COURSE_ID_REGEX
+        + "/grading/download-submissions-zip"
+        "/(?P<zip_id>[0-9a-f]+)"
+        r"/(?P<filename>[-_a-zA-Z0-9.]+\.zip)"
+        "$",
+        course.grades.download_submissions_zip,
+        name="relate-download_submissions_zip"),
+
     re_path(r"^course"
         "/" + COURSE_ID_REGEX
         + "/edit-grading-opportunity"
@@ -574,6 +584,16 @@ urlpatterns = [
         course.api.get_flow_session_content,
         name="relate-course_get_flow_session_content"),
 
+    re_path(r"^course"
+        "/" + COURSE_ID_REGEX
+        + "/api/v1/get-flow-sessions-content$",
+        course.api.get_flow_sessions_content,
+        name="relate-course_get_flow_sessions_content"),
+
+    path("instrumentation/metrics/",
+        relate.instrumentation.view_metrics,
+        name="relate-instrumentation_metrics"),
+
     path(r"admin/", admin.site.urls),
 
     path("social-auth/", include("social_django.urls"), name="social"),
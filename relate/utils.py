@@ -27,9 +27,11 @@ THE SOFTWARE.
 import datetime
 from abc import ABC
 from ipaddress import IPv4Address, IPv6Address, ip_address, ip_network
+from operator import itemgetter
 from typing import (
     TYPE_CHECKING,
     Any,
+    Generic,
     ParamSpec,
     TypeVar,
 )
@@ -43,10 +45,12 @@ from typing_extensions import TypeIs, deprecated, override
 
 
 if TYPE_CHECKING:
-    from collections.abc import Callable, Collection, Mapping
+    from collections.abc import Callable, Collection, Iterable, Mapping
+    from ipaddress import IPv4Network, IPv6Network
     from pathlib import Path
 
     from django.contrib.auth.models import AbstractUser, AnonymousUser
+    from django.core.cache.backends.base import BaseCache
 
     from accounts.models import User
 
@@ -123,6 +127,85 @@ def remote_address_from_request(request: HttpRequest) -> IPv4Address | IPv6Addre
     return ip_address(str(request.META["REMOTE_ADDR"]))
 
 
+# {{{ compiled IP network matching
+
+class IPNetworkMatcher(Generic[T]):
+    """Maps IP addresses to the labels of all networks containing them.
+
+    The networks are parsed once, at construction time, and flattened into
+    a sorted list of disjoint address intervals per IP version, each
+    carrying the set of labels of the networks that cover it. Looking up
+    an address is then a binary search over these intervals.
+
+    .. automethod:: __init__
+    .. automethod:: match
+    """
+
+    def __init__(self,
+                networks: Iterable[
+                    tuple[str | IPv4Network | IPv6Network, T]]) -> None:
+        """
+        :arg networks: an iterable of tuples *(network, label)*. *network* may
+            be a string in CIDR notation. A label may occur with multiple
+            networks.
+        """
+        # {version: [(boundary, +1/-1, label)]}
+        events: dict[int, list[tuple[int, int, T]]] = {}
+        for network, label in networks:
+            net = ip_network(str(network))
+            version_events = events.setdefault(net.version, [])
+            version_events.append((int(net.network_address), 1, label))
+            version_events.append((int(net.broadcast_address) + 1, -1, label))
+
+        # {version: (interval starts, labels covering each interval)}
+        self._intervals: dict[int, tuple[list[int], list[frozenset[T]]]] = {}
+        for version, version_events in events.items():
+            version_events.sort(key=itemgetter(0))
+
+            starts: list[int] = []
+            labels: list[frozenset[T]] = []
+            counts: dict[T, int] = {}
+
+            i = 0
+            while i < len(version_events):
+                boundary = version_events[i][0]
+                while (i < len(version_events)
+                        and version_events[i][0] == boundary):
+                    _, delta, label = version_events[i]
+                    counts[label] = counts.get(label, 0) + delta
+                    if not counts[label]:
+                        del counts[label]
+                    i += 1
+
+                interval_labels = frozenset(counts)
+                if labels and labels[-1] == interval_labels:
+                    continue
+                starts.append(boundary)
+                labels.append(interval_labels)
+
+            self._intervals[version] = (starts, labels)
+
+    def match(self, address: IPv4Address | IPv6Address) -> frozenset[T]:
+        """
+        :returns: the labels of all networks containing *address*.
+        """
+        try:
+            starts, labels = self._intervals[address.version]
+        except KeyError:
+            return frozenset()
+
+        from bisect import bisect_right
+        idx = bisect_right(starts, int(address)) - 1
+        if idx < 0:
+            return frozenset()
+        return labels[idx]
+
+    def __contains__(self, address: IPv4Address | IPv6Address) -> bool:
+        return bool(self.match(address))
+
+# }}}
+
+
 # {{{ maintenance mode
 
 def is_maintenance_mode(request: HttpRequest):
@@ -301,6 +384,26 @@ class retry_transaction_decorator:  # noqa
         return wrapper
 
 
+# {{{ cache generations
+
+def get_cache_generation(cache: BaseCache, key: str) -> str | None:
+    """Return the 'generation' token stored under *key* in *cache*, creating
+    it if needed. Including the token in the keys of a group of cache
+    entries makes all of them unreachable at once when *key* is deleted.
+
+    Returns *None* if *cache* does not keep what is stored in it (e.g. the
+    dummy cache).
+    """
+    generation = cache.get(key)
+    if generation is None:
+        from uuid import uuid4
+        cache.add(key, uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+# }}}
+
+
 # {{{ hang debugging
 
 def dumpstacks(signal, frame):  # pragma: no cover
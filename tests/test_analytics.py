@@ -23,6 +23,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+from datetime import timedelta
+
 import pytest
 from django.core.exceptions import ObjectDoesNotExist
 from django.test import Client, TestCase
@@ -140,7 +142,215 @@ class HistogramTest(CoursesTestMixinBase, TestCase):
             self.assertTemplateUsed("course/histogram.html")
 
 
+class GetPageAnswerAggregatesTest(CoursesTestMixinBase, TestCase):
+    """test analytics.get_page_answer_aggregates"""
+
+    flow_id = "quiz-test"
+
+    def setUp(self):
+        super().setUp()
+        self.course = factories.CourseFactory()
+
+        # (group_id, page_id, multiple_submit)
+        self.flow_desc = self.make_flow_desc(
+            [("g", "p1", False), ("g", "p2", True)])
+
+        patcher = mock.patch("course.analytics.is_page_multiple_submit",
+                             side_effect=lambda flow_desc, page_desc: (
+                                 page_desc.multiple_submit))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_flow_desc(self, pages):
+        from types import SimpleNamespace
+        return SimpleNamespace(groups=[
+            SimpleNamespace(id="g", pages=[
+                SimpleNamespace(id=page_id, multiple_submit=multiple_submit)
+                for group_id, page_id, multiple_submit in pages])])
+
+    def submit(self, participation, page_id, minutes, answer=True,
+               correctness=None, flow_session=None, page_data=None):
+        from django.utils.timezone import now
+
+        if page_data is None:
+            if flow_session is None:
+                flow_session = factories.FlowSessionFactory(
+                    participation=participation, flow_id=self.flow_id)
+            page_data = factories.FlowPageDataFactory(
+                flow_session=flow_session, group_id="g", page_id=page_id)
+
+        visit = factories.FlowPageVisitFactory(
+            page_data=page_data,
+            visit_time=now() + timedelta(minutes=minutes),
+            answer={"answer": "x"} if answer else None,
+            is_submitted_answer=True)
+        if correctness is not None:
+            factories.FlowPageVisitGradeFactory(
+                visit=visit, correctness=correctness)
+        return visit
+
+    def get_aggregates(self, restrict_to_first_attempt=False):
+        return analytics.get_page_answer_aggregates(
+            self.course, self.flow_id, self.flow_desc,
+            restrict_to_first_attempt)
+
+    def test_counts(self):
+        p1, p2, p3 = factories.ParticipationFactory.create_batch(
+            3, course=self.course)
+        self.submit(p1, "p1", 0, correctness=1)
+        self.submit(p2, "p1", 1, correctness=0.5)
+        self.submit(p3, "p1", 2, answer=False, correctness=0)
+
+        # not included in statistics
+        factories.FlowPageVisitFactory(
+            page_data=factories.FlowPageDataFactory(
+                flow_session=factories.FlowSessionFactory(
+                    participation=p1, flow_id="other-flow"),
+                group_id="g", page_id="p1"),
+            is_submitted_answer=True)
+
+        with self.assertNumQueries(1):
+            aggregates = self.get_aggregates()
+
+        self.assertEqual(set(aggregates), {("g", "p1")})
+        agg = aggregates["g", "p1"]
+        self.assertEqual(agg.total_count, 3)
+        self.assertEqual(agg.answer_count, 2)
+        self.assertEqual(agg.empty_count, 1)
+        self.assertEqual(agg.graded_count, 3)
+        self.assertAlmostEqual(agg.points, 1.5)
+
+    def test_most_recent_grade_counts(self):
+        p1 = factories.ParticipationFactory(course=self.course)
+        visit = self.submit(p1, "p1", 0, correctness=0)
+        factories.FlowPageVisitGradeFactory(
+            visit=visit, correctness=0.75,
+            grade_time=visit.visit_time + timedelta(minutes=1))
+
+        self.assertAlmostEqual(self.get_aggregates()["g", "p1"].points, 0.75)
+
+    def test_multiple_submit_counts_last_answer(self):
+        p1 = factories.ParticipationFactory(course=self.course)
+        first = self.submit(p1, "p2", 0, correctness=0)
+        self.submit(p1, "p2", 1, correctness=1, page_data=first.page_data)
+
+        agg = self.get_aggregates()["g", "p2"]
+        self.assertEqual(agg.total_count, 1)
+        self.assertEqual(agg.points, 1)
+
+    def test_restrict_to_first_attempt(self):
+        p1 = factories.ParticipationFactory(course=self.course)
+        self.submit(p1, "p1", 0, correctness=0.25)
+        self.submit(p1, "p1", 5, correctness=1)
+
+        agg = self.get_aggregates()["g", "p1"]
+        self.assertEqual(agg.total_count, 2)
+
+        agg = self.get_aggregates(restrict_to_first_attempt=True)["g", "p1"]
+        self.assertEqual(agg.total_count, 1)
+        self.assertEqual(agg.points, 0.25)
+
+
 @pytest.mark.slow
+class AnalyticsSnapshotTest(CoursesTestMixinBase, TestCase):
+    """test analytics.update_analytics_snapshot and friends"""
+
+    flow_id = "quiz-test"
+
+    def setUp(self):
+        super().setUp()
+        self.course = factories.CourseFactory()
+        self.actx = analytics.AnalyticsContext(
+            course=self.course, repo=mock.MagicMock(),
+            course_commit_sha=b"my_fake_commit_sha")
+
+        self.stats_list = [
+            analytics.PageAnswerStats(
+                group_id="g", page_id="p1", title="Page 1",
+                average_correctness=0.5, average_emptiness=0.25,
+                answer_count=3, total_count=4, url="/some/url")]
+
+        for name, return_value in [
+                ("make_grade_histogram", _dummy_histogram()),
+                ("make_page_answer_stats_list", self.stats_list),
+                ("make_time_histogram", _dummy_histogram()),
+                ("count_participants", 2)]:
+            patcher = mock.patch(f"course.analytics.{name}",
+                                 return_value=return_value)
+            setattr(self, f"mock_{name}", patcher.start())
+            self.addCleanup(patcher.stop)
+
+    def test_update_and_restore(self):
+        snapshot = analytics.update_analytics_snapshot(
+            self.actx, self.flow_id, "", "", False)
+        snapshot.refresh_from_db()
+
+        self.assertEqual(snapshot.commit_sha, "my_fake_commit_sha")
+        result = analytics.snapshot_to_analytics(snapshot.data)
+
+        self.assertEqual(result["participant_count"], 2)
+        self.assertEqual(result["grade_histogram"]["total_weight"], 2)
+        self.assertEqual(result["grade_histogram"]["html"],
+                         _dummy_histogram().html())
+        self.assertEqual(result["page_answer_stats_list"], self.stats_list)
+
+    def test_update_replaces(self):
+        from course.models import AnalyticsSnapshot
+
+        analytics.update_analytics_snapshot(
+            self.actx, self.flow_id, "", "", False)
+        self.mock_count_participants.return_value = 5
+        analytics.update_analytics_snapshot(
+            self.actx, self.flow_id, "", "", False)
+        analytics.update_analytics_snapshot(
+            self.actx, self.flow_id, "", "", True)
+
+        self.assertEqual(AnalyticsSnapshot.objects.count(), 2)
+        snapshot = AnalyticsSnapshot.objects.get(
+            restrict_to_first_attempt=False)
+        self.assertEqual(snapshot.data["participant_count"], 5)
+
+    def test_get_queues_missing(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        pctx = mock.MagicMock(course=self.course,
+                              course_commit_sha=b"my_fake_commit_sha")
+
+        with mock.patch("course.analytics.get_flow_desc"), \
+                mock.patch("course.tasks.refresh_analytics_snapshot.delay") \
+                as mock_delay:
+            for _i in range(2):
+                self.assertIsNone(analytics.get_analytics_snapshot(
+                    pctx, self.flow_id, "", "", False))
+
+        # only queued once while pending
+        mock_delay.assert_called_once_with(
+            self.course.id, self.flow_id, "", "", "my_fake_commit_sha", False)
+        self.mock_count_participants.assert_not_called()
+
+        snapshot = analytics.update_analytics_snapshot(
+            self.actx, self.flow_id, "", "", False)
+        self.assertEqual(
+            analytics.get_analytics_snapshot(pctx, self.flow_id, "", "", False),
+            snapshot)
+
+    def test_refresh_task(self):
+        from course.models import AnalyticsSnapshot
+        from course.tasks import refresh_analytics_snapshot
+
+        with mock.patch("course.tasks.get_course_repo"):
+            result = refresh_analytics_snapshot.apply(args=(
+                self.course.id, self.flow_id, "", "", "my_fake_commit_sha",
+                True))
+
+        self.assertTrue(result.successful())
+        snapshot = AnalyticsSnapshot.objects.get()
+        self.assertTrue(snapshot.restrict_to_first_attempt)
+        self.assertEqual(snapshot.data["participant_count"], 2)
+
+
 class PageAnalyticsTest(SingleCourseTestMixin, TestCase):
     """test analytics.page_analytics, (for cases not covered by other tests)"""
     def test_not_authenticated(self):
@@ -24,6 +24,7 @@ THE SOFTWARE.
 """
 
 from django.test import TestCase
+from django.urls import reverse
 
 from tests import factories
 from tests.base_test_mixins import APITestMixin, SingleCourseQuizPageTestMixin
@@ -46,6 +47,40 @@ class GetFlowSessionsTest(APITestMixin, TestCase):
                 token.id, self.default_token_hash_str))
         self.assertEqual(resp.status_code, 200)
 
+    def test_pagination(self):
+        for _i in range(3):
+            self.start_flow(self.flow_id)
+            self.end_flow()
+        token = self.create_token()
+
+        def get_ids(**kwargs):
+            from urllib.parse import urlencode
+            resp = self.client.get(
+                self.get_get_flow_session_api_url() + "&" + urlencode(kwargs),
+                HTTP_AUTHORIZATION="Token %i_%s" % (
+                    token.id, self.default_token_hash_str))
+            self.assertEqual(resp.status_code, 200)
+            return [sess["id"] for sess in resp.json()]
+
+        all_ids = get_ids()
+        self.assertEqual(len(all_ids), 3)
+        self.assertEqual(get_ids(limit=2), all_ids[:2])
+        self.assertEqual(get_ids(limit=2, after_id=all_ids[1]), all_ids[2:])
+
+        from django.utils.timezone import now
+        self.assertEqual(get_ids(since=now().isoformat()), [])
+
+    def test_fail_invalid_pagination(self):
+        token = self.create_token()
+
+        for query in ["limit=0", "limit=foo", "after_id=foo", "since=foo"]:
+            with self.subTest(query=query):
+                resp = self.client.get(
+                    self.get_get_flow_session_api_url() + "&" + query,
+                    HTTP_AUTHORIZATION="Token %i_%s" % (
+                        token.id, self.default_token_hash_str))
+                self.assertEqual(resp.status_code, 400)
+
     def test_fail_flow_id_not_supplied(self):
         self.start_flow(self.flow_id)
         token = self.create_token()
@@ -67,6 +102,52 @@ class GetFlowSessionsTest(APITestMixin, TestCase):
         self.assertEqual(resp.status_code, 403)
 
 
+class GetFlowSessionsQsetTest(TestCase):
+    # test get_flow_sessions_qset and flow_session_to_json
+
+    def test_last_activity_and_query_count(self):
+        from datetime import timedelta
+
+        from django.utils.timezone import now
+
+        from course.api import flow_session_to_json, get_flow_sessions_qset
+
+        course = factories.CourseFactory()
+        sessions = [
+            factories.FlowSessionFactory(
+                participation=factories.ParticipationFactory(course=course))
+            for _i in range(3)]
+
+        visit_time = now() + timedelta(hours=1)
+        page_data = factories.FlowPageDataFactory(flow_session=sessions[1])
+        factories.FlowPageVisitFactory(
+            page_data=page_data, answer={"answer": "x"},
+            visit_time=visit_time)
+        factories.FlowPageVisitFactory(
+            page_data=page_data, answer={"answer": "y"},
+            visit_time=visit_time + timedelta(hours=1),
+            is_synthetic=True)
+        factories.FlowPageVisitFactory(
+            page_data=page_data, answer=None,
+            visit_time=visit_time + timedelta(hours=2))
+
+        with self.assertNumQueries(1):
+            result = [
+                flow_session_to_json(sess)
+                for sess in get_flow_sessions_qset(
+                    course, sessions[0].flow_id)]
+
+        self.assertEqual([r["id"] for r in result],
+                         sorted(sess.id for sess in sessions))
+        for sess, r in zip(sessions, result, strict=True):
+            self.assertEqual(r, flow_session_to_json(sess))
+            self.assertEqual(r["participation_username"],
+                             sess.participation.user.username)
+
+        self.assertEqual(result[1]["last_activity_time"], visit_time.isoformat())
+        self.assertIsNone(result[0]["last_activity_time"])
+
+
 class GetFlowSessionContentTest(
         SingleCourseQuizPageTestMixin, APITestMixin, TestCase):
     # test get_flow_session_content
@@ -140,4 +221,87 @@ class GetFlowSessionContentTest(
         self.assertEqual(resp.status_code, 403)
 
 
+class GetFlowSessionsContentTest(
+        SingleCourseQuizPageTestMixin, APITestMixin, TestCase):
+    # test get_flow_sessions_content
+
+    skip_code_question = False
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.instructor_participation.user)
+
+    def get_get_flow_sessions_content_url(self, query):
+        kwargs = {"course_identifier": self.get_default_course_identifier()}
+        return (reverse("relate-course_get_flow_sessions_content", kwargs=kwargs)
+                + "?" + query)
+
+    def get_content(self, token, query):
+        import json
+
+        resp = self.client.get(
+            self.get_get_flow_sessions_content_url(query),
+            HTTP_AUTHORIZATION="Token %i_%s" % (
+                token.id, self.default_token_hash_str))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+
+        return [json.loads(line)
+                for line in resp.getvalue().decode().splitlines()]
+
+    def test_success_matches_single_session_content(self):
+        self.start_flow(self.flow_id)
+        self.submit_page_answer_by_page_id_and_test("age_group")
+        self.submit_page_answer_by_page_id_and_test("half")
+        self.end_flow()
+        self.start_flow(self.flow_id)
+        token = self.create_token()
+
+        results = self.get_content(token, f"flow_id={self.flow_id}")
+        self.assertEqual(len(results), 2)
+
+        for result in results:
+            resp = self.client.get(
+                self.get_get_flow_session_content_url(
+                    flow_session_id=result["session"]["id"]),
+                HTTP_AUTHORIZATION="Token %i_%s" % (
+                    token.id, self.default_token_hash_str))
+            self.assertEqual(resp.status_code, 200)
+
+            single_result = resp.json()
+            # not annotated in the single-session version, but identical
+            self.assertEqual(result["pages"], single_result["pages"])
+            self.assertEqual(result["session"], single_result["session"])
+
+        session_id = results[1]["session"]["id"]
+        results = self.get_content(
+            token, f"flow_id={self.flow_id}&flow_session_ids={session_id}")
+        self.assertEqual([result["session"]["id"] for result in results],
+                         [session_id])
+
+        results = self.get_content(
+            token,
+            f"flow_id={self.flow_id}&flow_session_ids={session_id}&limit=1")
+        self.assertEqual([result["session"]["id"] for result in results],
+                         [session_id])
+
+    def test_fail_invalid_session_ids(self):
+        token = self.create_token()
+
+        resp = self.client.get(
+            self.get_get_flow_sessions_content_url(
+                f"flow_id={self.flow_id}&flow_session_ids=1,foo"),
+            HTTP_AUTHORIZATION="Token %i_%s" % (
+                token.id, self.default_token_hash_str))
+        self.assertEqual(resp.status_code, 400)
+
+    def test_fail_no_permission(self):
+        token = self.create_token(participation=self.student_participation)
+
+        resp = self.client.get(
+            self.get_get_flow_sessions_content_url(f"flow_id={self.flow_id}"),
+            HTTP_AUTHORIZATION="Token %i_%s" % (
+                token.id, self.default_token_hash_str))
+        self.assertEqual(resp.status_code, 403)
+
 # vim: foldmethod=marker
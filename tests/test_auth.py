@@ -2438,6 +2438,80 @@ class APIBearerTokenBackendTest(APITestMixin, TestCase):
             backend.get_user(10000))
 
 
+class FindMatchingTokenCacheTest(TestCase):
+    # test find_matching_token and APIBearerTokenBackend with the
+    # verification cache
+
+    token_hash_str = "my0token0string"
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.hashers import make_password
+        from django.core import cache
+        cache.caches["default"].clear()
+
+        self.token = factories.AuthenticationTokenFactory()
+        self.token.token_hash = make_password(self.token_hash_str)
+        self.token.save()
+        self.course_identifier = self.token.participation.course.identifier
+
+    def find(self, token_hash_str=None, now_datetime=None):
+        from course.auth import find_matching_token
+        return find_matching_token(
+            self.course_identifier, self.token.id,
+            token_hash_str or self.token_hash_str,
+            now_datetime or now())
+
+    def test_password_checked_once(self):
+        with mock.patch("django.contrib.auth.hashers.check_password",
+                        wraps=check_password) as mock_check_password:
+            self.assertEqual(self.find(), self.token)
+            self.assertEqual(self.find(), self.token)
+            self.assertEqual(mock_check_password.call_count, 1)
+
+            self.assertIsNone(self.find("wrong0secret"))
+            self.assertIsNone(self.find("wrong0secret"))
+            self.assertEqual(mock_check_password.call_count, 3)
+
+    @override_settings(RELATE_API_TOKEN_VERIFICATION_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        with mock.patch("django.contrib.auth.hashers.check_password",
+                        wraps=check_password) as mock_check_password:
+            self.assertEqual(self.find(), self.token)
+            self.assertEqual(self.find(), self.token)
+            self.assertEqual(mock_check_password.call_count, 2)
+
+    def test_revoked_after_verification(self):
+        self.assertEqual(self.find(), self.token)
+
+        AuthenticationToken.objects.filter(id=self.token.id).update(
+            revocation_time=now())
+        self.assertIsNone(self.find())
+
+    def test_expired_after_verification(self):
+        AuthenticationToken.objects.filter(id=self.token.id).update(
+            valid_until=now() + timedelta(hours=1))
+        self.assertEqual(self.find(), self.token)
+        self.assertIsNone(self.find(now_datetime=now() + timedelta(hours=2)))
+
+    def test_last_use_time_coalesced(self):
+        backend = APIBearerTokenBackend()
+        start = now()
+
+        def authenticate(now_datetime):
+            backend.authenticate(
+                None, self.course_identifier, self.token.id,
+                self.token_hash_str, now_datetime)
+            self.token.refresh_from_db()
+            return self.token.last_use_time
+
+        self.assertEqual(authenticate(start), start)
+        self.assertEqual(authenticate(start + timedelta(seconds=10)), start)
+        self.assertEqual(
+            authenticate(start + timedelta(minutes=2)),
+            start + timedelta(minutes=2))
+
+
 class APIContextTest(APITestMixin, TestCase):
     # test APIContext
 
@@ -36,7 +36,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.test import Client, RequestFactory, TestCase, override_settings
 from dulwich.objects import Tree
 
-from course import content
+from course import content, validation
 from course.datespec import InvalidDatespec, parse_date_spec
 from course.repo import SubdirRepoWrapper, get_repo_blob, get_repo_tree
 from tests import factories
@@ -322,6 +322,92 @@ class GetRepoBlobTest(SingleCourseTestMixin, TestCase):
             self.assertIn(expected_error_msg, str(cm.exception))
 
 
+class ProcessLocalLRUCacheTest(unittest.TestCase):
+    # test content.ProcessLocalLRUCache
+    def test_eviction_order(self):
+        lru = content.ProcessLocalLRUCache(2)
+        lru.put("a", 1)
+        lru.put("b", 2)
+        self.assertEqual(lru.get("a"), 1)
+
+        # "b" is now the least recently used
+        lru.put("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(lru.get("c"), 3)
+
+        self.assertEqual(lru.get_stats(),
+                         {"size": 2, "max_size": 2, "hits": 3, "misses": 1})
+
+        lru.resize(1)
+        self.assertEqual(len(lru), 1)
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(lru.get("c"), 3)
+
+        lru.clear()
+        self.assertEqual(len(lru), 0)
+
+
+@override_settings(RELATE_MODEL_CACHE_SIZE=8)
+class GetModelFromRepoProcessCacheTest(TestCase):
+    # test the process-local tier of content.get_model_from_repo
+    def setUp(self):
+        super().setUp()
+        from pathlib import Path
+
+        from pydantic import TypeAdapter
+
+        from course.repo import FileSystemFakeRepo
+        from course.validation import ValidationContext
+
+        self.repo = FileSystemFakeRepo(Path("/nonexistent"))
+        self.vctx = ValidationContext(self.repo, b"abcdef")
+        self.ta = TypeAdapter(dict[str, int])
+
+        from django.core.cache import cache
+        cache.clear()
+        content.get_model_cache().clear()
+        self.addCleanup(content.get_model_cache().clear)
+
+    def get_model(self, commit_sha=b"abcdef"):
+        return content.get_model_from_repo(
+            self.vctx, self.ta, self.repo, "flows/foo.yml", commit_sha)
+
+    def test_shared_cache_not_consulted_on_hit(self):
+        stats_before = content.get_model_cache().get_stats()
+
+        with mock.patch("course.content.get_yaml_from_repo") as mock_get_yaml:
+            mock_get_yaml.return_value = {"a": 1}
+            first = self.get_model()
+
+            with mock.patch("django.core.cache.caches") as mock_caches:
+                self.assertIs(self.get_model(), first)
+                mock_caches.__getitem__.assert_not_called()
+
+            self.assertEqual(mock_get_yaml.call_count, 1)
+
+            # a different commit is a different entry
+            mock_get_yaml.return_value = {"a": 2}
+            self.assertEqual(self.get_model(b"123456"), {"a": 2})
+
+        stats = content.get_model_cache().get_stats()
+        self.assertEqual(stats["hits"] - stats_before["hits"], 1)
+        self.assertEqual(stats["misses"] - stats_before["misses"], 2)
+
+    def test_resized_with_setting(self):
+        self.assertEqual(content.get_model_cache().max_size, 8)
+        with override_settings(RELATE_MODEL_CACHE_SIZE=4):
+            self.assertEqual(content.get_model_cache().max_size, 4)
+
+    def test_disabled(self):
+        with override_settings(RELATE_MODEL_CACHE_SIZE=0):
+            self.assertIsNone(content.get_model_cache())
+
+            with mock.patch("course.content.get_yaml_from_repo") as mock_get_yaml:
+                mock_get_yaml.return_value = {"a": 1}
+                self.assertEqual(self.get_model(b"fedcba"), {"a": 1})
+
+
 class GetYamlFromRepoTest(SingleCourseTestMixin, TestCase):
     # test content.get_yaml_from_repo
     def setUp(self):
@@ -691,6 +777,269 @@ class ParseDateSpecTest(SingleCourseTestMixin, TestCase):
         self.assertEqual(self.mock_add_warning.call_count, 0)
 
 
+@override_settings(RELATE_EVENT_INDEX_ENABLED=True)
+class EventIndexTest(SingleCourseTestMixin, TestCase):
+    # test the event index used by parse_date_spec
+
+    def setUp(self):
+        super().setUp()
+        from django.core import cache
+        cache.caches["default"].clear()
+
+        from relate.utils import localize_datetime
+        self.time1 = localize_datetime(datetime.datetime(2019, 1, 1))
+        self.time2 = localize_datetime(datetime.datetime(2019, 2, 1))
+        self.event = factories.EventFactory(
+            course=self.course, kind="homework_due", ordinal=1,
+            time=self.time1)
+        factories.EventFactory(
+            course=self.course, kind="homework_due", ordinal=2,
+            time=self.time2,
+            end_time=self.time2 + datetime.timedelta(hours=1))
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                parse_date_spec(self.course, "homework_due 1"), self.time1)
+            self.assertEqual(
+                parse_date_spec(self.course, "end:homework_due 2"),
+                self.time2 + datetime.timedelta(hours=1))
+            self.assertEqual(
+                parse_date_spec(self.course, "homework_due 2 + 1 day"),
+                self.time2 + datetime.timedelta(days=1))
+
+        with self.assertNumQueries(0):
+            parse_date_spec(self.course, "homework_due 1")
+
+    def test_invalidated(self):
+        self.assertEqual(
+            parse_date_spec(self.course, "homework_due 1"), self.time1)
+
+        self.event.time = self.time2
+        self.event.save()
+        self.assertEqual(
+            parse_date_spec(self.course, "homework_due 1"), self.time2)
+
+        factories.EventFactory(
+            course=self.course, kind="exam", ordinal=None, time=self.time1)
+        self.assertEqual(parse_date_spec(self.course, "exam"), self.time1)
+
+        vctx = mock.MagicMock()
+        self.event.delete()
+        with mock.patch("course.datespec.now") as mock_now:
+            self.assertEqual(
+                parse_date_spec(self.course, "homework_due 1", vctx),
+                mock_now.return_value)
+        self.assertEqual(vctx.add_warning.call_count, 1)
+
+
+@override_settings(RELATE_VALIDATION_RESULT_CACHE_TIMEOUT=600)
+class IncrementalValidationTest(SingleCourseTestMixin, TestCase):
+    # test reuse of recorded validation results by validate_course_content
+
+    def setUp(self):
+        super().setUp()
+        from django.core import cache
+        cache.caches["default"].clear()
+
+    def validate(self):
+        from course.validation import validate_course_content
+
+        with content.get_course_repo(self.course) as repo:
+            with mock.patch(
+                    "course.content.get_model_from_repo",
+                    wraps=content.get_model_from_repo) as mock_get_model:
+                warnings = validate_course_content(
+                    repo, self.course.course_file, self.course.events_file,
+                    self.course.active_git_commit_sha.encode(),
+                    course=self.course)
+
+        validated_paths = {call.args[3] for call in mock_get_model.call_args_list}
+        return warnings, validated_paths
+
+    def test_results_reused(self):
+        warnings, validated_paths = self.validate()
+        self.assertIn(self.course.course_file, validated_paths)
+        self.assertTrue(any(
+            path.startswith("flows/") for path in validated_paths))
+
+        # only the events file is validated again
+        warnings_again, validated_paths = self.validate()
+        self.assertEqual(validated_paths, {self.course.events_file})
+        self.assertEqual(
+            [(w.location, str(w.text)) for w in warnings_again],
+            [(w.location, str(w.text)) for w in warnings])
+
+    def test_invalidated_by_events(self):
+        self.validate()
+
+        factories.EventFactory(course=self.course, kind="some_event")
+        _warnings, validated_paths = self.validate()
+        self.assertTrue(any(
+            path.startswith("flows/") for path in validated_paths))
+
+    @override_settings(RELATE_VALIDATION_RESULT_CACHE_TIMEOUT=None)
+    def test_disabled(self):
+        self.validate()
+
+        _warnings, validated_paths = self.validate()
+        self.assertTrue(any(
+            path.startswith("flows/") for path in validated_paths))
+
+
+class ParallelValidationTest(SingleCourseTestMixin, TestCase):
+    # test validate_course_content with processes > 1
+
+    def validate(self, processes):
+        from concurrent.futures import Executor, Future
+
+        from course.validation import validate_course_content
+
+        class SynchronousExecutor(Executor):
+            def submit(self, fn, /, *args, **kwargs):
+                future = Future()
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as e:
+                    future.set_exception(e)
+                return future
+
+        with content.get_course_repo(self.course) as repo:
+            with mock.patch(
+                    "course.validation._make_validation_executor",
+                    return_value=SynchronousExecutor()) as mock_make_executor:
+                with mock.patch(
+                        "course.validation._validate_flow_file_in_worker",
+                        wraps=validation._validate_flow_file_in_worker
+                        ) as mock_validate_in_worker:
+                    warnings = validate_course_content(
+                        repo, self.course.course_file, self.course.events_file,
+                        self.course.active_git_commit_sha.encode(),
+                        course=self.course, processes=processes)
+
+        return (
+                [(w.location, str(w.text)) for w in warnings],
+                mock_make_executor.call_count,
+                mock_validate_in_worker.call_count)
+
+    def test_same_as_serial(self):
+        warnings, nexecutors, nworker_calls = self.validate(processes=1)
+        self.assertEqual(nexecutors, 0)
+        self.assertEqual(nworker_calls, 0)
+
+        parallel_warnings, nexecutors, nworker_calls = self.validate(processes=4)
+        self.assertEqual(nexecutors, 1)
+        self.assertGreater(nworker_calls, 1)
+        self.assertEqual(parallel_warnings, warnings)
+
+    def test_first_error_raised(self):
+        from course.validation import ValidationError, validate_flow_file
+
+        with content.get_course_repo(self.course) as repo:
+            flow_locations = [
+                    f"flows/{entry.path.decode()}"
+                    for entry in get_repo_tree(
+                        repo, "flows",
+                        self.course.active_git_commit_sha.encode()).items()
+                    if entry.path.endswith(b".yml")]
+
+        def fail_on_some_flows(vctx, location):
+            if location in flow_locations[1:]:
+                raise ValidationError(location)
+            return validate_flow_file(vctx, location)
+
+        with mock.patch("course.validation.validate_flow_file",
+                        side_effect=fail_on_some_flows):
+            with self.assertRaises(ValidationError) as cm:
+                self.validate(processes=4)
+
+        self.assertEqual(str(cm.exception), flow_locations[1])
+
+
+class ProcessPoolValidationTest(unittest.TestCase):
+    # test validate_course_content with processes > 1 in spawned worker
+    # processes, which reopen the repository and set up Django themselves
+
+    flow_yaml = """
+title: "Flow %s"
+description: |
+    A flow.
+pages:
+-   type: Page
+    id: intro
+    content: |
+        # Introduction
+"""
+
+    def make_repo(self, flows):
+        import tempfile
+        from pathlib import Path
+
+        from dulwich import porcelain
+
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        root = Path(tmpdir.name)
+
+        (root / "course.yml").write_text(
+                "chunks:\n"
+                "-   title: Welcome\n"
+                "    id: welcome\n"
+                "    content: |\n"
+                "        # Welcome\n")
+        (root / "flows").mkdir()
+        for flow_id, flow_yaml in flows.items():
+            (root / "flows" / f"{flow_id}.yml").write_text(flow_yaml)
+
+        with porcelain.init(tmpdir.name) as repo:
+            porcelain.add(repo, paths=[str(p) for p in root.rglob("*.yml")])
+            commit_sha = porcelain.commit(
+                    repo, message=b"course content",
+                    author=b"Author <author@example.com>",
+                    committer=b"Author <author@example.com>")
+
+        return tmpdir.name, commit_sha
+
+    def validate(self, repo_path, commit_sha, processes):
+        from dulwich.repo import Repo
+
+        from course.validation import validate_course_content
+
+        with Repo(repo_path) as repo:
+            warnings = validate_course_content(
+                    repo, "course.yml", "events.yml", commit_sha,
+                    course=None, processes=processes)
+
+        return [(w.location, str(w.text)) for w in warnings]
+
+    def test_same_as_serial(self):
+        repo_path, commit_sha = self.make_repo({
+            f"flow-{i}": self.flow_yaml % i for i in range(3)})
+
+        warnings = self.validate(repo_path, commit_sha, processes=1)
+        self.assertEqual(
+                self.validate(repo_path, commit_sha, processes=2), warnings)
+
+    def test_error_in_worker_raised(self):
+        from course.validation import ValidationError
+
+        repo_path, commit_sha = self.make_repo({
+            "flow-0": self.flow_yaml % 0,
+            "flow-1": "title: Broken flow\n"})
+
+        with self.assertRaises(ValidationError) as cm:
+            self.validate(repo_path, commit_sha, processes=2)
+
+        self.assertIn("flows/flow-1.yml", str(cm.exception))
+
+    def test_settings_not_from_configure(self):
+        # workers must read the settings module, like the test process
+        self.assertFalse(validation._settings_are_from_configure())
+
+        with override_settings(RELATE_VALIDATION_PROCESSES=2):
+            self.assertFalse(validation._settings_are_from_configure())
+
+
 class GetCourseDescTest(SingleCourseTestMixin, HackRepoMixin, TestCase):
     # test content.get_course_desc and content.get_processed_page_chunks
 
@@ -152,6 +152,36 @@ class AdjustFlowSessionPageDataTest(
                 models.FlowPageData.objects.get(page_id=page_id).page_ordinal)
             # }}}
 
+    def test_unchanged_commit_skipped(self):
+        resp = self.client.get(self.get_page_url_by_ordinal(0))
+        self.assertEqual(resp.status_code, 200)
+
+        flow_session = models.FlowSession.objects.get(
+            participation=self.student_participation)
+
+        with mock.patch("course.content.get_flow_desc") as mock_get_flow_desc:
+            flow.adjust_flow_session_page_data(
+                mock.MagicMock(), flow_session, respect_preview=False)
+            self.assertEqual(mock_get_flow_desc.call_count, 0)
+
+    def test_adjusted_in_bulk(self):
+        resp = self.client.get(self.get_page_url_by_ordinal(0))
+        self.assertEqual(resp.status_code, 200)
+
+        self.course.active_git_commit_sha = "my_fake_commit_sha_2"
+        self.course.save()
+
+        with mock.patch("course.models.FlowPageData.save") as mock_fpd_save:
+            resp = self.client.get(self.get_page_url_by_ordinal(0))
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(mock_fpd_save.call_count, 0)
+
+        self.assertTrue(
+            {"half1_id_renamed", "half_again2"}
+            < set(models.FlowPageData.objects.values_list("page_id", flat=True)))
+        self.assertIsNone(
+            models.FlowPageData.objects.get(page_id="half1").page_ordinal)
+
     # disabled by AK 2020-05-03: why is it valid to set a flow page's ordinal
     # to None while it is in use?
     def no_test_remove_page_with_non_ordinal(self):
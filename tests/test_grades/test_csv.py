@@ -29,7 +29,7 @@ import sys
 import unittest
 from io import StringIO
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from course import constants, grades, models
 from course.constants import GradeStateChangeType as GSChangeType
@@ -69,7 +69,7 @@ class ExportGradebook(GradesTestMixin, TestCase):
         self.student_gc.refresh_from_db()
 
     def assertResponseCsvResultEqual(self, resp, expected_result):  # noqa
-        file_contents = StringIO(resp.content.decode())
+        file_contents = StringIO(resp.getvalue().decode())
         spamreader = csv.reader(file_contents)
         result = list(spamreader)
         self.assertEqual(result, expected_result)
@@ -94,6 +94,33 @@ class ExportGradebook(GradesTestMixin, TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertResponseHasCsv(resp)
 
+    def test_view_export_gradebook_csv_content(self):
+        resp = self.get_export_gradebook_csv()
+        self.assertTrue(resp.streaming)
+
+        rows = list(csv.reader(StringIO(resp.getvalue().decode())))
+        self.assertEqual(
+            rows[0], ["user_name", "last_name", "first_name", self.gopp.identifier])
+
+        rows_by_username = {row[0]: row for row in rows[1:]}
+        self.assertEqual(len(rows_by_username), len(rows) - 1)
+        self.assertEqual(
+            set(rows_by_username),
+            set(models.Participation.objects.filter(
+                course=self.course,
+                status=constants.ParticipationStatus.active)
+                .values_list("user__username", flat=True)))
+
+        student = self.student_participation.user
+        self.assertEqual(
+            rows_by_username[student.username],
+            [student.username, student.last_name, student.first_name, "86.667"])
+        self.assertEqual(
+            rows_by_username[self.instructor_participation.user.username][3],
+            "90.000")
+        self.assertEqual(
+            rows_by_username[self.ta_participation.user.username][3], "NONE")
+
 
 class FindParticipantFromIdTest(CoursesTestMixinBase, TestCase):
     # test grades.find_participant_from_id
@@ -589,10 +616,43 @@ class ImportGradesTest(GradesTestMixin, TestCase):
             gchanges = models.GradeChange.objects.all()
             self.assertEqual(gchanges.count(), 1)
 
+    def test_import_in_background(self):
+        from django.core.files.storage import InMemoryStorage
+        storage = InMemoryStorage()
+
+        with override_settings(
+                RELATE_GRADE_IMPORT_BACKGROUND_MIN_BYTES=0,
+                RELATE_BULK_STORAGE=storage,
+                task_always_eager=True), \
+                mock.patch("celery.app.task.Task.update_state"), \
+                open(os.path.join(CSV_PATH, "test_import_csv.csv"),
+                    "rb") as csv_file:
+            resp = self.post_import_grades(csv_file)
+
+        self.assertEqual(resp.status_code, 302)
+        self.assertIn("monitor-task", resp.url)
+
+        gchange, = models.GradeChange.objects.all()
+        self.assertEqual(float(gchange.points), 86.66)
+
+        # the uploaded file is removed once imported
+        _dirs, files = storage.listdir(
+                f"grade-imports/{self.course.identifier}")
+        self.assertEqual(files, [])
+
+    def test_preview_not_in_background(self):
+        with override_settings(RELATE_GRADE_IMPORT_BACKGROUND_MIN_BYTES=0), \
+                open(os.path.join(CSV_PATH, "test_import_csv.csv"),
+                    "rb") as csv_file:
+            resp = self.post_import_grades(csv_file, post_type="preview")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "This is the feedback for test_student")
+
     def test_unexpected_error_for_csv_to_grade_changes(self):
         with mock.patch(
-                "course.grades.csv_to_grade_changes") as mock_csv_to_grade_changes:
-            mock_csv_to_grade_changes.side_effect = RuntimeError("my import error")
+                "course.grades.iter_csv_grade_changes") as mock_iter_grade_changes:
+            mock_iter_grade_changes.side_effect = RuntimeError("my import error")
             with open(
                     os.path.join(CSV_PATH, "test_import_csv.csv"), "rb") as csv_file:
                 self.post_import_grades(csv_file)
@@ -29,11 +29,11 @@ import unittest
 from dataclasses import dataclass
 
 import pytest
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.utils.timezone import now, timedelta
 
-from course import constants, grades, models
+from course import constants, grades, models, tasks
 from course.constants import (
     GradeAggregationStrategy as GAStrategy,
     GradeStateChangeType as GSChangeType,
@@ -1870,7 +1870,7 @@ class DownloadAllSubmissionsTest(SingleCourseQuizPageTestMixin,
         return f"{group_id}/{self.page_id}"
 
     def get_zip_file_buf_from_response(self, resp):
-        return io.BytesIO(resp.content)
+        return io.BytesIO(b"".join(resp.streaming_content))
 
     def assertDownloadedFileZippedExtensionCount(self, resp, extensions, counts):  # noqa
 
@@ -1880,7 +1880,7 @@ class DownloadAllSubmissionsTest(SingleCourseQuizPageTestMixin,
         prefix, _zip_file = resp["Content-Disposition"].split("=")
         self.assertEqual(prefix, "attachment; filename")
         self.assertEqual(resp.get("Content-Type"), "application/zip")
-        buf = io.BytesIO(resp.content)
+        buf = self.get_zip_file_buf_from_response(resp)
         import zipfile
         with zipfile.ZipFile(buf, "r") as zf:
             self.assertIsNone(zf.testzip())
@@ -1990,6 +1990,50 @@ class DownloadAllSubmissionsTest(SingleCourseQuizPageTestMixin,
                 self.assertDownloadedFileZippedExtensionCount(
                     resp, [".txt"], [1])
 
+    def test_download_in_background(self):
+        from django.core.files.storage import InMemoryStorage
+        storage = InMemoryStorage()
+
+        with override_settings(
+                RELATE_DOWNLOAD_SUBMISSIONS_BACKGROUND_MIN_COUNT=1,
+                RELATE_BULK_STORAGE=storage,
+                task_always_eager=True), \
+                mock.patch("celery.app.task.Task.update_state"), \
+                mock.patch("course.tasks.zip_submissions.delay",
+                    wraps=tasks.zip_submissions.delay) as mock_delay:
+            with self.temporarily_switch_to_user(
+                    self.instructor_participation.user):
+                resp = self.post_download_all_submissions_by_group_page_id(
+                    group_page_id=self.group_page_id, flow_id=self.flow_id,
+                    which_attempt="all")
+
+            self.assertEqual(resp.status_code, 302)
+            self.assertIn("monitor-task", resp.url)
+
+            kwargs = mock_delay.call_args.kwargs
+            download_url = reverse("relate-download_submissions_zip",
+                    args=(self.course.identifier, kwargs["zip_id"],
+                        kwargs["filename"]))
+
+            with self.temporarily_switch_to_user(
+                    self.instructor_participation.user):
+                resp = self.client.get(download_url)
+
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.get("Content-Type"), "application/zip")
+
+            import zipfile
+            with zipfile.ZipFile(
+                    self.get_zip_file_buf_from_response(resp), "r") as zf:
+                self.assertIsNone(zf.testzip())
+                self.assertEqual(
+                        len([f for f in zf.filelist
+                            if f.filename.endswith(".txt")]), 2)
+
+            with self.temporarily_switch_to_user(self.student_participation.user):
+                resp = self.client.get(download_url)
+            self.assertEqual(resp.status_code, 403)
+
 
 class PointsEqualTest(unittest.TestCase):
     # grades.points_equal
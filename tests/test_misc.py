@@ -26,6 +26,7 @@ THE SOFTWARE.
 import datetime
 import re
 import unittest
+from ipaddress import ip_address, ip_network
 
 from django.core.management import CommandError
 from django.test import RequestFactory, TestCase
@@ -38,7 +39,15 @@ from course.models import Course
 from course.versioning import CourseCreationForm
 from course.views import EditCourseForm
 from manage import get_local_test_settings_file
+from relate.instrumentation import (
+    OTHER_VIEWS,
+    RequestMetrics,
+    clear_view_metrics,
+    record_view_metrics,
+    render_view_metrics,
+)
 from relate.utils import (
+    IPNetworkMatcher,
     format_datetime_local,
     get_outbound_mail_connection,
     is_maintenance_mode,
@@ -470,6 +479,156 @@ class MaintenanceModeTest(SingleCourseTestMixin, TestCase):
             self.assertTemplateNotUsed("maintenance.html")
 
 
+class IPNetworkMatcherTest(unittest.TestCase):
+    """test relate.utils.IPNetworkMatcher"""
+    networks = [
+        ("10.0.0.0/8", "a"),
+        ("10.1.0.0/16", "b"),
+        ("10.1.2.0/24", "a"),
+        (ip_network("10.1.2.3/32"), "c"),
+        ("192.168.1.0/24", "d"),
+        ("2001:db8::/32", "e"),
+    ]
+
+    def test_match(self):
+        matcher = IPNetworkMatcher(self.networks)
+
+        for addr in [
+                "9.255.255.255", "10.0.0.0", "10.1.0.0", "10.1.2.3", "10.1.2.4",
+                "10.1.3.0", "10.255.255.255", "11.0.0.0", "192.168.1.255",
+                "192.168.2.0", "0.0.0.0", "255.255.255.255",
+                "2001:db8::1", "2001:db9::", "::1"]:
+            address = ip_address(addr)
+            self.assertEqual(
+                matcher.match(address),
+                frozenset(
+                    label for network, label in self.networks
+                    if address in ip_network(network)),
+                addr)
+
+        self.assertIn(ip_address("10.1.2.3"), matcher)
+        self.assertNotIn(ip_address("11.0.0.0"), matcher)
+
+    def test_empty(self):
+        matcher = IPNetworkMatcher([])
+        self.assertEqual(matcher.match(ip_address("10.0.0.1")), frozenset())
+        self.assertNotIn(ip_address("::1"), matcher)
+
+
+@override_settings(RELATE_INSTRUMENTATION_ENABLED=True)
+class InstrumentationTest(SingleCourseTestMixin, TestCase):
+    """test relate.instrumentation"""
+    def setUp(self):
+        super().setUp()
+        clear_view_metrics()
+        self.addCleanup(clear_view_metrics)
+
+    def test_metrics_recorded(self):
+        self.client.force_login(self.student_participation.user)
+        resp = self.client.get(self.course_page_url)
+        self.assertEqual(resp.status_code, 200)
+
+        metrics = render_view_metrics()
+        self.assertIn(
+            'relate_view_requests_total{view="course.views.course_page"} 1',
+            metrics)
+        match = re.search(
+            r'relate_view_db_queries_total\{view="course.views.course_page"\} '
+            r"(\d+)", metrics)
+        assert match is not None
+        self.assertGreater(int(match.group(1)), 0)
+        self.assertIn(
+            'relate_view_duration_seconds_bucket'
+            '{view="course.views.course_page",le="+Inf"} 1', metrics)
+
+    def test_metrics_view(self):
+        self.client.force_login(self.student_participation.user)
+        resp = self.client.get("/instrumentation/metrics/")
+        self.assertEqual(resp.status_code, 403)
+
+        self.client.force_login(self.superuser)
+        resp = self.client.get("/instrumentation/metrics/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b"relate_view_requests_total", resp.content)
+
+    @override_settings(RELATE_INSTRUMENTATION_MAX_VIEWS=1)
+    def test_views_bounded(self):
+        rm = RequestMetrics(query_count=3)
+        record_view_metrics("view_a", rm, 0.1)
+        record_view_metrics("view_b", rm, 0.1)
+        record_view_metrics("view_c", rm, 0.1)
+
+        metrics = render_view_metrics()
+        self.assertIn('relate_view_requests_total{view="view_a"} 1', metrics)
+        self.assertIn(
+            f'relate_view_requests_total{{view="{OTHER_VIEWS}"}} 2', metrics)
+        self.assertNotIn("view_b", metrics)
+
+
+class InstrumentationCacheCountingTest(unittest.TestCase):
+    """test relate.instrumentation._count_cache_gets"""
+    def test_counts_hits_and_misses(self):
+        from django.core.cache.backends.locmem import LocMemCache
+
+        from relate import instrumentation
+
+        cache = LocMemCache("relate-instrumentation-test", {})
+        instrumentation._count_cache_gets(cache)
+        instrumentation._count_cache_gets(cache)
+        self.assertIs(
+                type(cache), instrumentation._get_counting_cache_class(LocMemCache))
+
+        cache.set("a", 1)
+
+        # not counted outside of requests
+        self.assertEqual(cache.get("a"), 1)
+
+        metrics = RequestMetrics()
+        token = instrumentation._CURRENT_METRICS.set(metrics)
+        try:
+            self.assertEqual(cache.get("a"), 1)
+            self.assertIsNone(cache.get("b"))
+            self.assertEqual(cache.get("b", 5), 5)
+            self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1})
+        finally:
+            instrumentation._CURRENT_METRICS.reset(token)
+
+        self.assertEqual(metrics.cache_hits, 2)
+        self.assertEqual(metrics.cache_misses, 4)
+
+
+class InstrumentationRunpyPoolMetricsTest(unittest.TestCase):
+    """test relate.instrumentation.render_view_metrics for container pools"""
+    def test_pool_stats_published(self):
+        stats = {"inducer/relate-runcode-python-amd64": {
+            "size": 3, "hits": 5, "misses": 2, "evictions": 1,
+            "hit_wait_time": 0.25, "miss_wait_time": 4.5}}
+        with mock.patch(
+                "course.page.code.get_runpy_container_pool_stats",
+                return_value=stats):
+            metrics = render_view_metrics()
+
+        label = '{image="inducer/relate-runcode-python-amd64"}'
+        for line in [
+                f"relate_runpy_pool_size{label} 3",
+                f"relate_runpy_pool_hits_total{label} 5",
+                f"relate_runpy_pool_misses_total{label} 2",
+                f"relate_runpy_pool_evictions_total{label} 1",
+                f"relate_runpy_pool_hit_wait_seconds_total{label} 0.25",
+                f"relate_runpy_pool_miss_wait_seconds_total{label} 4.5",
+                ]:
+            self.assertIn(line, metrics.splitlines())
+
+    def test_no_pools(self):
+        with mock.patch(
+                "course.page.code.get_runpy_container_pool_stats",
+                return_value={}):
+            metrics = render_view_metrics()
+
+        self.assertIn("# TYPE relate_runpy_pool_hits_total counter", metrics)
+        self.assertNotIn("relate_runpy_pool_hits_total{", metrics)
+
+
 class RenderEmailTemplateTest(unittest.TestCase):
     """test relate.utils.render_email_template, for not covered"""
     def test_context_is_none(self):
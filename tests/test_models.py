@@ -402,6 +402,130 @@ class ParticipationTest(RelateModelTestMixin, unittest.TestCase):
                 "participation permissions is expected to be cached.")
 
 
+@override_settings(RELATE_PERMISSION_CACHE_TIMEOUT=600)
+class PermissionCacheTest(TestCase):
+    # test the shared cache of permissions and role identifiers
+
+    def setUp(self):
+        super().setUp()
+        from django.core import cache
+        cache.caches["default"].clear()
+
+        self.course = factories.CourseFactory()
+        self.participation = factories.ParticipationFactory(
+            course=self.course, roles=["student"])
+
+    def get_permissions(self, participation=None):
+        from course.enrollment import get_participation_permissions
+
+        # a fresh instance, to bypass the per-instance cache
+        if participation is None:
+            participation = models.Participation.objects.get(
+                id=self.participation.id)
+        return get_participation_permissions(self.course, participation)
+
+    def get_unenrolled_permissions(self):
+        from course.enrollment import get_participation_permissions
+        return get_participation_permissions(self.course, None)
+
+    def get_role_identifiers(self, participation=None):
+        from course.enrollment import get_participation_role_identifiers
+        return get_participation_role_identifiers(self.course, participation)
+
+    def test_cached_across_instances(self):
+        perms = self.get_permissions()
+        role_identifiers = self.get_role_identifiers(self.participation)
+        self.assertEqual(role_identifiers, {"student"})
+
+        participation = models.Participation.objects.get(id=self.participation.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_permissions(participation), perms)
+            self.assertEqual(
+                self.get_role_identifiers(participation), role_identifiers)
+
+    def test_individual_permission_invalidates(self):
+        self.assertNotIn((PPerm.view_gradebook, None), self.get_permissions())
+
+        pp = models.ParticipationPermission.objects.create(
+            participation=self.participation, permission=PPerm.view_gradebook)
+        self.assertIn((PPerm.view_gradebook, None), self.get_permissions())
+
+        pp.delete()
+        self.assertNotIn((PPerm.view_gradebook, None), self.get_permissions())
+
+    def test_role_permission_invalidates(self):
+        self.assertNotIn((PPerm.view_gradebook, None), self.get_permissions())
+        self.assertNotIn((PPerm.view_gradebook, None),
+                         self.get_unenrolled_permissions())
+
+        for role in self.participation.roles.all():
+            models.ParticipationRolePermission.objects.create(
+                role=role, permission=PPerm.view_gradebook)
+        self.assertIn((PPerm.view_gradebook, None), self.get_permissions())
+        self.assertNotIn((PPerm.view_gradebook, None),
+                         self.get_unenrolled_permissions())
+
+        unenrolled_role = models.ParticipationRole.objects.get(
+            course=self.course, is_default_for_unenrolled=True)
+        models.ParticipationRolePermission.objects.create(
+            role=unenrolled_role, permission=PPerm.view_gradebook)
+        self.assertIn((PPerm.view_gradebook, None), self.get_unenrolled_permissions())
+
+    def test_roles_change_invalidates(self):
+        self.assertEqual(
+            self.get_role_identifiers(self.participation), {"student"})
+        self.assertEqual(self.get_role_identifiers(None), {"unenrolled"})
+        self.assertNotIn((PPerm.view_gradebook, None), self.get_permissions())
+
+        ta_role = models.ParticipationRole.objects.get(
+            course=self.course, identifier="ta")
+        self.participation.roles.set([ta_role])
+        self.assertEqual(self.get_role_identifiers(self.participation), {"ta"})
+        self.assertIn((PPerm.view_gradebook, None), self.get_permissions())
+
+        ta_role.is_default_for_unenrolled = True
+        ta_role.save()
+        self.assertEqual(
+            self.get_role_identifiers(None), {"unenrolled", "ta"})
+
+    def test_other_course_unaffected(self):
+        other_course = factories.CourseFactory(identifier="other-course")
+        unenrolled_role = models.ParticipationRole.objects.get(
+            course=other_course, is_default_for_unenrolled=True)
+        models.ParticipationRolePermission.objects.create(
+            role=unenrolled_role, permission=PPerm.view_gradebook)
+
+        self.assertNotIn((PPerm.view_gradebook, None),
+                         self.get_unenrolled_permissions())
+
+
+@override_settings(RELATE_PERMISSION_CACHE_TIMEOUT=None)
+class UnenrolledPermissionsTest(TestCase):
+    # test course.enrollment.get_participation_permissions without participation
+
+    def test_only_own_course_roles(self):
+        from course.enrollment import get_participation_permissions
+
+        course1 = factories.CourseFactory()
+        course2 = factories.CourseFactory(identifier="other-course")
+
+        for course, permission in [
+                (course1, PPerm.view_gradebook),
+                (course2, PPerm.view_analytics)]:
+            unenrolled_role = models.ParticipationRole.objects.get(
+                course=course, is_default_for_unenrolled=True)
+            models.ParticipationRolePermission.objects.create(
+                role=unenrolled_role, permission=permission)
+
+        perms1 = get_participation_permissions(course1, None)
+        perms2 = get_participation_permissions(course2, None)
+
+        self.assertIn((PPerm.view_gradebook, None), perms1)
+        self.assertNotIn((PPerm.view_analytics, None), perms1)
+        self.assertIn((PPerm.view_analytics, None), perms2)
+        self.assertNotIn((PPerm.view_gradebook, None), perms2)
+
+
 class ParticipationPreapprovalTest(RelateModelTestMixin, unittest.TestCase):
     def test_unicode(self):
         paprv1 = factories.ParticipationPreapprovalFactory(
@@ -640,6 +764,79 @@ class GetFeedbackForGradeTest(RelateModelTestMixin, unittest.TestCase):
         self.assertIsNone(models.get_feedback_for_grade(None))
 
 
+class GetFeedbackForGradesTest(TestCase):
+    # test models.get_feedback_for_grades
+    def setUp(self):
+        super().setUp()
+        from django.core.files.storage import InMemoryStorage
+        self.storage = InMemoryStorage()
+        override = override_settings(RELATE_BULK_STORAGE=self.storage)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def make_grade(self, correctness, bulk_feedback=None):
+        page_data = factories.FlowPageDataFactory()
+        grade = factories.FlowPageVisitGradeFactory(
+            visit=factories.FlowPageVisitFactory(page_data=page_data),
+            correctness=correctness,
+            feedback={"correctness": correctness, "feedback": "Ok."})
+        if bulk_feedback is not None:
+            models.update_bulk_feedback(
+                page_data, grade, {"bulk_feedback": bulk_feedback})
+        return grade
+
+    def test_single_query(self):
+        # long enough to be kept in bulk storage
+        stored_bulk_feedback = "".join(str(i) for i in range(1000))
+
+        grades = [
+            self.make_grade(1, "short"),
+            None,
+            self.make_grade(0.5),
+            self.make_grade(0, stored_bulk_feedback),
+            ]
+
+        with mock.patch.object(
+                self.storage, "open", wraps=self.storage.open) as mock_open:
+            with self.assertNumQueries(1):
+                feedbacks = models.get_feedback_for_grades(grades)
+
+            self.assertEqual(mock_open.call_count, 0)
+
+            self.assertEqual(
+                [fb and fb.correctness for fb in feedbacks], [1, None, 0.5, 0])
+            self.assertEqual(feedbacks[0].bulk_feedback, "short")
+            self.assertIsNone(feedbacks[2].bulk_feedback)
+            self.assertEqual(mock_open.call_count, 0)
+
+            self.assertEqual(feedbacks[3].bulk_feedback, stored_bulk_feedback)
+            self.assertEqual(feedbacks[3].bulk_feedback, stored_bulk_feedback)
+            self.assertEqual(mock_open.call_count, 1)
+
+    def test_ignores_bulk_feedback_of_other_grade(self):
+        grade = self.make_grade(1, "first")
+        later_grade = factories.FlowPageVisitGradeFactory(
+            visit=factories.FlowPageVisitFactory(
+                page_data=grade.visit.page_data),
+            correctness=0,
+            feedback={"correctness": 0, "feedback": "Not ok."})
+
+        feedback, = models.get_feedback_for_grades([grade])
+        self.assertEqual(feedback.bulk_feedback, "first")
+
+        models.update_bulk_feedback(
+            grade.visit.page_data, later_grade, {"bulk_feedback": "later"})
+        feedback, later_feedback = models.get_feedback_for_grades(
+            [grade, later_grade])
+        self.assertIsNone(feedback.bulk_feedback)
+        self.assertEqual(later_feedback.bulk_feedback, "later")
+
+    def test_no_feedback(self):
+        grade = factories.FlowPageVisitGradeFactory(feedback=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(models.get_feedback_for_grades([grade]), [None])
+
+
 @pytest.mark.skip("FIXME needs to be rewritten for pydantic validation")
 class FlowRuleExceptionTest(RelateModelTestMixin, TestCase):
     def setUp(self):
@@ -836,6 +1033,111 @@ class GradingChangeTest(RelateModelTestMixin, unittest.TestCase):
         self.assertIn(expected_error_msg, str(cm.exception))
 
 
+class GradeStateTest(RelateModelTestMixin, unittest.TestCase):
+    # test models.GradeState and its maintenance
+    def setUp(self):
+        super().setUp()
+        override = override_settings(RELATE_USE_MATERIALIZED_GRADE_STATES=True)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.participation = factories.ParticipationFactory(course=self.course)
+        self.opportunity = factories.GradingOpportunityFactory(
+            course=self.course, identifier="gopp1",
+            aggregation_strategy=constants.GradeAggregationStrategy.max_grade)
+
+    def grade_change(self, **kwargs):
+        kwargs.setdefault("state", constants.GradeStateChangeType.graded)
+        return factories.GradeChangeFactory(
+            opportunity=self.opportunity, participation=self.participation,
+            grade_time=now() + timedelta(minutes=models.GradeChange.objects.count()),
+            **kwargs)
+
+    def get_grade_state(self):
+        return models.GradeState.objects.get(
+            participation=self.participation, opportunity=self.opportunity)
+
+    def assertStateMatchesHistory(self):  # noqa
+        replayed = models.GradeStateMachine().consume(
+            models.GradeChange.objects.filter(
+                participation=self.participation, opportunity=self.opportunity)
+            .order_by("grade_time"))
+        stored = self.get_grade_state().get_state_machine()
+
+        self.assertEqual(stored.state, replayed.state)
+        self.assertEqual(stored.percentage(), replayed.percentage())
+        self.assertEqual(stored.due_time, replayed.due_time)
+        self.assertEqual(stored.last_graded_time, replayed.last_graded_time)
+        self.assertEqual(stored.stringify_machine_readable_state(),
+                         replayed.stringify_machine_readable_state())
+
+    def test_incremental_update(self):
+        self.grade_change(points=3, attempt_id="a")
+        self.assertStateMatchesHistory()
+
+        gc = self.grade_change(points="8.33", attempt_id="b")
+        self.assertStateMatchesHistory()
+        self.assertEqual(self.get_grade_state().valid_percentages,
+                         ["30", "83.3"])
+
+        self.grade_change(state=constants.GradeStateChangeType.extension,
+                          due_time=now() + timedelta(days=2))
+        self.assertStateMatchesHistory()
+        self.assertTrue(self.get_grade_state().has_extension)
+
+        gc.delete()
+        self.assertStateMatchesHistory()
+
+        models.GradeChange.objects.all().delete()
+        self.assertFalse(models.GradeState.objects.exists())
+
+    def test_inconsistent_history(self):
+        self.grade_change(state=constants.GradeStateChangeType.exempt)
+        self.assertStateMatchesHistory()
+
+        # grades after 'exempt' are invalid
+        with self.assertLogs("course.models", "WARNING"):
+            self.grade_change(points=3)
+        self.assertFalse(models.GradeState.objects.exists())
+
+    def test_not_maintained_when_disabled(self):
+        with override_settings(RELATE_USE_MATERIALIZED_GRADE_STATES=False):
+            self.grade_change(points=3)
+        self.assertFalse(models.GradeState.objects.exists())
+
+    def test_rebuild_command(self):
+        from django.core.management import call_command
+
+        self.grade_change(points=3)
+        self.grade_change(points=5, attempt_id="b")
+        expected = self.get_grade_state().valid_percentages
+
+        models.GradeState.objects.all().delete()
+        call_command("rebuild_grade_states", self.course.identifier,
+                     stdout=mock.MagicMock())
+
+        self.assertEqual(self.get_grade_state().valid_percentages, expected)
+        self.assertStateMatchesHistory()
+
+    def test_grade_table_from_grade_states(self):
+        from django.test import override_settings
+
+        from course.grades import get_grade_table
+
+        self.grade_change(points=3)
+        self.grade_change(points=7, attempt_id="b")
+
+        _participations, _opps, replayed_table = get_grade_table(self.course)
+        with override_settings(RELATE_USE_MATERIALIZED_GRADE_STATES=True):
+            _participations, _opps, stored_table = get_grade_table(self.course)
+
+        self.assertEqual(
+            [[info.grade_state_machine.stringify_state() for info in row]
+             for row in stored_table],
+            [[info.grade_state_machine.stringify_state() for info in row]
+             for row in replayed_table])
+
+
 class InstantMessageTest(RelateModelTestMixin, unittest.TestCase):
     def test_unicode(self):
         user = factories.UserFactory()
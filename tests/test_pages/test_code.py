@@ -23,6 +23,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import os
+import unittest
 from socket import error as socket_error
 from typing import TYPE_CHECKING, cast
 
@@ -1025,4 +1027,463 @@ class CodeQuestionWithHumanTextFeedbackSpecialCase(
         self.assertIn(
             "The autograder assigned 0/0 points.", feedback.feedback)
 
+
+class RunpyContainerPoolTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        from course.page.code import RunpyContainer
+
+        self.ncreated = 0
+
+        def create_runpy_container(docker_cnx, image):
+            self.ncreated += 1
+            return RunpyContainer(mock.MagicMock(), "localhost", self.ncreated)
+
+        self.patches = {
+                name.split(".")[-1]: mock.patch(f"course.page.code.{name}")
+                for name in [
+                    "get_docker_client",
+                    "ping_runpy_container",
+                    "remove_runpy_container",
+                    "create_runpy_container",
+                    "RunpyContainerPool.refill_in_background",
+                    ]}
+        for name, patch in self.patches.items():
+            setattr(self, f"mock_{name}", patch.start())
+            self.addCleanup(patch.stop)
+
+        self.mock_create_runpy_container.side_effect = create_runpy_container
+
+    def make_pool(self, size=2, max_age=600):
+        from course.page.code import RunpyContainerPool
+        return RunpyContainerPool("some/image", size, max_age)
+
+    def test_refill_up_to_size(self):
+        pool = self.make_pool(size=3)
+        pool.refill()
+        self.assertEqual(len(pool), 3)
+        self.assertEqual(self.ncreated, 3)
+
+        # already full
+        pool.refill()
+        self.assertEqual(self.ncreated, 3)
+
+    def test_acquire_hit_and_miss(self):
+        pool = self.make_pool(size=1)
+        self.assertIsNone(pool.acquire())
+
+        pool.refill()
+        rc = pool.acquire()
+        self.assertIsNotNone(rc)
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(self.mock_refill_in_background.call_count, 2)
+
+        stats = pool.get_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+
+    def test_acquire_evicts_old_containers(self):
+        pool = self.make_pool(size=2, max_age=0)
+        pool.refill()
+
+        self.assertIsNone(pool.acquire())
+        self.assertEqual(pool.get_stats()["evictions"], 2)
+        self.assertEqual(self.mock_remove_runpy_container.call_count, 2)
+
+    def test_acquire_discards_unhealthy_container(self):
+        from course.page.code import ContainerStartupTimeout
+
+        pool = self.make_pool(size=1)
+        pool.refill()
+
+        self.mock_ping_runpy_container.side_effect = (
+                ContainerStartupTimeout("localhost"))
+        self.assertIsNone(pool.acquire())
+        self.assertEqual(pool.get_stats()["evictions"], 1)
+        self.mock_remove_runpy_container.assert_called_once()
+
+    def test_refill_skips_failed_containers(self):
+        from course.page.code import ContainerStartupTimeout
+
+        pool = self.make_pool(size=2)
+        self.mock_ping_runpy_container.side_effect = [
+                None, ContainerStartupTimeout("localhost")]
+        pool.refill()
+        self.assertEqual(len(pool), 1)
+        self.mock_remove_runpy_container.assert_called_once()
+
+        # the failed slot can be refilled later
+        self.mock_ping_runpy_container.side_effect = None
+        pool.refill()
+        self.assertEqual(len(pool), 2)
+
+    def test_evict(self):
+        from course.page.code import ContainerStartupTimeout
+
+        pool = self.make_pool(size=3)
+        pool.refill()
+
+        self.mock_ping_runpy_container.side_effect = [
+                None, ContainerStartupTimeout("localhost"), None]
+        pool.evict()
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(pool.get_stats()["evictions"], 1)
+
+        pool.max_age = 0
+        pool.evict()
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(self.mock_remove_runpy_container.call_count, 3)
+
+    def test_background_refill_and_close(self):
+        import time
+
+        self.patches["refill_in_background"].stop()
+
+        pool = self.make_pool(size=2)
+        pool.refill_in_background()
+        worker = pool._worker
+        assert worker is not None
+        pool.refill_in_background()
+        self.assertIs(pool._worker, worker)
+
+        deadline = time.monotonic() + 10
+        while len(pool) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(pool), 2)
+
+        pool.close()
+        worker.join(10)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(len(pool), 0)
+        self.assertEqual(self.mock_remove_runpy_container.call_count, 2)
+
+        # closed pools are not refilled
+        pool.refill()
+        self.assertEqual(self.ncreated, 2)
+
+    @override_settings(RELATE_DOCKER_RUNPY_POOL_SIZE=2)
+    def test_remove_pools(self):
+        from course.page.code import (
+            get_runpy_container_pool,
+            remove_runpy_container_pools,
+        )
+
+        pool = get_runpy_container_pool("some/image")
+        assert pool is not None
+        pool.refill()
+
+        remove_runpy_container_pools()
+        self.assertEqual(self.mock_remove_runpy_container.call_count, 2)
+        self.assertIsNot(get_runpy_container_pool("some/image"), pool)
+        remove_runpy_container_pools()
+
+    def test_pool_disabled_by_default(self):
+        from course.page.code import get_runpy_container_pool
+        self.assertIsNone(get_runpy_container_pool("some/image"))
+
+    @override_settings(RELATE_DOCKER_RUNPY_POOL_SIZE=2)
+    def test_request_run_uses_pool(self):
+        from course.page.code import (
+            RunpyContainer,
+            RunpyContainerPool,
+            get_runpy_container_pool,
+            remove_runpy_container_pools,
+            request_run,
+        )
+        from course.page.code_run_backend import RunRequest
+
+        self.addCleanup(remove_runpy_container_pools)
+
+        with mock.patch("course.page.code.SPAWN_CONTAINERS", True), \
+                mock.patch.object(RunpyContainerPool, "acquire") as mock_acquire, \
+                mock.patch("http.client.HTTPConnection") as mock_cnx:
+            rc = RunpyContainer(mock.MagicMock(), "localhost", 12345)
+            mock_acquire.return_value = rc
+            mock_cnx.return_value.getresponse.return_value.read.return_value = (
+                    b'{"result": "success"}')
+
+            result = request_run(RunRequest(user_code="a=1"), 1,
+                    image="some/pooled/image")
+
+        self.assertEqual(result.result, "success")
+        self.mock_create_runpy_container.assert_not_called()
+        self.mock_remove_runpy_container.assert_called_once_with(rc)
+        self.assertEqual(mock_cnx.call_args[0], ("localhost", 12345))
+
+        pool = get_runpy_container_pool("some/pooled/image")
+        assert pool is not None
+        self.assertGreaterEqual(pool.hit_wait_time, 0)
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "batch runs require os.fork")
+class RequestRunBatchTest(SubprocessRunpyContainerMixin, TestCase):
+    def test_batch(self):
+        from course.page.code import request_run_batch
+        from course.page.code_run_backend import RunRequest
+
+        setup_code = "import sys\nx = 5"
+        test_code = "feedback.set_points(1 if y == x + 1 else 0)"
+        run_reqs = [
+            RunRequest(user_code=user_code, setup_code=setup_code,
+                       test_code=test_code, names_for_user=["x"],
+                       names_from_user=["y"])
+            for user_code in [
+                "y = x + 1\nimport sys\nsys.leaked = True",
+                "import sys\nassert not hasattr(sys, 'leaked')\ny = x + 1",
+                "y = x",
+                "y = (",
+                ]]
+
+        responses = request_run_batch(run_reqs, 5)
+
+        self.assertEqual(
+                [resp.result for resp in responses],
+                ["success", "success", "success", "user_compile_error"])
+        self.assertEqual([resp.points for resp in responses[:3]], [1, 1, 0])
+        self.assertIn("Execution time", responses[0].feedback[-1])
+
+    def test_batch_timeout(self):
+        from course.page.code import request_run_batch
+        from course.page.code_run_backend import RunRequest
+
+        responses = request_run_batch([
+            RunRequest(user_code="while True: pass"),
+            RunRequest(user_code="print('hi')"),
+            ], 1)
+
+        self.assertEqual(responses[0].result, "timeout")
+        self.assertEqual(responses[1].result, "success")
+        self.assertEqual(responses[1].stdout, "hi\n")
+
+    def test_batch_isolation(self):
+        from course.page.code import request_run_batch
+        from course.page.code_run_backend import RunRequest
+
+        responses = request_run_batch([
+            RunRequest(user_code=(
+                "import os, subprocess\n"
+                "open('leftover', 'w').close()\n"
+                "print(subprocess.Popen(['sleep', '60']).pid)\n"
+                "print(os.getcwd())\n")),
+            RunRequest(user_code=(
+                "import gc, os\n"
+                "print(os.path.exists('leftover'))\n"
+                "print(os.getcwd())\n"
+                "print(sum(1 for obj in gc.get_objects()\n"
+                "          if type(obj).__name__ == 'RunRequest'))\n")),
+            ], 5)
+
+        self.assertEqual(
+                [resp.result for resp in responses], ["success", "success"])
+        sleep_pid, cwd = responses[0].stdout.split()
+        exists, other_cwd, nrequests = responses[1].stdout.split()
+
+        # only its own request is visible to each child
+        self.assertEqual((exists, nrequests), ("False", "1"))
+        self.assertNotEqual(cwd, other_cwd)
+        self.assertFalse(os.path.exists(cwd))
+
+        # processes started by submitted code do not outlive it
+        from pathlib import Path
+        try:
+            state = (Path(f"/proc/{sleep_pid}/stat").read_text()
+                    .rsplit(")", 1)[1].split()[0])
+        except FileNotFoundError:
+            state = None
+        self.assertIn(state, [None, "Z"])
+
+    def test_disrupted_child_rerun_alone(self):
+        from course.page.code import is_nuisance_failure, request_run_batch
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        killed_req = RunRequest(user_code=(
+            "import os, signal\n"
+            "os.kill(os.getpid(), signal.SIGKILL)\n"))
+        exited_req = RunRequest(user_code="import os\nos._exit(0)\n")
+
+        with mock.patch(RUNCODE_WITH_RETRIES_PATH) as mock_run:
+            mock_run.return_value = RunResponse(result="success", stdout="rerun")
+            responses = request_run_batch(
+                    [killed_req, RunRequest(user_code="print('hi')"), exited_req],
+                    5)
+
+        self.assertEqual(
+                [call[0][0] for call in mock_run.call_args_list],
+                [killed_req, exited_req])
+        self.assertEqual(
+                [resp.stdout for resp in responses], ["rerun", "hi\n", "rerun"])
+
+        self.assertTrue(is_nuisance_failure(RunResponse(
+            result="uncaught_error",
+            message="Child process was killed by signal 9.")))
+        self.assertFalse(is_nuisance_failure(RunResponse(
+            result="user_error", message="Child process exited without response.")))
+
+    def test_batch_failure_falls_back_to_single_runs(self):
+        from course.page.code import request_run_batch
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        with mock.patch(
+                "course.page.code.RunBatchResponse.model_validate_json",
+                side_effect=ValueError), \
+                mock.patch(RUNCODE_WITH_RETRIES_PATH) as mock_run, \
+                self.assertLogs("course.page.code") as logs:
+            mock_run.return_value = RunResponse(result="success")
+            responses = request_run_batch(
+                    [RunRequest(user_code="a = 1"), RunRequest(user_code="a = 2")],
+                    1)
+
+        self.assertIn("batch run failed", logs.output[0])
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(len(responses), 2)
+
+    def test_prerun_results_used(self):
+        from course.page.code import (
+            batched_code_runs,
+            prerun_code_requests,
+            request_run_with_retries,
+        )
+        from course.page.code_run_backend import RunRequest
+
+        run_req = RunRequest(user_code="print(1)")
+        with batched_code_runs():
+            prerun_code_requests([(run_req, 1, None)])
+
+            with mock.patch("course.page.code.request_run") as mock_run:
+                response = request_run_with_retries(run_req, 1)
+                self.assertEqual(response.stdout, "1\n")
+                mock_run.assert_not_called()
+
+                # different timeout: not prerun
+                request_run_with_retries(run_req, 2)
+                mock_run.assert_called_once()
+
+        with self.assertRaises(RuntimeError):
+            prerun_code_requests([(run_req, 1, None)])
+
+
+@override_settings(RELATE_CODE_RESULT_CACHE_TIMEOUT=600)
+class CodeResultCacheTest(TestCase):
+    def setUp(self):
+        super().setUp()
+        from django.core.cache import cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_cache_round_trip(self):
+        from course.page.code import cache_run_response, get_cached_run_response
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        run_req = RunRequest(user_code="a = 1", test_code="feedback.set_points(1)")
+        self.assertIsNone(get_cached_run_response(run_req, 5, "img"))
+
+        cache_run_response(run_req, 5, "img",
+                RunResponse(result="success", points=1), 1.5)
+
+        response, exec_time = get_cached_run_response(run_req, 5, "img")
+        self.assertEqual(response.points, 1)
+        self.assertEqual(exec_time, 1.5)
+
+        # key covers the image, the timeout and the full request
+        self.assertIsNone(get_cached_run_response(run_req, 5, "other-img"))
+        self.assertIsNone(get_cached_run_response(run_req, 6, "img"))
+        self.assertIsNone(get_cached_run_response(
+            run_req.model_copy(update={"test_code": "pass"}), 5, "img"))
+
+    def test_nondeterministic_results_not_cached(self):
+        from course.page.code import cache_run_response, get_cached_run_response
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        run_req = RunRequest(user_code="a = 1")
+        for result in ["timeout", "uncaught_error", "test_error"]:
+            cache_run_response(run_req, 5, "img", RunResponse(result=result), 1)
+            self.assertIsNone(get_cached_run_response(run_req, 5, "img"))
+
+    def test_large_results_not_cached(self):
+        from course.page.code import cache_run_response, get_cached_run_response
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        run_req = RunRequest(user_code="a = 1")
+        with override_settings(RELATE_CACHE_MAX_BYTES=100):
+            cache_run_response(run_req, 5, "img",
+                    RunResponse(result="success", stdout="x"*100), 1)
+        self.assertIsNone(get_cached_run_response(run_req, 5, "img"))
+
+    def test_stats(self):
+        from course.page.code import (
+            get_code_result_cache_stats,
+            record_code_result_cache_use,
+        )
+
+        before = get_code_result_cache_stats(1, "quiz")
+        self.assertIsNone(before.hit_rate)
+
+        record_code_result_cache_use(1, "quiz", hit=False, exec_time=2)
+        record_code_result_cache_use(1, "quiz", hit=True, exec_time=2)
+        record_code_result_cache_use(1, "quiz", hit=True, exec_time=0.5)
+        record_code_result_cache_use(1, "other", hit=True, exec_time=0.5)
+
+        stats = get_code_result_cache_stats(1, "quiz") - before
+        self.assertEqual(stats.hits, 2)
+        self.assertEqual(stats.misses, 1)
+        assert stats.hit_rate is not None
+        self.assertAlmostEqual(stats.hit_rate, 2/3)
+        self.assertAlmostEqual(stats.saved_time, 2.5)
+
+    def test_regrade_with_warm_cache_runs_nothing(self):
+        from course.page.code import (
+            batched_code_runs,
+            cache_run_response,
+            get_cached_run_response,
+            prerun_code_requests,
+            request_run_with_retries,
+        )
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        cached_req = RunRequest(user_code="a = 1")
+        cache_run_response(cached_req, 5, "img",
+                RunResponse(result="success", points=1), 1.5)
+
+        with batched_code_runs(), \
+                mock.patch("course.page.code.request_run_batch") as mock_batch, \
+                mock.patch("course.page.code.request_run") as mock_run:
+            prerun_code_requests([(cached_req, 5, "img")])
+            mock_batch.assert_not_called()
+
+            # as done by CodeQuestion.grade
+            cached = get_cached_run_response(cached_req, 5, "img")
+            assert cached is not None
+            self.assertEqual(cached[0].points, 1)
+            mock_run.assert_not_called()
+
+        # only uncached requests are run
+        uncached_req = RunRequest(user_code="a = 2")
+        with batched_code_runs(), \
+                mock.patch("course.page.code.request_run_batch") as mock_batch, \
+                mock.patch("course.page.code.request_run") as mock_run:
+            mock_batch.return_value = [RunResponse(result="success", points=0)]
+            prerun_code_requests([(cached_req, 5, "img"), (uncached_req, 5, "img")])
+            mock_batch.assert_called_once_with([uncached_req], 5, image="img")
+
+            self.assertEqual(
+                    request_run_with_retries(uncached_req, 5, image="img").points, 0)
+            mock_run.assert_not_called()
+
+    @override_settings(RELATE_CODE_RESULT_CACHE_TIMEOUT=None)
+    def test_disabled(self):
+        from course.page.code import (
+            cache_run_response,
+            get_cached_run_response,
+            get_code_result_cache_stats,
+            record_code_result_cache_use,
+        )
+        from course.page.code_run_backend import RunRequest, RunResponse
+
+        run_req = RunRequest(user_code="a = 1")
+        cache_run_response(run_req, 5, "img", RunResponse(result="success"), 1)
+        self.assertIsNone(get_cached_run_response(run_req, 5, "img"))
+
+        record_code_result_cache_use(1, "quiz", hit=False, exec_time=2)
+        self.assertIsNone(get_code_result_cache_stats(1, "quiz").hit_rate)
+
 # vim: fdm=marker
@@ -23,6 +23,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import unittest
+
 import celery
 import pytest
 from django.test import TestCase, override_settings
@@ -124,6 +126,12 @@ class GradesTasksTest(SingleCourseTestMixin, GradesTasksTestSetUpMixin,
         # reset the user_name format sequence
         self.addCleanup(factories.UserFactory.reset_sequence)
 
+        # report progress after every session
+        interval_patcher = mock.patch(
+            "course.tasks.SESSION_PROGRESS_INTERVAL", 1)
+        interval_patcher.start()
+        self.addCleanup(interval_patcher.stop)
+
     # {{{ test expire_in_progress_sessions
     def test_expire_in_progress_sessions_past_due_only_due_none(self):
         # grading_rule.due is None
@@ -466,6 +474,122 @@ class GradesTasksTest(SingleCourseTestMixin, GradesTasksTestSetUpMixin,
     # }}}
 
 
+@pytest.mark.slow
+class ChunkedGradesTasksTest(SingleCourseTestMixin, GradesTasksTestSetUpMixin,
+                             TestCase):
+    # Sessions are split across several subtasks whose results are combined
+    # by a chord callback. Task.apply runs the whole chord eagerly.
+
+    def setUp(self):
+        super().setUp()
+        self.create_flow_sessions(self.course)
+        self.addCleanup(factories.UserFactory.reset_sequence)
+
+        update_state_patcher = mock.patch(
+            "celery.app.task.Task.update_state", side_effect=mock.MagicMock)
+        self.mock_update_state = update_state_patcher.start()
+        self.addCleanup(update_state_patcher.stop)
+
+        override = override_settings(RELATE_SESSION_TASK_CHUNK_SIZE=3)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        # report progress after every session
+        interval_patcher = mock.patch(
+            "course.tasks.SESSION_PROGRESS_INTERVAL", 1)
+        interval_patcher.start()
+        self.addCleanup(interval_patcher.stop)
+
+    def test_expire_in_progress_sessions(self):
+        result = expire_in_progress_sessions.apply(
+            args=(self.gopp.course.id, self.gopp.flow_id),
+            kwargs={"rule_tag": None, "now_datetime": now(),
+                    "past_due_only": False})
+
+        self.assertEqual(
+            result.get(),
+            {"message": "%d sessions expired." % self.in_progress_sessions_count})
+        self.assertEqual(
+            models.FlowSession.objects.filter(in_progress=True).count(), 0)
+
+        # The task records its chunks, each of which reports its own progress.
+        self.assertEqual(self.mock_update_state.call_count,
+                         1 + self.in_progress_sessions_count)
+        meta = self.mock_update_state.call_args_list[0][1]["meta"]
+        self.assertEqual(meta["total"], self.in_progress_sessions_count)
+        chunk_sizes = [chunk_size for _chunk_task_id, chunk_size in meta["chunks"]]
+        self.assertGreater(len(chunk_sizes), 1)
+        self.assertLessEqual(max(chunk_sizes), 3)
+        self.assertEqual(sum(chunk_sizes), self.in_progress_sessions_count)
+
+    def test_regrade_flow_sessions(self):
+        with mock.patch("course.flow.regrade_session") as mock_regrade:
+            result = regrade_flow_sessions.apply(
+                args=(self.gopp.course_id, self.gopp.flow_id),
+                kwargs={"access_rules_tag": None, "inprog_value": None})
+
+        self.assertEqual(
+            result.get(),
+            {"message": "%d sessions regraded." % self.all_sessions_count})
+        self.assertEqual(
+            sorted(call[0][2].pk for call in mock_regrade.call_args_list),
+            sorted(models.FlowSession.objects.values_list("pk", flat=True)))
+
+    def test_small_task_not_chunked(self):
+        with override_settings(RELATE_SESSION_TASK_CHUNK_SIZE=100):
+            result = recalculate_ended_sessions.apply(
+                args=(self.gopp.course_id, self.gopp.flow_id),
+                kwargs={"rule_tag": None})
+
+        self.assertEqual(
+            result.get(),
+            {"message": "Grades recalculated for %d sessions."
+             % self.ended_sessions_count})
+        self.assertEqual(self.mock_update_state.call_count,
+                         self.ended_sessions_count)
+
+    def test_get_task_progress(self):
+        from celery import uuid
+
+        from course.tasks import get_task_progress
+        from relate.celery import app
+
+        self.assertEqual(get_task_progress({"current": 3, "total": 5}), (3, 5))
+
+        done_id, progressing_id, pending_id = uuid(), uuid(), uuid()
+        app.backend.mark_as_done(done_id, 2)
+        app.backend.store_result(
+            progressing_id, {"current": 1, "total": 3}, "PROGRESS")
+
+        self.assertEqual(
+            get_task_progress({"current": 0, "total": 9,
+                               "chunks": [[done_id, 3], [progressing_id, 3],
+                                          [pending_id, 3]]}),
+            (4, 9))
+
+
+class SessionProgressReporterTest(unittest.TestCase):
+    """test course.tasks._make_progress_reporter"""
+    def test_reports_every_interval(self):
+        from course.tasks import SESSION_PROGRESS_INTERVAL, _make_progress_reporter
+
+        task = mock.MagicMock()
+        report_progress = _make_progress_reporter(
+                task, 3 * SESSION_PROGRESS_INTERVAL)
+
+        for _i in range(SESSION_PROGRESS_INTERVAL - 1):
+            report_progress()
+        self.assertEqual(task.update_state.call_count, 0)
+
+        for _i in range(2 * SESSION_PROGRESS_INTERVAL):
+            report_progress()
+        self.assertEqual(task.update_state.call_count, 2)
+        self.assertEqual(
+                task.update_state.call_args[1]["meta"],
+                {"current": 2 * SESSION_PROGRESS_INTERVAL,
+                 "total": 3 * SESSION_PROGRESS_INTERVAL})
+
+
 class PurgePageViewDataTaskTestSetUpMixin:
     def create_flow_page_visit(self, course,
                                n_participations_per_course=5,
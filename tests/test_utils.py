@@ -788,6 +788,102 @@ class GetFlowRulesTest(SingleCourseTestMixin, TestCase):
 
         # }}}
 
+    @override_settings(RELATE_FLOW_RULE_EXCEPTION_CACHE_TIMEOUT=600)
+    def test_exceptions_cached(self):
+        from django.core import cache
+        cache.caches["default"].clear()
+
+        flow_desc = self.get_hacked_flow_desc()
+        exist_start_rule = flow_desc.rules.start
+
+        def get_rules(now_datetime=None):
+            return utils.get_flow_rules(
+                flow_desc, FlowSessionStartRuleDesc,
+                self.student_participation,
+                self.flow_id,
+                now_datetime or now(),
+            )
+
+        exc = factories.FlowRuleExceptionFactory(
+            flow_id=self.flow_id,
+            participation=self.student_participation,
+            kind=constants.FlowRuleKind.start,
+            expiration=now() + timedelta(hours=12),
+            rule={
+                "if_before": "end_week 2",
+                "may_start_new_session": True,
+                "may_list_existing_sessions": True,
+            },
+        )
+        self.assertEqual(len(get_rules()), len(exist_start_rule) + 1)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(len(get_rules()), len(exist_start_rule) + 1)
+
+            # expiration is honored for cached exceptions
+            self.assertEqual(
+                get_rules(now() + timedelta(days=1)), exist_start_rule)
+
+        # granting an exception invalidates
+        factories.FlowRuleExceptionFactory(
+            flow_id=self.flow_id,
+            participation=self.student_participation,
+            kind=constants.FlowRuleKind.start,
+            rule={
+                "if_after": "end_week 1",
+                "may_start_new_session": True,
+                "may_list_existing_sessions": True,
+            },
+        )
+        self.assertEqual(len(get_rules()), len(exist_start_rule) + 2)
+
+        # so does moving an exception elsewhere
+        exc.kind = constants.FlowRuleKind.access
+        exc.rule = {"permissions": ["view"]}
+        exc.save()
+        self.assertEqual(len(get_rules()), len(exist_start_rule) + 1)
+
+        # and deleting one
+        from course.models import FlowRuleException
+        FlowRuleException.objects.filter(
+            kind=constants.FlowRuleKind.start).delete()
+        self.assertEqual(get_rules(), exist_start_rule)
+
+    def test_validated_exceptions_not_in_model_cache(self):
+        from course.content import get_model_cache
+
+        flow_desc = self.get_hacked_flow_desc()
+        factories.FlowRuleExceptionFactory(
+            flow_id=self.flow_id,
+            participation=self.student_participation,
+            kind=constants.FlowRuleKind.start,
+            rule={
+                "if_before": "end_week 2",
+                "may_start_new_session": True,
+                "may_list_existing_sessions": True,
+            },
+        )
+
+        utils._FLOW_RULE_EXCEPTION_CACHE.clear()
+        self.addCleanup(utils._FLOW_RULE_EXCEPTION_CACHE.clear)
+
+        model_cache = get_model_cache()
+        assert model_cache is not None
+        model_stats_before = model_cache.get_stats()
+        exc_stats_before = utils._FLOW_RULE_EXCEPTION_CACHE.get_stats()
+
+        for _i in range(2):
+            result = utils.get_flow_rules(
+                flow_desc, FlowSessionStartRuleDesc,
+                self.student_participation,
+                self.flow_id,
+                now())
+            self.assertEqual(result[0].if_before.value, "end_week 2")
+
+        self.assertEqual(model_cache.get_stats(), model_stats_before)
+        exc_stats = utils._FLOW_RULE_EXCEPTION_CACHE.get_stats()
+        self.assertEqual(exc_stats["hits"], exc_stats_before["hits"] + 1)
+
 
 my_mock_event_time = mock.MagicMock()
 my_test_event_1_time = now() - timedelta(days=2)
@@ -27,7 +27,8 @@ import unittest
 from copy import deepcopy
 
 import pytest
-from django.test import RequestFactory, TestCase
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
 from dulwich.client import FetchPackResult
 from dulwich.contrib.paramiko_vendor import ParamikoSSHVendor
 
@@ -999,6 +1000,33 @@ class RunCourseUpdateCommandTest(MockAddMessageMixing, unittest.TestCase):
                 self.assertEqual(
                     self.course.active_git_commit_sha, expected_course_sha)
 
+    def test_report_stages(self):
+        def validate_course_content(*args, report_progress, **kwargs):
+            report_progress(0, 2)
+            report_progress(1, 2)
+            return []
+
+        self.mock_validate_course_content.side_effect = validate_course_content
+
+        add_message = mock.MagicMock()
+        report_stage = mock.MagicMock()
+        activated_sha = versioning.update_course_revision(
+            self.course, self.participation, self.repo, self.content_repo,
+            versioning.CourseRevisionCommand.fetch_update,
+            self.default_switch_to_sha.encode(), True, False,
+            add_message=add_message, report_stage=report_stage)
+
+        self.assertEqual(activated_sha, self.default_switch_to_sha.encode())
+        self.assertEqual(
+            [call.args for call in report_stage.call_args_list],
+            [("Fetching", 0, 0),
+             ("Validating flows", 0, 2),
+             ("Validating flows", 1, 2)])
+        self.assertEqual(add_message.call_count, 3)
+
+        # messages go to the callback rather than to the request
+        self.assertAddMessageCallCount(0)
+
 
 class VersioningRepoMixin:
     @classmethod
@@ -1191,6 +1219,32 @@ class UpdateCourseTest(SingleCourseTestMixin, MockAddMessageMixing, TestCase):
             expected_error_msg = f"Error: RuntimeError {error_msg}"
             self.assertAddMessageCalledWith(expected_error_msg)
 
+    def test_update_in_background(self):
+        task_id = "0123abcd-0123-abcd"
+        with override_settings(RELATE_COURSE_UPDATE_IN_BACKGROUND=True), \
+                mock.patch(
+                    "course.tasks.update_course_revision_task.delay"
+                ) as mock_delay, mock.patch(
+                    "course.versioning.run_course_update_command"
+                ) as mock_run_update:
+            mock_delay.return_value.id = task_id
+            resp = self.post_update_course_content(
+                self.course.active_git_commit_sha, command="fetch_update",
+                expect_success=False)
+
+        self.assertRedirects(
+            resp, reverse("relate-monitor_task", args=(task_id,)),
+            fetch_redirect_response=False)
+        self.assertEqual(mock_run_update.call_count, 0)
+
+        (course_id, participation_id, command, new_sha, may_update,
+            _prevent_discarding_revisions) = mock_delay.call_args.args
+        self.assertEqual(course_id, self.course.id)
+        self.assertEqual(participation_id, self.instructor_participation.id)
+        self.assertEqual(command, "fetch_update")
+        self.assertEqual(new_sha, self.course.active_git_commit_sha)
+        self.assertTrue(may_update)
+
     def test_form_not_valid(self):
         with mock.patch(
                 "course.versioning.GitUpdateForm.is_valid"
@@ -503,6 +503,34 @@ class HomeTest(CoursesTestMixinBase, TestCase):
                 resp, "current_courses", [course1, course2])
             self.assertResponseContextEqual(resp, "past_courses", [course4])
 
+    def test_hidden_course_permissions(self):
+        from course.enrollment import get_listed_courses_for_user
+
+        course = factories.CourseFactory(hidden=True)
+        student = factories.ParticipationFactory(
+            course=course, roles=["student"]).user
+        ta = factories.ParticipationFactory(
+            course=course, roles=["ta"]).user
+        dropped_ta = factories.ParticipationFactory(
+            course=course, roles=["ta"],
+            status=constants.ParticipationStatus.dropped).user
+        student_with_perm_participation = factories.ParticipationFactory(
+            course=course, roles=["student"])
+        models.ParticipationPermission.objects.create(
+            participation=student_with_perm_participation,
+            permission=constants.ParticipationPermission.view_hidden_course_page)
+        student_with_perm = student_with_perm_participation.user
+
+        for user, visible in [
+                (student, False),
+                (ta, True),
+                (dropped_ta, False),
+                (student_with_perm, True)]:
+            with self.subTest(user=user.username):
+                with self.assertNumQueries(1):
+                    courses = list(get_listed_courses_for_user(user))
+                self.assertEqual(courses, [course] if visible else [])
+
 
 class CheckCourseStateTest(SingleCourseTestMixin, TestCase):
     # test views.check_course_state
@@ -2219,6 +2247,24 @@ class MonitorTaskTest(SingleCourseTestMixin, TestCase):
             resp, "progress_statement", "0 out of 0 items processed.")
         self.assertResponseContextIsNone(resp, "traceback")
 
+    def test_state_progress_chunked(self):
+        done_chunk = self.mock_task("chunk", states.SUCCESS, 20)
+        self.save_result(app, done_chunk)
+        progressing_chunk = self.mock_task("chunk", "PROGRESS",
+                         {"current": 10, "total": 20})
+        self.save_result(app, progressing_chunk)
+
+        task = self.mock_task("progressing", "PROGRESS",
+                         {"current": 0, "total": 40,
+                          "chunks": [[done_chunk["id"], 20],
+                                     [progressing_chunk["id"], 20]]})
+        self.save_result(app, task)
+        resp = self.get_monitor_view(task["id"])
+        self.assertEqual(resp.status_code, 200)
+        self.assertResponseContextEqual(resp, "progress_percent", 75)
+        self.assertResponseContextEqual(
+            resp, "progress_statement", "30 out of 40 items processed.")
+
     def test_state_failure(self):
         self.instructor_participation.user.is_staff = True
         self.instructor_participation.user.save()